@@ -1,55 +1,1154 @@
 from datetime import datetime, timedelta, date
+import atexit
+import base64
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
 import unittest
-from flask import Flask, jsonify, request
+from decimal import Decimal
+from functools import wraps
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from flask import Flask, Response, g, has_request_context, jsonify, make_response, request, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.ext.automap import automap_base
-from sqlalchemy import desc, func, extract, inspect
+from sqlalchemy import event, MetaData, desc, func, extract, and_, or_, cast, literal_column, select, Index, Integer, Numeric, Select
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import http_date
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import (
     JWTManager, create_access_token, jwt_required, get_jwt_identity
 )
 from flask_jwt_extended.exceptions import NoAuthorizationError, InvalidHeaderError
-import testing_api as TEST
 import configparser
+from response_cache import ResponseCache
+from running_stats import RunningStats
+from downsampling import DOWNSAMPLING_METHODS, downsample_indices
+from rollup import CommitHorizon, RollupEngine, RollupWorker
+from sketches import SketchEngine, SketchWorker
+from ingest import BufferedWriter, ensure_station_table, parse_reading
+from spool import SpoolReplayer, WriteAheadSpool
+from live_feed import LiveFeed
+from ring_buffer import ReadingRing, RingFeeder
+from archive import ArchiveEngine, ArchiveWorker
+from json_encoding import available_encodings, compress, encode_columnar
+from export import EXPORT_FORMATS, arrow_available, generate_export
+from slow_query_log import SlowQueryLog
+from metrics import LATENCY_BUCKETS, QUERY_COUNT_BUCKETS, SIZE_BUCKETS, MetricsRegistry, TimedJSONProvider
+from stations import StationNotFound, StationRegistry, STATION_ID_PATTERN, STATION_TABLE_PREFIX
+from schema_snapshot import load_schema_metadata
+from statements import InvalidColumnError, StatementCache
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 
 config = configparser.ConfigParser()
-config.read('/var/www/html/config.cfg')
+# Cestu ke konfiguraci lze změnit proměnnou prostředí (např. benchmark.py nad vlastní databází)
+config.read(os.environ.get('WEATHER_API_CONFIG', '/var/www/html/config.cfg'))
 app.config['SQLALCHEMY_DATABASE_URI'] = config['DEFAULT']['SQLALCHEMY_DATABASE_URI']
 app.config['SECRET_KEY'] = config['DEFAULT']['SECRET_KEY']
 app.config['JWT_SECRET_KEY'] = config['DEFAULT']['JWT_SECRET_KEY']
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 3600
 app.config['JWT_REFRESH_TOKEN_EXPIRES'] = 604800
+# Počet vláken pro souběžné dotazy přes všechny meteostanice
+FANOUT_WORKERS = config['DEFAULT'].getint('FANOUT_WORKERS', fallback=4)
+# Počet vláken pro souběžné vyřizování dotazů z /api/batch
+BATCH_WORKERS = config['DEFAULT'].getint('BATCH_WORKERS', fallback=4)
+# Živý přenos (/api/stream/live) – každý odběratel drží jedno vlákno serveru po celou dobu spojení
+LIVE_MAX_SUBSCRIBERS = config['DEFAULT'].getint('LIVE_MAX_SUBSCRIBERS', fallback=8)
+# Počet vláken serveru (0 = podle počtu jader), serve.py je předá waitress – vždy zbude nejméně
+# 4 vlákna pro ostatní požadavky, i když jsou všechna místa pro živý přenos obsazená
+SERVER_THREADS = config['DEFAULT'].getint('SERVER_THREADS', fallback=0) or max(
+    4 * (os.cpu_count() or 1), LIVE_MAX_SUBSCRIBERS + 4)
+if LIVE_MAX_SUBSCRIBERS >= SERVER_THREADS:
+    raise ValueError(
+        f"LIVE_MAX_SUBSCRIBERS ({LIVE_MAX_SUBSCRIBERS}) must be lower than SERVER_THREADS ({SERVER_THREADS}), "
+        "otherwise live subscribers can block all server threads")
+# Vlákna na pozadí, která si berou vlastní spojení z poolu: rollup, sketche, archivace, buffer posledních
+# měření, živý přenos a opakovaný zápis ze spoolu
+BACKGROUND_DB_THREADS = 6
+
+# Pool spojení do databáze (0 = dopočítat). Každé vlákno serveru drží během požadavku jedno spojení
+# a vlákna pro dotazy přes meteostanice a /api/batch berou další, zatímco vlákno požadavku čeká.
+# Odběratelé živého přenosu spojení nedrží. Přetečení pokryje vlákna na pozadí a zapisovače měření
+# (jeden na meteostanici, rezerva ve velikosti FANOUT_WORKERS)
+DB_POOL_SIZE = config['DEFAULT'].getint('DB_POOL_SIZE', fallback=0) or SERVER_THREADS + FANOUT_WORKERS + BATCH_WORKERS
+DB_MAX_OVERFLOW = config['DEFAULT'].getint('DB_MAX_OVERFLOW', fallback=0) or BACKGROUND_DB_THREADS + FANOUT_WORKERS
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': DB_POOL_SIZE,
+    'max_overflow': DB_MAX_OVERFLOW,
+    'pool_pre_ping': config['DEFAULT'].getboolean('DB_POOL_PRE_PING', fallback=True),
+    'pool_recycle': config['DEFAULT'].getint('DB_POOL_RECYCLE', fallback=3600),
+    # Počet zkompilovaných SQL dotazů, které si SQLAlchemy pamatuje
+    'query_cache_size': config['DEFAULT'].getint('DB_QUERY_CACHE_SIZE', fallback=500),
+}
+
+# Počet řádků načítaných najednou ze serverového kurzoru při streamování
+STREAM_BATCH_SIZE = config['DEFAULT'].getint('STREAM_BATCH_SIZE', fallback=500)
+# Maximální velikost jedné stránky při stránkování
+PAGINATION_MAX_LIMIT = config['DEFAULT'].getint('PAGINATION_MAX_LIMIT', fallback=10000)
+# Vytvořit chybějící indexy nad sloupci s datem při startu (jinak se jen vypíše varování)
+CREATE_MISSING_INDEXES = config['DEFAULT'].getboolean('CREATE_MISSING_INDEXES', fallback=False)
+
+# Sloupce s datem, podle kterých se filtrují historická data
+INDEXED_DATE_COLUMNS = ['time', 'week_start', 'next_month_start']
+
+# Cache odpovědí – uzavřená období se cachují natrvalo, aktuální do změny max(id) v tabulce
+response_cache = ResponseCache(
+    max_entries=config['DEFAULT'].getint('RESPONSE_CACHE_SIZE', fallback=512),
+    cache_dir=config['DEFAULT'].get('RESPONSE_CACHE_DIR', fallback='')
+)
+# Předem sestavené dotazy podle tabulky, vybraných sloupců a tvaru filtru
+statement_cache = StatementCache(max_entries=config['DEFAULT'].getint('STATEMENT_CACHE_SIZE', fallback=256))
+# Po kolika minutách od konce období už se data považují za neměnná (zpožděná agregace)
+IMMUTABLE_AFTER_MINUTES = config['DEFAULT'].getint('IMMUTABLE_AFTER_MINUTES', fallback=60)
+# Odpovědi za uzavřená období se nemění – prohlížeč i proxy je mohou rok používat bez ověření
+CLOSED_PERIOD_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Velikosti intervalů pro /api/data/range v sekundách
+RANGE_BUCKETS = {'1h': 3600, '4h': 4 * 3600, '1d': 24 * 3600, '1w': 7 * 24 * 3600}
+RANGE_AGGREGATES = {'avg': func.avg, 'min': func.min, 'max': func.max}
+RANGE_MAX_BUCKETS = config['DEFAULT'].getint('RANGE_MAX_BUCKETS', fallback=10000)
+# Počátek číslování intervalů – pondělí, aby týdenní intervaly začínaly v pondělí
+BUCKET_EPOCH = datetime(1970, 1, 5)
+
+# Interval přepočtu tabulek aggregated_* v sekundách (0 = vypnuto)
+ROLLUP_INTERVAL = config['DEFAULT'].getint('ROLLUP_INTERVAL', fallback=0)
+ROLLUP_BATCH_SIZE = config['DEFAULT'].getint('ROLLUP_BATCH_SIZE', fallback=5000)
+# Interval přepočtu sketchů pro kvantily a histogramy (/api/stats/quantiles) v sekundách (0 = vypnuto)
+SKETCH_INTERVAL = config['DEFAULT'].getint('SKETCH_INTERVAL', fallback=0)
+SKETCH_BATCH_SIZE = config['DEFAULT'].getint('SKETCH_BATCH_SIZE', fallback=5000)
+# Nejvyšší počet intervalů jednoho sketche – víc intervalů = přesnější kvantily, větší sketche
+SKETCH_MAX_BINS = config['DEFAULT'].getint('SKETCH_MAX_BINS', fallback=512)
+# Rollup, sketche a buffer posledních měření zpracují řádek s daným id až po této době – do té doby se mohou
+# potvrdit zápisy s nižším id (nejdelší trvání transakce zápisu)
+COMMIT_SETTLE_SECONDS = config['DEFAULT'].getfloat('COMMIT_SETTLE_SECONDS', fallback=5.0)
+
+# Meteostanice, ke které patří tabulky aggregated_* a která se použije bez parametru station
+DEFAULT_STATION_ID = config['DEFAULT'].get('DEFAULT_STATION_ID', fallback='meteostation1')
+# Nejvyšší počet dotazů v jednom požadavku na /api/batch
+BATCH_MAX_REQUESTS = config['DEFAULT'].getint('BATCH_MAX_REQUESTS', fallback=20)
+
+# Příjem dat z meteostanic (náhrada script.php)
+INGEST_PASSKEY = config['DEFAULT'].get('INGEST_PASSKEY', fallback='')
+INGEST_BATCH_SIZE = config['DEFAULT'].getint('INGEST_BATCH_SIZE', fallback=50)
+INGEST_FLUSH_INTERVAL = config['DEFAULT'].getfloat('INGEST_FLUSH_INTERVAL', fallback=2.0)
+# Lokální spool pro výpadky databáze (prázdné = vypnuto)
+SPOOL_DIR = config['DEFAULT'].get('SPOOL_DIR', fallback='')
+SPOOL_SEGMENT_SIZE = config['DEFAULT'].getint('SPOOL_SEGMENT_SIZE', fallback=4 * 1024 * 1024)
+SPOOL_SLOW_WRITE_SECONDS = config['DEFAULT'].getfloat('SPOOL_SLOW_WRITE_SECONDS', fallback=5.0)
+SPOOL_REPLAY_INTERVAL = config['DEFAULT'].getfloat('SPOOL_REPLAY_INTERVAL', fallback=5.0)
+# Snímek reflektovaného schématu pro rychlý start (prázdné = reflexe při každém startu)
+SCHEMA_SNAPSHOT_PATH = config['DEFAULT'].get('SCHEMA_SNAPSHOT_PATH', fallback='')
+
+# Živý přenos nových měření (/api/stream/live)
+LIVE_POLL_INTERVAL = config['DEFAULT'].getfloat('LIVE_POLL_INTERVAL', fallback=5.0)
+LIVE_HISTORY_SIZE = config['DEFAULT'].getint('LIVE_HISTORY_SIZE', fallback=500)
+LIVE_HEARTBEAT = config['DEFAULT'].getfloat('LIVE_HEARTBEAT', fallback=15.0)
+# Kolik zmeškaných měření se nejvýše doplní z databáze po obnovení spojení (Last-Event-ID)
+LIVE_REPLAY_LIMIT = config['DEFAULT'].getint('LIVE_REPLAY_LIMIT', fallback=5000)
+
+# Buffer posledních měření výchozí meteostanice v paměti pro routy s dnešními a posledními daty (0 hodin = vypnuto)
+RING_BUFFER_HOURS = config['DEFAULT'].getint('RING_BUFFER_HOURS', fallback=24)
+RING_BUFFER_ROWS = config['DEFAULT'].getint('RING_BUFFER_ROWS', fallback=8640)
+RING_BUFFER_POLL_INTERVAL = config['DEFAULT'].getfloat('RING_BUFFER_POLL_INTERVAL', fallback=5.0)
+
+# Archiv starých surových měření v komprimovaných měsíčních souborech (prázdné = vypnuto)
+ARCHIVE_DIR = config['DEFAULT'].get('ARCHIVE_DIR', fallback='')
+ARCHIVE_AFTER_DAYS = config['DEFAULT'].getint('ARCHIVE_AFTER_DAYS', fallback=365)
+ARCHIVE_INTERVAL = config['DEFAULT'].getint('ARCHIVE_INTERVAL', fallback=86400)
+
+# Počet desetinných míst čísel ve výstupu layout=columnar
+JSON_FLOAT_DIGITS = config['DEFAULT'].getint('JSON_FLOAT_DIGITS', fallback=2)
+# Komprese odpovědí (gzip, případně brotli) od zadané velikosti v bajtech, úroveň 0 = vypnuto
+COMPRESS_MIN_SIZE = config['DEFAULT'].getint('COMPRESS_MIN_SIZE', fallback=1024)
+COMPRESS_LEVEL = config['DEFAULT'].getint('COMPRESS_LEVEL', fallback=6)
+# Počet řádků v jedné dávce exportu (record batch / row group)
+EXPORT_BATCH_SIZE = config['DEFAULT'].getint('EXPORT_BATCH_SIZE', fallback=10000)
+
+# Metriky pro Prometheus na /api/metrics
+METRICS_ENABLED = config['DEFAULT'].getboolean('METRICS_ENABLED', fallback=True)
+# Kolikrát se smí stejný SQL dotaz opakovat v jednom požadavku, než se požadavek označí (dotazy v cyklu)
+METRICS_REPEATED_QUERY_THRESHOLD = config['DEFAULT'].getint('METRICS_REPEATED_QUERY_THRESHOLD', fallback=5)
+# Adresy (sítě), ze kterých jsou dostupné /api/metrics a /api/test/run_all_tests
+INTERNAL_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in config['DEFAULT'].get('INTERNAL_ALLOWED_NETWORKS', fallback='127.0.0.1,::1').split(',')
+    if network.strip()
+]
+# Log pomalých dotazů s plánem EXPLAIN (práh 0 = vypnuto)
+SLOW_QUERY_THRESHOLD_MS = config['DEFAULT'].getint('SLOW_QUERY_THRESHOLD_MS', fallback=0)
+SLOW_QUERY_LOG = config['DEFAULT'].get('SLOW_QUERY_LOG', fallback='/var/log/weather_api/slow_queries.log')
+SLOW_QUERY_LOG_MAX_BYTES = config['DEFAULT'].getint('SLOW_QUERY_LOG_MAX_BYTES', fallback=5 * 1024 * 1024)
+SLOW_QUERY_LOG_BACKUPS = config['DEFAULT'].getint('SLOW_QUERY_LOG_BACKUPS', fallback=3)
+
+metrics = MetricsRegistry()
+metrics.counter('requests_total', 'HTTP requests by route, method and status code.')
+metrics.counter('error_responses_total', 'Responses with an error payload or error status, by route and status code.')
+metrics.counter('repeated_query_requests_total', 'Requests that ran the same SQL statement repeatedly (N queries in a loop).')
+metrics.histogram('request_duration_seconds', 'Request handling time by route.', LATENCY_BUCKETS)
+metrics.histogram('sql_queries_per_request', 'Number of SQL statements per request by route.', QUERY_COUNT_BUCKETS)
+metrics.histogram('sql_duration_seconds', 'Total SQL time per request by route.', LATENCY_BUCKETS)
+metrics.histogram('serialization_duration_seconds', 'JSON serialization time per request by route.', LATENCY_BUCKETS)
+metrics.histogram('response_size_bytes', 'Response body size (after compression) by route.', SIZE_BUCKETS)
 
 jwt = JWTManager(app)
 db = SQLAlchemy(app)
 
+def invalidate_closed_periods(table_name, oldest_time):
+    # Zpožděně zapsaná měření (spool, rollup dávky se starými časy) – uložené uzavřené období už neplatí
+    if oldest_time < datetime.now() - timedelta(minutes=IMMUTABLE_AFTER_MINUTES):
+        response_cache.invalidate_period(oldest_time)
+
 # Vytvoření vlastního kontextu
 with app.app_context():
-    # Automatické mapování na základě existujících tabulek
-    Base = automap_base()
-    Base.prepare(db.engine, reflect=True)
+    # Metadata schématu ze snímku (reflexe celé databáze jen při změně schématu)
+    schema_metadata = load_schema_metadata(db.engine, SCHEMA_SNAPSHOT_PATH)
+
+    # Automatické mapování sdílených tabulek, tabulky meteostanic mapuje až registr
+    Base = automap_base(metadata=MetaData())
+    for table_name, table in schema_metadata.tables.items():
+        if not table_name.startswith(STATION_TABLE_PREFIX):
+            table.to_metadata(Base.metadata)
+    Base.prepare()
 
     # Zde získáváme třídy reprezentující různé tabulky
     AggregatedDailyData = Base.classes.aggregated_daily_data
     AggregatedWeeklyData = Base.classes.aggregated_weekly_data
     AggregatedMonthlyData = Base.classes.aggregated_monthly_data
     AggregatedData = Base.classes.aggregated_data
-    BaseMeteostation = Base.classes.Weather_table_meteostation1
     MeteoCodes = Base.classes.meteo_codes
+
+    # Registr meteostanic – třídy tabulek Weather_table_<stanice> se mapují až při použití
+    station_registry = StationRegistry(db.engine, DEFAULT_STATION_ID, schema_metadata=schema_metadata)
+    BaseMeteostation = station_registry.get(DEFAULT_STATION_ID)
+    fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+    batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+
+    # Tabulky, nad kterými lze počítat /api/data/range (raw = tabulka zvolené meteostanice)
+    RANGE_SOURCES = {
+        'raw': None,
+        'hourly': AggregatedData,
+        'daily': AggregatedDailyData,
+    }
+    # Tabulky pro /api/export
+    EXPORT_SOURCES = {
+        'raw': None,
+        'hourly': AggregatedData,
+        'daily': AggregatedDailyData,
+        'weekly': AggregatedWeeklyData,
+        'monthly': AggregatedMonthlyData,
+    }
+
+    # Přírůstková agregace surových dat do tabulek aggregated_*
+    rollup_engine = None
+    rollup_worker = None
+    if ROLLUP_INTERVAL > 0:
+        rollup_engine = RollupEngine(
+            db.engine, BaseMeteostation.__table__.name, batch_size=ROLLUP_BATCH_SIZE, schema_metadata=schema_metadata,
+            on_batch=invalidate_closed_periods, settle_seconds=COMMIT_SETTLE_SECONDS
+        )
+        rollup_worker = RollupWorker(rollup_engine, interval=ROLLUP_INTERVAL)
+        rollup_worker.start()
+
+    # Sketche rozdělení hodnot po hodinách a dnech – první běh dopočítá celou historii
+    sketch_engine = None
+    sketch_worker = None
+    if SKETCH_INTERVAL > 0:
+        sketch_engine = SketchEngine(
+            db.engine, BaseMeteostation.__table__.name, batch_size=SKETCH_BATCH_SIZE, max_bins=SKETCH_MAX_BINS,
+            schema_metadata=schema_metadata, settle_seconds=COMMIT_SETTLE_SECONDS
+        )
+        sketch_worker = SketchWorker(sketch_engine, interval=SKETCH_INTERVAL)
+        sketch_worker.start()
+
+    # Zapisovače měření pro jednotlivé meteostanice, schéma se kontroluje jen jednou
+    ingest_writers = {}
+    ingest_writers_lock = threading.Lock()
+    ingest_spool = WriteAheadSpool(SPOOL_DIR, segment_size=SPOOL_SEGMENT_SIZE) if SPOOL_DIR else None
+
+    # Průběžné min/max/průměr dnešních měření pro každou meteostanici
+    today_stats_by_station = {}
+    # Horizont potvrzených zápisů – řádek s nižším id potvrzený až po vyšším se nepřeskočí
+    today_horizons = {}
     
     Users = Base.classes.users if 'users' in Base.classes else None
     if Users:
-        inspector = inspect(db.engine)
-        columns = inspector.get_columns(Users.__table__.name)
-        print([column['name'] for column in columns])
+        print([column.name for column in Users.__table__.columns])
+
+    # Kontrola indexů nad sloupci s datem ve všech tabulkách (podle metadat v paměti)
+    for table_name, table in schema_metadata.tables.items():
+        indexed_columns = {index.columns[0].name for index in table.indexes if index.columns}
+        indexed_columns.update(column.name for column in list(table.primary_key.columns)[:1])
+
+        for column_name in INDEXED_DATE_COLUMNS:
+            if column_name not in table.columns or column_name in indexed_columns:
+                continue
+            if CREATE_MISSING_INDEXES:
+                Index(f'ix_{table_name}_{column_name}', table.columns[column_name]).create(db.engine)
+                print(f"Vytvořen index nad {table_name}.{column_name}")
+            else:
+                print(f"VAROVÁNÍ: chybí index nad {table_name}.{column_name}, dotazy podle data budou procházet celou tabulku")
 
 
 #FUNCTIONS
+def request_stats():
+    # Počty a časy dotazů aktuálního požadavku (mimo požadavek, např. ve vláknech zapisovačů, None)
+    if not has_request_context():
+        return None
+    stats = g.get('request_stats')
+    if stats is None:
+        stats = g.request_stats = {'queries': 0, 'sql_time': 0.0, 'serialization_time': 0.0, 'statements': {}}
+    return stats
+
+def add_serialization_time(seconds):
+    stats = request_stats()
+    if stats is not None:
+        stats['serialization_time'] += seconds
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Dotaz z vlákna na pozadí mohl začít ještě před registrací posluchačů
+    start_times = conn.info.get('query_start_time')
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+    stats = request_stats()
+    if stats is not None:
+        stats['queries'] += 1
+        stats['sql_time'] += elapsed
+        stats['statements'][statement] = stats['statements'].get(statement, 0) + 1
+    if slow_query_log is not None:
+        route = (request.endpoint or 'unknown') if has_request_context() else 'background'
+        slow_query_log.record(statement, parameters, elapsed, route, executemany)
+
+def handle_cursor_error(exception_context):
+    # Dotaz skončil chybou – after_cursor_execute se nezavolá
+    if exception_context.connection is not None and exception_context.connection.info.get('query_start_time'):
+        exception_context.connection.info['query_start_time'].pop()
+
+slow_query_log = None
+if METRICS_ENABLED:
+    app.json.timing_callback = add_serialization_time
+if METRICS_ENABLED or SLOW_QUERY_THRESHOLD_MS > 0:
+    with app.app_context():
+        if SLOW_QUERY_THRESHOLD_MS > 0:
+            slow_query_log = SlowQueryLog(
+                db.engine, SLOW_QUERY_LOG, SLOW_QUERY_THRESHOLD_MS / 1000,
+                max_bytes=SLOW_QUERY_LOG_MAX_BYTES, backup_count=SLOW_QUERY_LOG_BACKUPS
+            )
+            slow_query_log.start()
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(db.engine, 'handle_error', handle_cursor_error)
+
 def create_access_token_for_user(user):
     return create_access_token(identity={'username': user.username})
 
+def day_range(day):
+    # Interval [začátek dne, začátek dalšího dne)
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+def week_range(day):
+    # Interval od pondělí týdne, do kterého den patří
+    start = datetime.combine(day - timedelta(days=day.weekday()), datetime.min.time())
+    return start, start + timedelta(days=7)
+
+def month_range(day):
+    start = datetime(day.year, day.month, 1)
+    if day.month == 12:
+        return start, datetime(day.year + 1, 1, 1)
+    return start, datetime(day.year, day.month + 1, 1)
+
+def year_range(day):
+    return datetime(day.year, 1, 1), datetime(day.year + 1, 1, 1)
+
+def date_range_filter(column, start, end):
+    # Podmínka ve tvaru sloupec >= začátek AND sloupec < konec, aby databáze mohla použít index
+    return and_(column >= start, column < end)
+
+def get_date_column_name(table_class):
+    # Zjistit název sloupce s datem v tabulce
+    for potential_date_column in ['date', 'week_start', 'next_month_start', 'time']:
+        if potential_date_column in table_class.__dict__:
+            return potential_date_column
+    raise Exception(f"Tabulka {table_class.__name__} nemá sloupec s datem.")
+
+def encode_cursor(date_value, row_id):
+    # Kurzor je pro klienta neprůhledný řetězec (datum + id posledního řádku stránky)
+    payload = json.dumps([date_value.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor):
+    date_str, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if len(date_str) == 10:
+        return date.fromisoformat(date_str), int(row_id)
+    return datetime.fromisoformat(date_str), int(row_id)
+
+def keyset_statement(statement, table_class, cursor=None):
+    # Dotaz seřazený podle (datum, id) od kurzoru, vrací i sloupce klíče
+    date_column = table_class.__table__.columns[get_date_column_name(table_class)]
+    id_column = table_class.__table__.columns.id
+
+    # Keyset podmínka (datum, id) > kurzor, zapsaná tak, aby šla použít jako rozsah indexu nad datem
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        statement = statement.where(
+            date_column >= cursor_date,
+            or_(date_column > cursor_date, and_(date_column == cursor_date, id_column > cursor_id))
+        )
+    return statement.order_by(date_column, id_column), date_column, id_column
+
+def paginate_query(statement, table_class, limit, cursor=None, params=None):
+    statement, date_column, _ = keyset_statement(statement, table_class, cursor)
+
+    # Načteme o jeden řádek víc, abychom věděli, jestli existuje další stránka
+    rows = db.session.execute(statement.limit(limit + 1), params).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], date_column.key), rows[-1].id)
+
+    return rows, next_cursor
+
+def paginate_stream(statement, table_class, limit, cursor=None, params=None):
+    # Stránka jako serverový kurzor – kurzor další stránky se zjistí předem jen z klíčů (datum, id),
+    # aby mohl jít v hlavičce před streamovaným tělem
+    statement, date_column, id_column = keyset_statement(statement, table_class, cursor)
+    keys = db.session.execute(
+        statement.with_only_columns(date_column, id_column).offset(limit - 1).limit(2), params
+    ).all()
+    next_cursor = encode_cursor(*keys[0]) if len(keys) > 1 else None
+    rows = db.session.execute(statement.limit(limit), params, execution_options={'yield_per': STREAM_BATCH_SIZE})
+    return rows, next_cursor
+
+def paginated_response(statement, table_class, params=None):
+    try:
+        limit = int(request.args.get('limit', PAGINATION_MAX_LIMIT))
+        if limit < 1:
+            raise ValueError
+        limit = min(limit, PAGINATION_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    paginate = paginate_stream if request.args.get('format') == 'ndjson' else paginate_query
+    try:
+        rows, next_cursor = paginate(statement, table_class, limit, request.args.get('cursor'), params)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    if request.args.get('format') == 'ndjson':
+        response = Response(stream_with_context(generate_ndjson(rows)), mimetype='application/x-ndjson')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+
+    return jsonify({'data': [row._asdict() for row in rows], 'next_cursor': next_cursor})
+
+def closed_period(range_function):
+    # Vrací funkci, která z parametru <date> routy spočítá konec pokrytého období
+    def period_end(date=None, **kwargs):
+        if not date:
+            return None
+        return range_function(datetime.strptime(date, '%Y-%m-%d').date())[1]
+    return period_end
+
+def today_period(**kwargs):
+    # Konec dnešního dne – odpovědi za dnešek se po půlnoci liší i beze změny dat
+    return day_range(datetime.now().date())[1]
+
+def table_watermark(table_class):
+    # Tabulku výchozí meteostanice hlídá buffer posledních měření – bez dotazu do databáze
+    ring = reading_ring_for(table_class)
+    if ring is not None:
+        return (ring.last_id, ring.last_time)
+    return tuple(db.session.query(
+        func.max(table_class.id), func.max(getattr(table_class, get_date_column_name(table_class)))
+    ).one())
+
+def get_watermark(*table_classes):
+    # Nejvyšší id a datum v tabulkách – změní se s každým novým záznamem
+    # Místo třídy může být předána funkce, která tabulku určí podle požadavku (např. get_station_table)
+    table_classes = [table_class if hasattr(table_class, '__table__') else table_class() for table_class in table_classes]
+    watermark = tuple(table_watermark(table_class) for table_class in table_classes)
+    # Rollup přepisuje i existující řádky aggregated_*, proto se přidává i jeho high-water mark
+    if rollup_engine is not None:
+        state_table = rollup_engine.state_table
+        watermark += (tuple(db.session.query(func.max(state_table.c.last_id), func.max(state_table.c.updated_at)).one()),)
+    return watermark
+
+def watermark_last_modified(watermark):
+    # Nejnovější datum z watermarku, které není v budoucnosti (měsíční agregace mají datum dalšího měsíce)
+    now = datetime.now()
+    dates = [
+        value if isinstance(value, datetime) else datetime.combine(value, datetime.min.time())
+        for _, value in watermark if isinstance(value, date)
+    ]
+    dates = [value for value in dates if value <= now]
+    return max(dates) if dates else None
+
+def validator_headers(key, end, watermark, body=None):
+    # ETag z klíče požadavku a watermarku, u uzavřeného období z klíče a obsahu odpovědi
+    # (zpožděná měření ze spoolu nebo rollupu změní i uzavřené období a s ním ETag)
+    digest = hashlib.sha1(body).hexdigest() if body is not None else None
+    etag = hashlib.sha1(repr((key, end, watermark, digest)).encode()).hexdigest()
+    headers = {'ETag': f'W/"{etag}"', 'Vary': 'Authorization'}
+    if watermark is None:
+        headers['Last-Modified'] = http_date(end)
+        # Období skončilo před hranicí uzavřených období – odpověď se už nezmění, klient se nemusí ptát znovu
+        headers['Cache-Control'] = CLOSED_PERIOD_CACHE_CONTROL
+    else:
+        last_modified = watermark_last_modified(watermark)
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified)
+        # Otevřené období se při každém použití ověří přes ETag
+        headers['Cache-Control'] = 'private, no-cache'
+    return etag, headers
+
+def settled_before():
+    # Hranice uzavřených období – starší měření jsou v databázi a zpracovaná rollupem, už se nezmění
+    settled = datetime.now() - timedelta(minutes=IMMUTABLE_AFTER_MINUTES)
+    # Měření čekající v zapisovačích /api/ingest, ve spoolu a na rollup – vše z paměti, bez dotazu do databáze
+    pending = [writer.oldest_reading_time() for writer in list(ingest_writers.values())]
+    if ingest_spool is not None:
+        pending.append(ingest_spool.oldest_reading_time())
+    if rollup_engine is not None:
+        pending.append(rollup_engine.oldest_pending_time())
+    return min([settled] + [value for value in pending if value is not None])
+
+def cached_response(period_end, *table_classes):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                end = period_end(**kwargs) if period_end else None
+            except ValueError:
+                return view(*args, **kwargs)
+
+            # Uzavřené období nemá watermark, aktuální se hlídá přes max(id)
+            closed = end is not None and end <= settled_before()
+            watermark = None if closed else get_watermark(*table_classes)
+
+            key = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+            if end is not None:
+                key += '#' + end.isoformat()
+
+            # Klient má aktuální verzi – 304 bez hlavního dotazu i bez těla
+            if not closed:
+                etag, validators = validator_headers(key, end, watermark)
+                if request.if_none_match.contains_weak(etag):
+                    return Response(status=304, headers=validators)
+
+            # Streamované odpovědi se necachují (uzavřené období nemá bez těla ETag)
+            if request.args.get('format') in ('ndjson', 'stream'):
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not closed:
+                    response.headers.update(validators)
+                return response
+
+            cached = response_cache.get(key, watermark)
+            if cached is not None:
+                body, mimetype, headers = cached
+                if closed:
+                    etag, validators = validator_headers(key, end, None, body)
+                    if request.if_none_match.contains_weak(etag):
+                        return Response(status=304, headers=validators)
+                return Response(body, mimetype=mimetype, headers={**headers, **validators})
+
+            generation = response_cache.generation
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                body = response.get_data()
+                # Chybové odpovědi ({'error': ...}) se neukládají ani nedostanou ETag
+                if not body.startswith(b'{"error"'):
+                    headers = {name: value for name, value in response.headers.items() if name.startswith('X-')}
+                    response_cache.set(
+                        key, (body, response.mimetype, headers), watermark,
+                        period_end=end if closed else None, generation=generation
+                    )
+                    if closed:
+                        etag, validators = validator_headers(key, end, None, body)
+                        if request.if_none_match.contains_weak(etag):
+                            return Response(status=304, headers=validators)
+                    response.headers.update(validators)
+            return response
+        return wrapper
+    return decorator
+
+def get_station_table():
+    # Třída tabulky meteostanice podle parametru station (bez něj výchozí meteostanice)
+    return station_registry.get(request.args.get('station'))
+
+def refresh_today_stats(station_table):
+    table_name = station_table.__table__.name
+    today_stats = today_stats_by_station.get(table_name)
+    if today_stats is None:
+        today_stats = RunningStats(
+            [column.key for column in station_table.__table__.columns],
+            [column.key for column in station_table.__table__.columns
+             if column.key != 'id' and isinstance(column.type, (Numeric, Integer))]
+        )
+        today_stats_by_station[table_name] = today_stats
+        # Buffer dostane pozdě potvrzený řádek až při dalším načtení – čeká se i na něj
+        settle_seconds = COMMIT_SETTLE_SECONDS
+        if reading_ring is not None and reading_ring.table_name == table_name:
+            settle_seconds += RING_BUFFER_POLL_INTERVAL
+        today_horizons[table_name] = CommitHorizon(settle_seconds)
+    horizon = today_horizons[table_name]
+
+    today = datetime.now().date()
+    start_of_day, end_of_day = day_range(today)
+    columns = station_table.__table__.columns
+    numeric_columns = [columns[column_name] for column_name in today_stats.numeric_column_names]
+
+    # Dnešní měření jsou v bufferu posledních měření – bez dotazu do databáze
+    ring = reading_ring_for(station_table)
+    if ring is not None:
+        settled_id = horizon.observe(ring.last_id)
+        rows = ring.rows_between(start_of_day, end_of_day, today_stats.last_id if today_stats.day == today else 0)
+        if rows is not None:
+            if today_stats.day != today:
+                today_stats.seed(today, 0, {}, {}, {}, {})
+            today_stats.advance(rows, settled_id)
+            return today_stats
+
+    settled_id = horizon.observe(db.session.query(func.max(station_table.id)).scalar())
+    if today_stats.day != today:
+        # Nový den – počáteční stav jedním agregačním dotazem nad potvrzenými řádky
+        aggregates = db.session.query(
+            *[func.min(column) for column in columns],
+            *[func.max(column) for column in columns],
+            *[func.sum(column) for column in numeric_columns],
+            *[func.count(column) for column in numeric_columns]
+        ).filter(
+            station_table.id <= settled_id,
+            date_range_filter(station_table.time, start_of_day, end_of_day)
+        ).one()
+
+        column_count = len(columns)
+        numeric_count = len(numeric_columns)
+        min_values = aggregates[:column_count]
+        max_values = aggregates[column_count:2 * column_count]
+        sums = aggregates[2 * column_count:2 * column_count + numeric_count]
+        counts = aggregates[2 * column_count + numeric_count:]
+        today_stats.seed(
+            today,
+            settled_id,
+            {column.key: value for column, value in zip(columns, min_values)},
+            {column.key: value for column, value in zip(columns, max_values)},
+            {column.key: value for column, value in zip(numeric_columns, sums)},
+            {column.key: value for column, value in zip(numeric_columns, counts)}
+        )
+
+    # Dopočítání řádků nad posledním potvrzeným id (včetně pozdě potvrzených s nižším id)
+    new_rows = db.session.query(*columns).filter(
+        station_table.id > today_stats.last_id,
+        date_range_filter(station_table.time, start_of_day, end_of_day)
+    ).order_by(station_table.id).all()
+    today_stats.advance([row._asdict() for row in new_rows], settled_id)
+    return today_stats
+
+def bucket_average(column, total, count):
+    # Průměr jako AVG v MariaDB – u DECIMAL a celých čísel o 4 desetinná místa víc než sloupec
+    if count == 0:
+        return None
+    if isinstance(column.type, Integer) or (isinstance(column.type, Numeric) and column.type.scale is not None):
+        scale = 0 if isinstance(column.type, Integer) else column.type.scale
+        return (Decimal(total) / count).quantize(Decimal(1).scaleb(-(scale + 4)))
+    return total / count
+
+def aggregate_buckets(batches, columns, aggregates, bucket_seconds):
+    # GROUP BY přes časové intervaly nad řádky seřazenými podle času – columns[0] je čas, ostatní číselné sloupce
+    data_list = []
+    bucket = None
+    totals = []
+
+    def close_bucket():
+        item = {}
+        for column, (total, count, minimum, maximum) in zip(columns[1:], totals):
+            values = {'avg': bucket_average(column, total, count), 'min': minimum, 'max': maximum}
+            for aggregate in aggregates:
+                item[f'{column.key}_{aggregate}'] = values[aggregate]
+        item['time'] = BUCKET_EPOCH + timedelta(seconds=bucket * bucket_seconds)
+        data_list.append(item)
+
+    for rows in batches:
+        for row in rows:
+            row_bucket = int((row[0] - BUCKET_EPOCH).total_seconds() // bucket_seconds)
+            if row_bucket != bucket:
+                if bucket is not None:
+                    close_bucket()
+                bucket = row_bucket
+                totals = [[0, 0, None, None] for _ in columns[1:]]
+            for column_totals, value in zip(totals, row[1:]):
+                if value is None:
+                    continue
+                column_totals[0] += value
+                column_totals[1] += 1
+                column_totals[2] = value if column_totals[2] is None else min(column_totals[2], value)
+                column_totals[3] = value if column_totals[3] is None else max(column_totals[3], value)
+    if bucket is not None:
+        close_bucket()
+    return data_list
+
+def time_bucket(column, seconds):
+    # Číslo intervalu od BUCKET_EPOCH, počítané přímo v databázi
+    if db.engine.dialect.name == 'sqlite':
+        elapsed = cast(func.strftime('%s', column), Integer) - int((BUCKET_EPOCH - datetime(1970, 1, 1)).total_seconds())
+        return cast(elapsed / seconds, Integer)
+    elapsed = func.timestampdiff(literal_column('SECOND'), BUCKET_EPOCH, column)
+    return func.floor(elapsed / seconds)
+
+def parse_range_datetime(value):
+    # Přijímá datum (YYYY-MM-DD) i datum s časem ve formátu ISO 8601
+    return datetime.fromisoformat(value)
+
+def range_period_end(**kwargs):
+    to_str = request.args.get('to')
+    return parse_range_datetime(to_str) if to_str else None
+
+def downsampled_response(statement, table_class, params=None):
+    try:
+        max_points = int(request.args['max_points'])
+        if max_points < 3:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'Invalid max_points'}), 400
+
+    method = request.args.get('downsample', 'lttb')
+    if method not in DOWNSAMPLING_METHODS:
+        return jsonify({'error': f"Invalid downsample, use one of {', '.join(DOWNSAMPLING_METHODS)}"}), 400
+
+    # Série, podle kterých se vybírají body (výchozí všechny číselné sloupce)
+    numeric_columns = [
+        column.key for column in table_class.__table__.columns
+        if column.key != 'id' and isinstance(column.type, (Numeric, Integer))
+    ]
+    if request.args.get('columns'):
+        selected_columns = request.args['columns'].split(',')
+        unknown_columns = [column_name for column_name in selected_columns if column_name not in numeric_columns]
+        if unknown_columns:
+            return jsonify({'error': f"Unknown columns: {', '.join(unknown_columns)}"}), 400
+    else:
+        selected_columns = numeric_columns
+
+    date_column_name = get_date_column_name(table_class)
+    table = table_class.__table__
+    date_column = table.columns[date_column_name]
+    # S columns se vrací jen sloupec s datem a vybrané sloupce
+    if request.args.get('columns'):
+        output_columns = [date_column] + [table.columns[column_name] for column_name in selected_columns]
+    else:
+        output_columns = list(table.columns)
+
+    # Výběr bodů jen ze zřeďovaných sloupců, řádky po dávkách přes serverový kurzor
+    ids = []
+    x_values = []
+    series = [[] for _ in selected_columns]
+    rows = db.session.execute(
+        statement.with_only_columns(table.columns.id, date_column, *[table.columns[column_name] for column_name in selected_columns])
+        .order_by(date_column, table.columns.id),
+        params, execution_options={'yield_per': STREAM_BATCH_SIZE}
+    )
+    for row in rows:
+        ids.append(row[0])
+        # Osa x jako počet sekund, aby šly počítat plochy trojúhelníků
+        date_value = row[1]
+        if not isinstance(date_value, datetime):
+            date_value = datetime.combine(date_value, datetime.min.time())
+        x_values.append(date_value.timestamp())
+        for values, value in zip(series, row[2:]):
+            values.append(value)
+
+    selected_ids = [ids[i] for i in downsample_indices(x_values, series, max_points, method)]
+    del ids, x_values, series
+
+    # Celé řádky se načtou jen pro vybrané body
+    selected_rows = {}
+    for batch_start in range(0, len(selected_ids), STREAM_BATCH_SIZE):
+        batch_ids = selected_ids[batch_start:batch_start + STREAM_BATCH_SIZE]
+        for row in db.session.execute(select(table.columns.id, *output_columns).where(table.columns.id.in_(batch_ids))):
+            selected_rows[row[0]] = {column.key: value for column, value in zip(output_columns, row[1:])}
+    return jsonify([selected_rows[row_id] for row_id in selected_ids if row_id in selected_rows])
+
+def fetch_live_events(station_id, after_id, limit):
+    # Nová měření meteostanice jako (id, JSON) – bez after_id jen poslední měření
+    table = station_registry.get(station_id).__table__
+    if after_id is None:
+        query = select(table).order_by(desc(table.c.id)).limit(1)
+    else:
+        query = select(table).where(table.c.id > after_id).order_by(table.c.id).limit(limit)
+    with app.app_context(), db.engine.connect() as conn:
+        return [(row.id, row_to_json(row)) for row in conn.execute(query)]
+
+# Jedno vlákno hlídá nová měření pro všechny připojené klienty
+live_feed = LiveFeed(
+    fetch_live_events,
+    poll_interval=LIVE_POLL_INTERVAL,
+    history_size=LIVE_HISTORY_SIZE,
+    max_subscribers=LIVE_MAX_SUBSCRIBERS
+)
+live_feed.start()
+
+def fetch_ring_rows(after_id, limit):
+    table = BaseMeteostation.__table__
+    with app.app_context(), db.engine.connect() as conn:
+        return [row._mapping for row in conn.execute(
+            select(table).where(table.c.id > after_id).order_by(table.c.id).limit(limit)
+        )]
+
+def load_reading_ring(ring):
+    # Poslední RING_BUFFER_HOURS hodin z databáze, nejvýše RING_BUFFER_ROWS nejnovějších řádků
+    table = BaseMeteostation.__table__
+    cutoff = datetime.now() - timedelta(hours=RING_BUFFER_HOURS)
+    with db.engine.connect() as conn:
+        last_id, last_time = conn.execute(select(func.max(table.c.id), func.max(table.c.time))).one()
+        rows = conn.execute(
+            select(table).where(table.c.time >= cutoff).order_by(desc(table.c.id)).limit(RING_BUFFER_ROWS)
+        ).all()
+    rows.reverse()
+    # Při plném bufferu jsou starší měření z okna jen v databázi
+    covered_from = rows[0].time if len(rows) >= RING_BUFFER_ROWS else cutoff
+    ring.load([row._mapping for row in rows], covered_from, last_id, last_time)
+
+reading_ring = None
+ring_feeder = None
+if RING_BUFFER_HOURS > 0:
+    try:
+        reading_ring = ReadingRing(BaseMeteostation.__table__, capacity=RING_BUFFER_ROWS, window_hours=RING_BUFFER_HOURS)
+        with app.app_context():
+            load_reading_ring(reading_ring)
+        ring_feeder = RingFeeder(
+            reading_ring, fetch_ring_rows, poll_interval=RING_BUFFER_POLL_INTERVAL, settle_seconds=COMMIT_SETTLE_SECONDS
+        )
+        ring_feeder.start()
+    except ValueError as e:
+        print(f"Buffer posledních měření je vypnutý: {e}")
+        reading_ring = None
+
+def reading_ring_for(table_class):
+    # Buffer jen pro tabulku výchozí meteostanice a až po načtení
+    if reading_ring is None or reading_ring.covered_from is None or table_class.__table__.name != reading_ring.table_name:
+        return None
+    return reading_ring
+
+# Parametry, které potřebují dotaz do databáze (stránkování, zředění, streamování)
+RING_UNSUPPORTED_ARGS = ('limit', 'cursor', 'max_points', 'format')
+
+def rows_list_response(column_names, rows):
+    # Řádky z paměti (buffer posledních měření, archiv) ve stejném formátu jako z databáze
+    if request.args.get('format') == 'ndjson':
+        return Response(
+            ''.join(app.json.dumps(row, separators=(',', ':')) + '\n' for row in rows),
+            mimetype='application/x-ndjson'
+        )
+    if request.args.get('layout', 'rows') == 'columnar':
+        return columnar_response(column_names, [tuple(row.values()) for row in rows])
+    return jsonify(rows)
+
+def ring_rows_response(table_class, start, end):
+    # Odpověď z bufferu posledních měření, pokud obsahuje celé období – jinak None a dotaz do databáze
+    ring = reading_ring_for(table_class)
+    if ring is None or any(name in request.args for name in RING_UNSUPPORTED_ARGS):
+        return None
+    layout = request.args.get('layout', 'rows')
+    if layout not in ('rows', 'columnar'):
+        return None
+    rows = ring.rows_between(start, end)
+    if rows is None:
+        return None
+    return rows_list_response(ring.column_names, rows)
+
+def station_table_names():
+    return [STATION_TABLE_PREFIX + station_id for station_id in station_registry.list_station_ids()]
+
+def rolled_up_id(table_name):
+    # Do archivu smí jen měření, která už zpracoval rollup i sketche – po smazání z tabulky by je už nedopočítaly
+    processing_engines = [
+        processing_engine for processing_engine in (rollup_engine, sketch_engine)
+        if processing_engine is not None and processing_engine.source_table_name == table_name
+    ]
+    if not processing_engines:
+        return None
+    last_ids = []
+    for processing_engine in processing_engines:
+        state_table = processing_engine.state_table
+        with processing_engine.engine.connect() as conn:
+            last_ids.append(conn.execute(
+                select(state_table.c.last_id).where(state_table.c.source_table == table_name)
+            ).scalar() or 0)
+    return min(last_ids)
+
+archive_engine = None
+if ARCHIVE_DIR:
+    with app.app_context():
+        archive_engine = ArchiveEngine(db.engine, ARCHIVE_DIR, after_days=ARCHIVE_AFTER_DAYS, archivable_id=rolled_up_id)
+    ArchiveWorker(archive_engine, station_table_names, interval=ARCHIVE_INTERVAL).start()
+
+def rows_with_archive(table_class, start, end):
+    # Interval zasahující do archivu – řádky z archivu i z tabulky (právě archivovaný měsíc může být v obou), None = jen tabulka
+    if archive_engine is None:
+        return None
+    store = archive_engine.store(table_class.__table__.name)
+    if not store.overlaps(start, end):
+        return None
+    table = table_class.__table__
+    rows = {row['id']: row for row in store.rows_between(start, end, [column.key for column in table.columns])}
+    archived_before = store.archived_before()
+    if archived_before is None or end > archived_before:
+        for row in db.session.execute(select(table).where(date_range_filter(table.c.time, start, end))):
+            rows.setdefault(row.id, dict(row._mapping))
+    return [rows[row_id] for row_id in sorted(rows)]
+
+def archive_overlaps(table_class, start, end):
+    return archive_engine is not None and archive_engine.store(table_class.__table__.name).overlaps(start, end)
+
+def batches_with_archive(engine, table_class, columns, start, end, query):
+    # Dávky řádků (n-tice v pořadí columns) seřazené podle času – archivované měsíce ze souborů, zbytek z tabulky
+    # dotazem query (seřazeným podle času). Právě archivovaný měsíc může být částečně v obou, každé měření se vrátí jen jednou
+    store = archive_engine.store(table_class.__table__.name)
+    column_names = [column.key for column in columns]
+    time_index = column_names.index('time')
+    archived_before = store.archived_before()
+    split = start if archived_before is None else min(max(start, archived_before), end)
+    for rows in store.iter_month_rows(start, split, column_names):
+        yield [tuple(row[column_name] for column_name in column_names) for row in rows]
+
+    pending = [
+        tuple(row[column_name] for column_name in column_names)
+        for rows in store.iter_month_rows(split, end, column_names) for row in rows
+    ]
+    pending_times = {row[time_index] for row in pending}
+    live_rows = (
+        row for rows in export_batches(engine, query.where(table_class.__table__.c.time >= split))
+        for row in rows if row[time_index] not in pending_times
+    )
+    merged_rows = heapq.merge(pending, live_rows, key=lambda row: row[time_index])
+    while rows := list(islice(merged_rows, EXPORT_BATCH_SIZE)):
+        yield rows
+
+def archived_rows_response(table_class, rows):
+    layout = request.args.get('layout', 'rows')
+    if layout not in ('rows', 'columnar'):
+        return jsonify({'error': 'Invalid layout, use rows or columnar'}), 400
+    if any(name in request.args for name in ('limit', 'cursor', 'max_points')):
+        archived_before = archive_engine.store(table_class.__table__.name).archived_before()
+        return jsonify({
+            'error': 'Parameters limit, cursor and max_points are not available for archived days '
+                     f"(before {archived_before.isoformat() if archived_before else 'the current archive month'}), "
+                     'request the whole day or use /api/export'
+        }), 400
+    return rows_list_response([column.key for column in table_class.__table__.columns], rows)
+
+def column_extremes(table_class, rows, extreme):
+    # MIN/MAX každého sloupce jako v databázi – NULL hodnoty se přeskakují
+    return {
+        column.key: extreme((row[column.key] for row in rows if row[column.key] is not None), default=None)
+        for column in table_class.__table__.columns
+    }
+
+def on_readings_written(table_name, rows):
+    # Nová měření jsou v databázi – agregace se přepočítají hned
+    times = [row['time'] for row in rows if row.get('time') is not None]
+    if times:
+        invalidate_closed_periods(table_name, min(times))
+        # Hranice uzavřených období (settled_before) se drží v paměti – rollup se dozví o nezpracovaných řádcích
+        if rollup_engine is not None and table_name == rollup_engine.source_table_name:
+            rollup_engine.mark_pending(min(times))
+    if rollup_worker is not None:
+        rollup_worker.wake()
+    if sketch_worker is not None:
+        sketch_worker.wake()
+    live_feed.wake()
+    if ring_feeder is not None:
+        ring_feeder.wake()
+
+def get_ingest_writer(station_id):
+    writer = ingest_writers.get(station_id)
+    if writer is None:
+        with ingest_writers_lock:
+            writer = ingest_writers.get(station_id)
+            if writer is None:
+                station_table = ensure_station_table(db.engine, station_id)
+                writer = BufferedWriter(
+                    db.engine, station_table,
+                    batch_size=INGEST_BATCH_SIZE,
+                    flush_interval=INGEST_FLUSH_INTERVAL,
+                    listeners=[on_readings_written],
+                    station_id=station_id,
+                    spool=ingest_spool,
+                    slow_write_seconds=SPOOL_SLOW_WRITE_SECONDS
+                )
+                ingest_writers[station_id] = writer
+                # Nová meteostanice se objeví v seznamu stanic
+                station_registry.invalidate()
+    return writer
+
+def replay_spooled_readings(station_id, rows):
+    # Přehrání ze spoolu – měření se stejnou stanicí a časem se nevloží podruhé
+    with app.app_context():
+        return get_ingest_writer(station_id).write(rows, deduplicate=True)
+
+@atexit.register
+def flush_ingest_writers():
+    # Při ukončení serveru se zapíšou měření, která zůstala v bufferu
+    for writer in list(ingest_writers.values()):
+        try:
+            writer.flush()
+        except Exception as e:
+            print(f"Zápis měření při ukončení selhal: {e}")
+
+# Kontrola schématu výchozí meteostanice proběhne jednou při startu, ne při každém měření
+with app.app_context():
+    get_ingest_writer(DEFAULT_STATION_ID)
+
+if ingest_spool is not None:
+    SpoolReplayer(ingest_spool, replay_spooled_readings, interval=SPOOL_REPLAY_INTERVAL).start()
+
+def fetch_last_row(engine, table):
+    # Běží ve vlákně fanout_executor s vlastním spojením z poolu
+    with engine.connect() as conn:
+        row = conn.execute(select(table).order_by(desc(table.c.id)).limit(1)).first()
+    return row._asdict() if row else None
+
+# Routy, které nelze vyřídit v /api/batch – streamované odpovědi a spouštění testů
+BATCH_EXCLUDED_ENDPOINTS = {'get_live_stream', 'export_data', 'run_all_tests'}
+
+def batch_request_key(path):
+    # Stejné dotazy s parametry v jiném pořadí se vyřídí jen jednou
+    parts = urlsplit(path)
+    return parts.path + '?' + urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+def run_batch_request(path, authorization):
+    # Běží ve vlákně batch_executor – vlastní kontext požadavku, a tedy i vlastní session databáze
+    headers = {'Authorization': authorization} if authorization else {}
+    with app.test_request_context(path, method='GET', headers=headers):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            return 500, app.json.dumps({'error': str(e)}).encode()
+        body = response.get_data()
+        # Tělo JSON odpovědi se do výsledku vloží beze změny, ostatní jako řetězec
+        if not response.is_json:
+            body = app.json.dumps(body.decode(errors='replace')).encode()
+        return response.status_code, body
+
+def row_to_json(row):
+    # Stejná serializace jako jsonify (Decimal, datetime), jen bez mezer
+    return app.json.dumps(row._asdict(), separators=(',', ':'))
+
+def generate_ndjson(query):
+    # Každý řádek jako samostatný JSON objekt na jednom řádku
+    chunk = []
+    for row in query:
+        chunk.append(row_to_json(row))
+        if len(chunk) >= STREAM_BATCH_SIZE:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+def generate_json_array(query):
+    # JSON pole posílané po částech, klient dostává data hned od prvního řádku
+    yield '['
+    chunk = []
+    first_chunk = True
+    for row in query:
+        chunk.append(row_to_json(row))
+        if len(chunk) >= STREAM_BATCH_SIZE:
+            yield ('' if first_chunk else ',') + ','.join(chunk)
+            first_chunk = False
+            chunk = []
+    if chunk:
+        yield ('' if first_chunk else ',') + ','.join(chunk)
+    yield ']'
+
+def sse_event(event_id, data):
+    return f'id: {event_id}\nevent: reading\ndata: {data}\n\n'
+
+def generate_live_events(channel, station_id, last_id):
+    # Server-Sent Events: nejdřív zmeškaná měření, pak nová, jak je přinese live_feed
+    try:
+        yield f'retry: {int(LIVE_POLL_INTERVAL * 1000)}\n\n'
+        replayed = 0
+        while True:
+            events = channel.events_after(last_id)
+            if events is None:
+                # Klient je pozadu víc, než pojme historie kanálu – doplnění z databáze
+                events = []
+                if replayed < LIVE_REPLAY_LIMIT:
+                    events = fetch_live_events(station_id, last_id, min(LIVE_HISTORY_SIZE, LIVE_REPLAY_LIMIT - replayed))
+                    replayed += len(events)
+                if not events:
+                    last_id = channel.oldest_id() - 1
+                    continue
+            if events:
+                yield ''.join(sse_event(event_id, data) for event_id, data in events)
+                last_id = events[-1][0]
+            elif not channel.wait(last_id, LIVE_HEARTBEAT):
+                # Komentář udržuje spojení a odhalí odpojeného klienta
+                yield ': keepalive\n\n'
+    finally:
+        live_feed.unsubscribe(channel)
+
+def columnar_response(column_names, rows):
+    # Kompaktní výstup {"columns": [...], "data": [[...], ...]} pro grafy
+    start = time.perf_counter()
+    body = encode_columnar(column_names, rows, JSON_FLOAT_DIGITS)
+    add_serialization_time(time.perf_counter() - start)
+    return Response(body, mimetype='application/json')
+
+def export_batches(engine, query):
+    # Serverový kurzor – v paměti je vždy jen jedna dávka řádků
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(query)
+        for rows in result.partitions():
+            yield rows
+
+def rows_statement(query, table_class):
+    # ORM dotaz jako Core select nad sloupci tabulky – řádky se načtou jako n-tice, bez ORM identit
+    if isinstance(query, Select):
+        return query
+    return query.with_entities(*table_class.__table__.columns).statement
+
+def rows_response(query, table_class, params=None):
+    # query je ORM dotaz nebo Core select (např. ze statement_cache s hodnotami v params)
+    layout = request.args.get('layout', 'rows')
+    if layout not in ('rows', 'columnar'):
+        return jsonify({'error': 'Invalid layout, use rows or columnar'}), 400
+    statement = rows_statement(query, table_class)
+
+    # Stránkování se zapíná parametrem limit (případně cursor z předchozí stránky)
+    if 'limit' in request.args or 'cursor' in request.args:
+        return paginated_response(statement, table_class, params)
+
+    # Zředění série pro grafy parametrem max_points
+    if 'max_points' in request.args:
+        return downsampled_response(statement, table_class, params)
+
+    output_format = request.args.get('format')
+    if output_format in ('ndjson', 'stream'):
+        # Načítání přes serverový kurzor po dávkách, v paměti je vždy jen jedna dávka
+        streamed_rows = db.session.execute(statement, params, execution_options={'yield_per': STREAM_BATCH_SIZE})
+        if output_format == 'ndjson':
+            return Response(stream_with_context(generate_ndjson(streamed_rows)), mimetype='application/x-ndjson')
+        return Response(stream_with_context(generate_json_array(streamed_rows)), mimetype='application/json')
+
+    rows = db.session.execute(statement, params).all()
+    if layout == 'columnar':
+        return columnar_response([column.key for column in table_class.__table__.columns], rows)
+    return jsonify([row._asdict() for row in rows])
+
 def get_last_data(table_class):
     try:
         last_data = db.session.query(table_class).order_by(desc(table_class.id)).first()
@@ -67,13 +1166,12 @@ def get_all_last_data(table_class):
         # Získání aktuálního data
         current_date = datetime.now().date()
 
-        # Vytvoření časového rozmezí od 00:00:00 do 23:59:59 pro celý den
-        start_of_day = datetime.combine(current_date, datetime.min.time())
-        end_of_day = datetime.combine(current_date, datetime.max.time())
+        # Vytvoření časového rozmezí pro celý den
+        start_of_day, end_of_day = day_range(current_date)
 
         # Získání posledních dat z tabulky pro dané časové rozmezí
         last_data = db.session.query(table_class).filter(
-            table_class.time.between(start_of_day, end_of_day)
+            date_range_filter(table_class.time, start_of_day, end_of_day)
         ).all()
 
         # Příprava výstupu
@@ -87,9 +1185,8 @@ def get_all_last_data(table_class):
         return jsonify({'error': str(e)})
         
 def get_all_columns(table_class):
-    inspector = inspect(db.engine)
-    columns = inspector.get_columns(table_class.__table__.name)
-    all_columns = [column['name'] for column in columns]
+    # Sloupce z metadat v paměti, bez dotazu do databáze
+    all_columns = [column.name for column in table_class.__table__.columns]
     response = {'rows': all_columns}
     return jsonify(response)
    
@@ -98,14 +1195,26 @@ def get_data_by_columns(table_class, columns=None):
         # Přidání podmínky pro vybrané sloupce
         if columns:
             selected_columns = columns.split(',')
-            data = db.session.query(table_class).with_entities(*[getattr(table_class, column) for column in selected_columns]).all()
+            data = db.session.execute(statement_cache.select(table_class.__table__, selected_columns)).all()
+            if request.args.get('layout') == 'columnar':
+                return columnar_response(selected_columns, data)
             data_list = [row._asdict() for row in data]
 
             return jsonify(data_list)
         else:
             return jsonify({'message': 'No columns specified.'})
+    except InvalidColumnError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)})
+
+def day_rows_response(table_class, date_object, filters):
+    # Řádky jednoho dne podle sloupce s datem, filters jsou podmínky sloupec = hodnota
+    date_column_name = get_date_column_name(table_class)
+    start_of_day, end_of_day = day_range(date_object)
+    statement = statement_cache.select(table_class.__table__, ranges=(date_column_name,), equal=tuple(filters))
+    params = {date_column_name + '_start': start_of_day, date_column_name + '_end': end_of_day, **filters}
+    return rows_response(statement, table_class, params)
         
 def get_data_by_date_and_column(table_class, date_str=None, time=None, column=None):
     try:
@@ -114,50 +1223,18 @@ def get_data_by_date_and_column(table_class, date_str=None, time=None, column=No
         else:
             date_object = datetime.now()
 
-        # Zjistit název sloupce s datem v tabulce
-        if 'date' in table_class.__dict__:
-            date_column_name = 'date'
-        elif 'week_start' in table_class.__dict__:
-            date_column_name = 'week_start'
-        elif 'next_month_start' in table_class.__dict__:
-            date_column_name = 'next_month_start'
-        elif 'time' in table_class.__dict__:
-            date_column_name = 'time'
-        else:
-            raise Exception(f"Tabulka {table_class.__name__} nemá sloupec s datem.")
-
-        # Vytvoření filtrovacího intervalu pro celý den
-        start_of_day = datetime.combine(date_object, datetime.min.time())
-        end_of_day = datetime.combine(date_object, datetime.max.time())
-
-        # Sestavení filtru na základě názvu sloupce s datem
-        filter_condition = {
-            date_column_name: (start_of_day, end_of_day)
-        }
-
+        filters = {}
         if time:
-            # Pokud je zadán parametr time, přidáme čas k filtru
-            time_object = datetime.strptime(time, '%H:%M:%S').time()
-            filter_condition['time'] = time_object
+            # Pokud je zadán parametr time, přidáme čas k filtru (sloupec time je datum s časem)
+            filters['time'] = datetime.combine(date_object.date(), datetime.strptime(time, '%H:%M:%S').time())
 
         # Přidání podmínky pro vybraný sloupec
         if column:
-            filter_condition_column = {column: True}
-            filter_condition.update(filter_condition_column)
-
-        data = db.session.query(table_class).filter(
-            *[
-                getattr(table_class, k).between(v[0], v[1])
-                if isinstance(v, tuple) and len(v) == 2
-                else getattr(table_class, k) == v
-                for k, v in filter_condition.items()
-            ]
-        ).all()
+            filters[column] = True
 
-        data_list = [row.__dict__ for row in data]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
-        return jsonify(data_list)
+        return day_rows_response(table_class, date_object, filters)
+    except InvalidColumnError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)})
 
@@ -170,36 +1247,28 @@ def get_data_by_columns_and_date_test(table_class, date=None, columns=None):
         else:
             selected_columns = []
 
-        query = db.session.query(table_class)
-        if date:
-            date_object = datetime.strptime(date, '%Y-%m-%d')
-            query = query.filter_by(week_start=date_object)
-
-        if selected_columns:
-            # Výběr pouze sloupců, které jsou uvedeny v dotazu
-            result = query.with_entities(*[getattr(table_class, column) for column in selected_columns]).all()
-        else:
-            # Pokud nejsou uvedeny žádné sloupce, vrátíme všechny sloupce
-            result = query.all()
+        # Výběr pouze sloupců, které jsou uvedeny v dotazu, jinak všech sloupců
+        params = {'week_start': datetime.strptime(date, '%Y-%m-%d')} if date else {}
+        statement = statement_cache.select(table_class.__table__, selected_columns or None, equal=tuple(params))
+        result = db.session.execute(statement, params).all()
 
         # Převedeme výsledek na seznam slovníků
         data_list = [dict(zip(selected_columns, row)) for row in result] if selected_columns else [row._asdict() for row in result]
 
         return jsonify(data_list)
+    except InvalidColumnError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)})
 
 def get_all_data(table_class, column=None):
     try:
         # Přidání podmínky pro vybraný sloupec
-        if column:
-            data = db.session.query(table_class).filter_by(**{column: True}).all()
-        else:
-            data = db.session.query(table_class).all()
-        data_list = [row.__dict__ for row in data]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
-        return jsonify(data_list)
+        params = {column: True} if column else {}
+        statement = statement_cache.select(table_class.__table__, equal=tuple(params))
+        return rows_response(statement, table_class, params)
+    except InvalidColumnError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)})
         
@@ -213,56 +1282,100 @@ def get_meteo_code(code):
 
 def get_all_data_by_date_today(table_class, column=None):
     try:
-        date_object = datetime.now().date()
-
-        # Zjistit název sloupce s datem v tabulce
-        date_column_name = None
-        for potential_date_column in ['date', 'week_start', 'next_month_start', 'time']:
-            if potential_date_column in table_class.__dict__:
-                date_column_name = potential_date_column
-                break
-
-        if not date_column_name:
-            raise Exception(f"Tabulka {table_class.__name__} nemá sloupec s datem.")
-
-        # Vytvoření filtrovacího intervalu pro celý den
-        start_of_day = datetime.combine(date_object, datetime.min.time())
-        end_of_day = datetime.combine(date_object, datetime.max.time())
-
-        # Sestavení filtru na základě názvu sloupce s datem
-        filter_condition = {
-            date_column_name: (start_of_day, end_of_day)
-        }
-
         # Přidání podmínky pro vybraný sloupec
-        if column:
-            filter_condition_column = {column: True}
-            filter_condition.update(filter_condition_column)
-
-        data = db.session.query(table_class).filter(
-            *[
-                getattr(table_class, k).between(v[0], v[1])
-                if isinstance(v, tuple) and len(v) == 2
-                else getattr(table_class, k) == v
-                for k, v in filter_condition.items()
-            ]
-        ).all()
-
-        data_list = [row.__dict__ for row in data]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
-        return jsonify(data_list)
+        filters = {column: True} if column else {}
+        return day_rows_response(table_class, datetime.now().date(), filters)
+    except InvalidColumnError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)})
     
 #END POINTS   
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+
+# Routy nad tabulkami aggregated_*, které existují jen pro výchozí meteostanici
+AGGREGATED_ENDPOINTS = {
+    'get_aggregated_data_today', 'get_daily_data_test', 'get_weekly_data_columns', 'get_daily_data',
+    'get_weekly_data', 'get_monthly_data', 'get_aggregated_data', 'get_columns', 'get_weekly_data_by_date_test',
+    'get_monthly_data_by_date', 'get_hourly_data_weekly_by_date', 'get_4hourly_data_monthly_by_date',
+    'get_daily_data_yearly_by_date', 'get_quantiles',
+}
+
+@app.before_request
+def check_station_parameter():
+    station_id = request.args.get('station')
+    if station_id and station_id != DEFAULT_STATION_ID and (
+        request.endpoint in AGGREGATED_ENDPOINTS
+        or request.endpoint == 'get_range_data' and request.args.get('source', 'raw') != 'raw'
+        or request.endpoint == 'export_data' and request.args.get('table', 'raw') != 'raw'
+    ):
+        return jsonify({'error': f'Aggregated data are available only for station {DEFAULT_STATION_ID}'}), 404
+
+@app.after_request
+def compress_response(response):
+    # Komprese podle Accept-Encoding, streamované odpovědi (ndjson, SSE) se posílají beze změny
+    if (COMPRESS_LEVEL <= 0 or response.status_code != 200 or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if not encoding:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compress(data, encoding, COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    # Registrováno až po kompresi, proto se spouští před ní (after_request běží v opačném pořadí) – tělo je
+    # ještě nekomprimované a jde v něm poznat {'error': ...}, velikost je tedy velikost před kompresí.
+    # Streamované odpovědi (ndjson, SSE, export) se generují až po návratu – doba je jen do začátku odesílání
+    # a velikost těla se nezapočítá
+    if not METRICS_ENABLED:
+        return response
+    route = (('route', request.endpoint or 'unknown'),)
+    stats = request_stats()
+    metrics.inc('requests_total', route + (('method', request.method), ('status', response.status_code)))
+    if g.get('request_started') is not None:
+        metrics.observe('request_duration_seconds', time.perf_counter() - g.request_started, route)
+    metrics.observe('sql_queries_per_request', stats['queries'], route)
+    metrics.observe('sql_duration_seconds', stats['sql_time'], route)
+    metrics.observe('serialization_duration_seconds', stats['serialization_time'], route)
+
+    if not response.is_streamed:
+        body = response.get_data()
+        metrics.observe('response_size_bytes', len(body), route)
+        # Chyby vracené jako {'error': ...} se stavem 200 se počítají také
+        if response.status_code >= 400 or body.startswith(b'{"error"'):
+            metrics.inc('error_responses_total', route + (('status', response.status_code),))
+
+    if stats['statements'] and max(stats['statements'].values()) >= METRICS_REPEATED_QUERY_THRESHOLD:
+        metrics.inc('repeated_query_requests_total', route)
+    return response
+
+@app.errorhandler(StationNotFound)
+def handle_station_not_found(e):
+    return jsonify({'error': str(e)}), 404
+
 @app.route('/api/data/last_data', methods=['GET'])
 @jwt_required()
+@cached_response(None, get_station_table)
 def get_last_weather_data():
-    return get_last_data(BaseMeteostation)
+    station_table = get_station_table()
+    ring = reading_ring_for(station_table)
+    last_row = ring.last_row() if ring is not None else None
+    if last_row is not None:
+        return jsonify(last_row)
+    return get_last_data(station_table)
 
 @app.route('/api/data/aggregated/today', methods=['GET'])
 @jwt_required()
+@cached_response(today_period, AggregatedData)
 def get_aggregated_data_today():
     column = request.args.get('column')
     return get_all_data_by_date_today(AggregatedData, column=column)
@@ -344,6 +1457,7 @@ def get_weekly_data_columns(columns=None):
 @app.route('/api/data/daily/<date>', methods=['GET'])
 @app.route('/api/data/daily', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(day_range), AggregatedDailyData)
 def get_daily_data(date=None):
     column = request.args.get('column')
     if date:
@@ -354,6 +1468,7 @@ def get_daily_data(date=None):
 @app.route('/api/data/weekly/<date>', methods=['GET'])
 @app.route('/api/data/weekly', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(day_range), AggregatedWeeklyData)
 def get_weekly_data(date=None):
     column = request.args.get('column')
     if date:
@@ -364,6 +1479,7 @@ def get_weekly_data(date=None):
 @app.route('/api/data/monthly/<date>', methods=['GET'])
 @app.route('/api/data/monthly', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(day_range), AggregatedMonthlyData)
 def get_monthly_data(date=None):
     column = request.args.get('column')
     if date: 
@@ -374,6 +1490,7 @@ def get_monthly_data(date=None):
 @app.route('/api/data/aggregated/<date>', methods=['GET'])
 @app.route('/api/data/aggregated', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(day_range), AggregatedData)
 def get_aggregated_data(date=None):
     column = request.args.get('column')
     if date: 
@@ -386,9 +1503,346 @@ def get_aggregated_data(date=None):
 def get_columns():
     return get_all_columns(AggregatedData)
     
+@app.route('/api/data/range', methods=['GET'])
+@jwt_required()
+@cached_response(range_period_end, get_station_table, AggregatedData, AggregatedDailyData)
+def get_range_data():
+    try:
+        # Kontrola parametrů
+        try:
+            start = parse_range_datetime(request.args['from'])
+            end = parse_range_datetime(request.args['to']) if request.args.get('to') else datetime.now()
+        except (KeyError, ValueError):
+            return jsonify({'error': 'Parameters from and to must be dates in ISO format'}), 400
+
+        bucket = request.args.get('bucket', '1h')
+        if bucket not in RANGE_BUCKETS:
+            return jsonify({'error': f"Invalid bucket, use one of {', '.join(RANGE_BUCKETS)}"}), 400
+        bucket_seconds = RANGE_BUCKETS[bucket]
+        if (end - start).total_seconds() / bucket_seconds > RANGE_MAX_BUCKETS:
+            return jsonify({'error': 'Too many buckets for the requested range'}), 400
+
+        aggregates = request.args.get('agg', 'avg').split(',')
+        if any(aggregate not in RANGE_AGGREGATES for aggregate in aggregates):
+            return jsonify({'error': f"Invalid agg, use {', '.join(RANGE_AGGREGATES)}"}), 400
+
+        source = request.args.get('source', 'raw')
+        if source not in RANGE_SOURCES:
+            return jsonify({'error': f"Invalid source, use one of {', '.join(RANGE_SOURCES)}"}), 400
+        table_class = RANGE_SOURCES[source] or get_station_table()
+
+        # Jen číselné sloupce tabulky, bez id
+        numeric_columns = {
+            column.key: column for column in table_class.__table__.columns
+            if column.key != 'id' and isinstance(column.type, (Numeric, Integer))
+        }
+        if request.args.get('columns'):
+            selected_columns = request.args['columns'].split(',')
+            unknown_columns = [column_name for column_name in selected_columns if column_name not in numeric_columns]
+            if unknown_columns:
+                return jsonify({'error': f"Unknown columns: {', '.join(unknown_columns)}"}), 400
+        else:
+            selected_columns = list(numeric_columns)
+
+        # Surová data zasahující do archivu – intervaly se spočítají v Pythonu z archivu i tabulky
+        if source == 'raw' and archive_overlaps(table_class, start, end):
+            table = table_class.__table__
+            columns = [table.c.time] + [numeric_columns[column_name] for column_name in selected_columns]
+            query = select(*columns).where(date_range_filter(table.c.time, start, end)).order_by(table.c.time, table.c.id)
+            return jsonify(aggregate_buckets(batches_with_archive(db.engine, table_class, columns, start, end, query), columns, aggregates, bucket_seconds))
+
+        # Jeden dotaz s GROUP BY přes časové intervaly
+        date_column = getattr(table_class, get_date_column_name(table_class))
+        bucket_column = time_bucket(date_column, bucket_seconds).label('bucket')
+        query = db.session.query(
+            bucket_column,
+            *[
+                RANGE_AGGREGATES[aggregate](numeric_columns[column_name]).label(f'{column_name}_{aggregate}')
+                for column_name in selected_columns
+                for aggregate in aggregates
+            ]
+        ).filter(date_range_filter(date_column, start, end)).group_by(bucket_column).order_by(bucket_column)
+
+        # Příprava výstupu – číslo intervalu se převede na čas jeho začátku
+        data_list = []
+        for row in query:
+            item = row._asdict()
+            item['time'] = BUCKET_EPOCH + timedelta(seconds=int(item.pop('bucket')) * bucket_seconds)
+            data_list.append(item)
+
+        return jsonify(data_list)
+
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/api/export', methods=['GET'])
+@jwt_required()
+def export_data():
+    # Kontrola parametrů
+    try:
+        start = parse_range_datetime(request.args['from'])
+        end = parse_range_datetime(request.args['to']) if request.args.get('to') else datetime.now()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Parameters from and to must be dates in ISO format'}), 400
+
+    file_format = request.args.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Invalid format, use one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if file_format != 'csv' and not arrow_available():
+        return jsonify({'error': f'Export to {file_format} requires pyarrow'}), 501
+
+    source = request.args.get('table', 'raw')
+    if source not in EXPORT_SOURCES:
+        return jsonify({'error': f"Invalid table, use one of {', '.join(EXPORT_SOURCES)}"}), 400
+    table_class = EXPORT_SOURCES[source] or get_station_table()
+    table = table_class.__table__
+    date_column = table.columns[get_date_column_name(table_class)]
+
+    # Volitelný výběr sloupců, sloupec s datem je vždy první
+    columns = list(table.columns)
+    if request.args.get('columns'):
+        selected_columns = request.args['columns'].split(',')
+        unknown_columns = [column_name for column_name in selected_columns if column_name not in table.columns]
+        if unknown_columns:
+            return jsonify({'error': f"Unknown columns: {', '.join(unknown_columns)}"}), 400
+        columns = [date_column] + [table.columns[column_name] for column_name in selected_columns if column_name != date_column.key]
+
+    query = select(*columns).where(date_range_filter(date_column, start, end)).order_by(date_column, table.columns.id)
+
+    if source == 'raw' and archive_overlaps(table_class, start, end):
+        batches = batches_with_archive(db.engine, table_class, columns, start, end, query)
+    else:
+        batches = export_batches(db.engine, query)
+
+    mimetype, extension = EXPORT_FORMATS[file_format]
+    filename = f'{table.name}_{start.date()}_{end.date()}.{extension}'
+    # Generátor běží až po návratu z view – kontext požadavku (db, konfigurace archivu) zůstane dostupný
+    return Response(
+        stream_with_context(generate_export(columns, batches, file_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_reading():
+    try:
+        # Data z GW1000 ve formátu Ecowitt (application/x-www-form-urlencoded)
+        form = request.form
+        # Bez nastaveného PASSKEY by mohl zapisovat kdokoli – příjem je vypnutý
+        if not INGEST_PASSKEY:
+            return jsonify({'error': 'Ingest is disabled, set INGEST_PASSKEY in config.cfg'}), 503
+        if not hmac.compare_digest(form.get('PASSKEY', ''), INGEST_PASSKEY):
+            return jsonify({'error': 'Invalid PASSKEY'}), 403
+
+        station_id = request.args.get('station', DEFAULT_STATION_ID)
+        if not STATION_ID_PATTERN.match(station_id):
+            return jsonify({'error': 'Invalid station'}), 400
+
+        writer = get_ingest_writer(station_id)
+        try:
+            reading = parse_reading(form, writer.table)
+        except ValueError as e:
+            # Neplatný dateutc nebo hodnota mimo rozsah sloupce
+            return jsonify({'error': str(e)}), 400
+        writer.submit(reading)
+
+        return jsonify({'message': 'Reading accepted'}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stations', methods=['GET'])
+@jwt_required()
+def get_stations():
+    return jsonify({'stations': station_registry.list_station_ids(), 'default': DEFAULT_STATION_ID})
+
+@app.route('/api/data/stations/last_data', methods=['GET'])
+@jwt_required()
+def get_all_stations_last_data():
+    try:
+        # Tabulky všech meteostanic, které v databázi skutečně existují
+        tables = {}
+        for station_id in station_registry.list_station_ids():
+            try:
+                tables[station_id] = station_registry.get(station_id).__table__
+            except StationNotFound:
+                continue
+
+        # Poslední měření ze všech stanic souběžně, každý dotaz s vlastním spojením
+        engine = db.engine
+        futures = {station_id: fanout_executor.submit(fetch_last_row, engine, table) for station_id, table in tables.items()}
+
+        return jsonify({station_id: future.result() for station_id, future in futures.items()})
+
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/api/batch', methods=['POST'])
+@jwt_required()
+def batch_requests():
+    # Více GET dotazů v jednom požadavku: {"requests": ["/api/data/last_data", {"id": "max", "path": "/api/data/today/max"}]}
+    items = (request.get_json(silent=True) or {}).get('requests')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Parameter requests must be a non-empty list'}), 400
+    if len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({'error': f'At most {BATCH_MAX_REQUESTS} requests are allowed in one batch'}), 400
+
+    adapter = app.url_map.bind('localhost')
+    batch = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'path': item}
+        path = item.get('path') if isinstance(item, dict) else None
+        if not isinstance(path, str) or not path.startswith('/api/'):
+            return jsonify({'error': 'Each request must be a path starting with /api/'}), 400
+        parts = urlsplit(path)
+        try:
+            endpoint, _ = adapter.match(parts.path, method='GET')
+        except HTTPException:
+            # Neexistující cesta – 404 nebo 405 vrátí přímo její dotaz
+            endpoint = None
+        query = dict(parse_qsl(parts.query))
+        if endpoint in BATCH_EXCLUDED_ENDPOINTS or endpoint == 'batch_requests' or query.get('format') in ('ndjson', 'stream'):
+            return jsonify({'error': f'Request {path} cannot be part of a batch'}), 400
+        batch.append((item.get('id', path), path))
+
+    # Každý různý dotaz jednou, všechny souběžně – celková doba je doba nejpomalejšího dotazu
+    authorization = request.headers.get('Authorization')
+    futures = {}
+    for _, path in batch:
+        key = batch_request_key(path)
+        if key not in futures:
+            futures[key] = batch_executor.submit(run_batch_request, path, authorization)
+
+    parts = []
+    for request_id, path in batch:
+        status, body = futures[batch_request_key(path)].result()
+        parts.append(
+            b'{"id":' + app.json.dumps(request_id).encode() + b',"status":' + str(status).encode()
+            + b',"body":' + body.strip() + b'}'
+        )
+    return Response(b'{"responses":[' + b','.join(parts) + b']}', mimetype='application/json')
+
+@app.route('/api/stream/live', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def get_live_stream():
+    # Token lze předat i v parametru jwt – EventSource v prohlížeči neumí posílat hlavičky
+    get_station_table()
+    station_id = request.args.get('station') or DEFAULT_STATION_ID
+    try:
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+
+    channel = live_feed.subscribe(station_id)
+    if channel is None:
+        return jsonify({'error': 'Too many live subscribers'}), 503
+    if last_event_id is None:
+        # Nový klient dostane nejdřív poslední měření
+        last_event_id = (channel.last_id or 0) - 1
+
+    return Response(
+        generate_live_events(channel, station_id, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/stats/quantiles', methods=['GET'])
+@jwt_required()
+def get_quantiles():
+    if sketch_engine is None:
+        return jsonify({'error': 'Quantile sketches are disabled'}), 404
+
+    # Kontrola parametrů
+    column_name = request.args.get('column')
+    if column_name not in sketch_engine.scales:
+        return jsonify({'error': 'Invalid column'}), 400
+    try:
+        start = parse_range_datetime(request.args['from'])
+        end = parse_range_datetime(request.args['to']) if request.args.get('to') else datetime.now()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Parameters from and to must be dates in ISO format'}), 400
+    try:
+        quantiles = [float(value) for value in request.args.get('q', '0.5').split(',')]
+        if not all(0 <= value <= 1 for value in quantiles):
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'Parameter q must be a list of numbers between 0 and 1'}), 400
+    try:
+        bins = int(request.args.get('bins', 0))
+        if not 0 <= bins <= 1000:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'Parameter bins must be a number between 0 and 1000'}), 400
+
+    # Interval se rozšíří na celé hodiny, hodnoty ve sketchi jsou celá čísla (hodnota * 10^scale)
+    sketch, start, end = sketch_engine.merged_sketch(column_name, start, end)
+    scale = sketch_engine.scales[column_name]
+
+    def unscaled(value):
+        return None if value is None else round(value / 10 ** scale, scale + 1)
+
+    response = {
+        'column': column_name,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'count': sketch.count,
+        'min': unscaled(sketch.min_value),
+        'max': unscaled(sketch.max_value),
+        'quantiles': {str(q): unscaled(sketch.quantile(q)) for q in quantiles},
+        # Sketch je histogram s intervaly pevné šířky (ne t-digest ani KLL) – pořadí kvantilu je přesné, hodnota
+        # je střed intervalu šířky resolution a od skutečného kvantilu se liší nejvýše o max_error
+        'method': 'fixed-width histogram',
+        'resolution': unscaled(sketch.width) if sketch.count else None,
+        'max_error': unscaled(sketch.max_error()) if sketch.count else None,
+    }
+    if bins:
+        response['histogram'] = [
+            {'from': unscaled(low), 'to': unscaled(high), 'count': count} for low, high, count in sketch.histogram(bins)
+        ]
+    return jsonify(response)
+
+def internal_only(view):
+    # Jen z adres v INTERNAL_ALLOWED_NETWORKS (Prometheus, správa na stejném stroji)
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            address = ipaddress.ip_address(request.remote_addr or '')
+        except ValueError:
+            address = None
+        if address is None or not any(address in network for network in INTERNAL_ALLOWED_NETWORKS):
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/metrics', methods=['GET'])
+@internal_only
+def get_metrics():
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    stats = response_cache.stats()
+    if reading_ring is not None:
+        stats['reading_ring'] = reading_ring.stats()
+    if archive_engine is not None:
+        stats['archive'] = archive_engine.store(BaseMeteostation.__table__.name).stats()
+    if sketch_engine is not None:
+        stats['sketches'] = sketch_engine.stats()
+    stats['statements'] = statement_cache.stats()
+    return jsonify(stats)
+
 @app.route('/api/test/run_all_tests', methods=['GET'])
+@jwt_required()
+@internal_only
 def run_all_tests():
     # Spuštění všech testů
+    # Import až při spuštění – testing_api importuje tento modul
+    import testing_api as TEST
     test_result = unittest.TextTestRunner().run(unittest.defaultTestLoader.loadTestsFromTestCase(TEST.TestFlaskAPI))
     
     # Získání výsledků testů
@@ -410,20 +1864,24 @@ def run_all_tests():
     
 @app.route('/api/data/meteostation/today', methods=['GET'])
 @jwt_required()
+@cached_response(today_period, get_station_table)
 def get_meteostation_data_today():
+    # Tabulka zvolené meteostanice (parametr station)
+    station_table = get_station_table()
+
     try:
         # Získání aktuálního data
         today = datetime.now().date()
 
-        # Získání dat z tabulky BaseMeteostation pro dnešní den
-        data = db.session.query(BaseMeteostation).filter(BaseMeteostation.time >= today).all()
+        # Dnešní data z bufferu posledních měření, jinak z databáze
+        response = ring_rows_response(station_table, *day_range(today))
+        if response is not None:
+            return response
 
-        # Příprava výstupu
-        data_list = [row.__dict__ for row in data]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
+        # Získání dat z tabulky meteostanice pro dnešní den
+        query = db.session.query(station_table).filter(date_range_filter(station_table.time, *day_range(today)))
 
-        return jsonify(data_list)
+        return rows_response(query, station_table)
 
     except Exception as e:
         return jsonify({'error': str(e)})
@@ -431,50 +1889,39 @@ def get_meteostation_data_today():
 
 @app.route('/api/data/meteostation/<date>', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(day_range), get_station_table)
 def get_meteostation_data_by_date(date):
+    # Tabulka zvolené meteostanice (parametr station)
+    station_table = get_station_table()
+
     try:
         # Převedení řetězce s datem na objekt datetime
         selected_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        # Získání dat z tabulky BaseMeteostation pro zadané datum
-        data = db.session.query(BaseMeteostation).filter(func.date(BaseMeteostation.time) == selected_date).all()
+        # Den ve stáří archivu se čte ze souboru archivu (a z tabulky, pokud se měsíc právě archivuje)
+        archived_rows = rows_with_archive(station_table, *day_range(selected_date))
+        if archived_rows is not None:
+            return archived_rows_response(station_table, archived_rows)
 
-        # Příprava výstupu
-        data_list = [row.__dict__ for row in data]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
+        # Získání dat z tabulky meteostanice pro zadané datum
+        query = db.session.query(station_table).filter(date_range_filter(station_table.time, *day_range(selected_date)))
 
-        return jsonify(data_list)
+        return rows_response(query, station_table)
 
     except Exception as e:
         return jsonify({'error': str(e)})
 
 @app.route('/api/data/meteostation/today/max', methods=['GET'])
 @jwt_required()
+@cached_response(today_period, get_station_table)
 def get_meteostation_max_today():
-    try:
-        # Získání aktuálního data
-        today = datetime.now().date()
-
-        # Získání dat z tabulky BaseMeteostation pro dnešní den
-        data_today = db.session.query(BaseMeteostation).filter(BaseMeteostation.time >= today, BaseMeteostation.time < today + timedelta(days=1)).all()
-
-        # Inicializace slovníku pro maximální hodnoty
-        max_values_dict = {}
-
-        # Projití všech sloupců tabulky
-        for column in BaseMeteostation.__table__.columns:
-            column_name = column.key
-            max_value = None
+    # Tabulka zvolené meteostanice (parametr station)
+    station_table = get_station_table()
 
-            # Projití všech dat pro daný sloupec a nalezení maximální hodnoty
-            for row in data_today:
-                value = getattr(row, column_name)
-                if max_value is None or value > max_value:
-                    max_value = value
-
-            # Přidání maximální hodnoty do slovníku
-            max_values_dict[column_name] = max_value
+    try:
+        # Průběžné maximální hodnoty za dnešní den, z databáze se načtou jen nové řádky
+        today_stats = refresh_today_stats(station_table)
+        max_values_dict = today_stats.maximums()
 
         return jsonify(max_values_dict)
 
@@ -484,49 +1931,59 @@ def get_meteostation_max_today():
 
 @app.route('/api/data/meteostation/today/min', methods=['GET'])
 @jwt_required()
+@cached_response(today_period, get_station_table)
 def get_meteostation_min_today():
-    try:
-        # Získání aktuálního data
-        today = datetime.now().date()
-
-        # Získání dat z tabulky BaseMeteostation pro dnešní den
-        data_today = db.session.query(BaseMeteostation).filter(BaseMeteostation.time >= today, BaseMeteostation.time < today + timedelta(days=1)).all()
+    # Tabulka zvolené meteostanice (parametr station)
+    station_table = get_station_table()
 
-        # Inicializace slovníku pro minimální hodnoty
-        min_values_dict = {}
+    try:
+        # Průběžné minimální hodnoty za dnešní den, z databáze se načtou jen nové řádky
+        today_stats = refresh_today_stats(station_table)
+        min_values_dict = today_stats.minimums()
 
-        # Projití všech sloupců tabulky
-        for column in BaseMeteostation.__table__.columns:
-            column_name = column.key
-            min_value = None
+        return jsonify(min_values_dict)
 
-            # Projití všech dat pro daný sloupec a nalezení minimální hodnoty
-            for row in data_today:
-                value = getattr(row, column_name)
-                if min_value is None or value < min_value:
-                    min_value = value
+    except Exception as e:
+        return jsonify({'error': str(e)})
+        
+@app.route('/api/data/meteostation/today/avg', methods=['GET'])
+@jwt_required()
+@cached_response(today_period, get_station_table)
+def get_meteostation_avg_today():
+    # Tabulka zvolené meteostanice (parametr station)
+    station_table = get_station_table()
 
-            # Přidání minimální hodnoty do slovníku
-            min_values_dict[column_name] = min_value
+    try:
+        # Průběžné průměrné hodnoty za dnešní den
+        today_stats = refresh_today_stats(station_table)
+        avg_values_dict = today_stats.averages()
 
-        return jsonify(min_values_dict)
+        return jsonify(avg_values_dict)
 
     except Exception as e:
         return jsonify({'error': str(e)})
-        
+
 @app.route('/api/data/meteostation/min/<date>', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(day_range), get_station_table)
 def get_meteostation_min_by_date(date):
+    # Tabulka zvolené meteostanice (parametr station)
+    station_table = get_station_table()
+
     try:
         # Převedení řetězce s datem na objekt datetime
         selected_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        # Získání minimálních hodnot pro všechny sloupce z tabulky BaseMeteostation pro zadané datum
-        min_values_query = db.session.query(*[func.min(getattr(BaseMeteostation, column.name)) for column in BaseMeteostation.__table__.columns]).filter(func.date(BaseMeteostation.time) == selected_date)
+        archived_rows = rows_with_archive(station_table, *day_range(selected_date))
+        if archived_rows is not None:
+            return jsonify(column_extremes(station_table, archived_rows, min))
+
+        # Získání minimálních hodnot pro všechny sloupce z tabulky meteostanice pro zadané datum
+        min_values_query = db.session.query(*[func.min(getattr(station_table, column.name)) for column in station_table.__table__.columns]).filter(date_range_filter(station_table.time, *day_range(selected_date)))
         min_values = min_values_query.first()
 
         # Příprava výstupu
-        min_values_dict = {column.key: value for column, value in zip(BaseMeteostation.__table__.columns, min_values)}
+        min_values_dict = {column.key: value for column, value in zip(station_table.__table__.columns, min_values)}
 
         return jsonify(min_values_dict)
 
@@ -535,17 +1992,25 @@ def get_meteostation_min_by_date(date):
         
 @app.route('/api/data/meteostation/max/<date>', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(day_range), get_station_table)
 def get_meteostation_max_by_date(date):
+    # Tabulka zvolené meteostanice (parametr station)
+    station_table = get_station_table()
+
     try:
         # Převedení řetězce s datem na objekt datetime
         selected_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        # Získání maximálních hodnot pro všechny sloupce z tabulky BaseMeteostation pro zadané datum
-        max_values_query = db.session.query(*[func.max(getattr(BaseMeteostation, column.name)) for column in BaseMeteostation.__table__.columns]).filter(func.date(BaseMeteostation.time) == selected_date)
+        archived_rows = rows_with_archive(station_table, *day_range(selected_date))
+        if archived_rows is not None:
+            return jsonify(column_extremes(station_table, archived_rows, max))
+
+        # Získání maximálních hodnot pro všechny sloupce z tabulky meteostanice pro zadané datum
+        max_values_query = db.session.query(*[func.max(getattr(station_table, column.name)) for column in station_table.__table__.columns]).filter(date_range_filter(station_table.time, *day_range(selected_date)))
         max_values = max_values_query.first()
 
         # Příprava výstupu
-        max_values_dict = {column.key: value for column, value in zip(BaseMeteostation.__table__.columns, max_values)}
+        max_values_dict = {column.key: value for column, value in zip(station_table.__table__.columns, max_values)}
 
         return jsonify(max_values_dict)
 
@@ -554,139 +2019,108 @@ def get_meteostation_max_by_date(date):
         
 @app.route('/api/data/weekly_test/<date>', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(week_range), AggregatedDailyData)
 def get_weekly_data_by_date_test(date):
     try:
         # Převedení řetězce s datem na objekt datetime
         selected_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        # Zjištění prvního dne týdne obsahující zadané datum
-        first_day_of_week = selected_date - timedelta(days=selected_date.weekday())
-
-        # Získání dat z tabulky AggregatedDailyData pro daný týden
-        #weekly_data = db.session.query(AggregatedDailyData).filter(func.date_trunc('week', AggregatedDailyData.week_start) == first_day_of_week).all()
-        weekly_data = db.session.query(AggregatedDailyData).filter(func.DATE(AggregatedDailyData.week_start) >= first_day_of_week, func.DATE(AggregatedDailyData.week_start) < first_day_of_week + timedelta(days=7)).all()
-
-        # Příprava výstupu
-        data_list = [row.__dict__ for row in weekly_data]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
+        # Získání dat z tabulky AggregatedDailyData pro týden obsahující zadané datum
+        query = db.session.query(AggregatedDailyData).filter(date_range_filter(AggregatedDailyData.week_start, *week_range(selected_date)))
 
-        return jsonify(data_list)
+        return rows_response(query, AggregatedDailyData)
 
     except Exception as e:
         return jsonify({'error': str(e)})
         
 @app.route('/api/data/monthly_test/<date>', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(month_range), AggregatedDailyData)
 def get_monthly_data_by_date(date):
     try:
         # Převedení řetězce s datem na objekt datetime
         selected_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        # Získání roku a měsíce ze zadaného data
-        year = selected_date.year
-        month = selected_date.month
-
-        # Získání dat z tabulky AggregatedDailyData pro daný měsíc
-        monthly_data = db.session.query(AggregatedDailyData).filter(extract('year', AggregatedDailyData.week_start) == year, extract('month', AggregatedDailyData.week_start) == month).all()
-
-        # Příprava výstupu
-        data_list = [row.__dict__ for row in monthly_data]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
+        # Získání dat z tabulky AggregatedDailyData pro měsíc zadaného data
+        query = db.session.query(AggregatedDailyData).filter(date_range_filter(AggregatedDailyData.week_start, *month_range(selected_date)))
 
-        return jsonify(data_list)
+        return rows_response(query, AggregatedDailyData)
 
     except Exception as e:
         return jsonify({'error': str(e)})
         
 @app.route('/api/data/hourly/weekly/<date>', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(week_range), AggregatedData)
 def get_hourly_data_weekly_by_date(date):
     try:
         # Převedení řetězce s datem na objekt datetime
         selected_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        # Zjištění prvního dne týdne, ke kterému zadané datum patří
-        first_day_of_week = selected_date - timedelta(days=selected_date.weekday())
-
-        # Získání dat z tabulky BaseMeteostation pro každý den daného týdne
-        hourly_data_weekly = []
-        for i in range(7):
-            # Získání dat pro každý den týdne
-            selected_date = first_day_of_week + timedelta(days=i)
-            hourly_data_daily = db.session.query(AggregatedData).filter(func.date(AggregatedData.time) == selected_date).all()
-            hourly_data_weekly.extend(hourly_data_daily)
-
-        # Příprava výstupu
-        data_list = [row.__dict__ for row in hourly_data_weekly]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
+        # Získání dat z tabulky AggregatedData pro celý týden jedním dotazem
+        query = db.session.query(AggregatedData).filter(
+            date_range_filter(AggregatedData.time, *week_range(selected_date))
+        ).order_by(AggregatedData.time)
 
-        return jsonify(data_list)
+        return rows_response(query, AggregatedData)
 
     except Exception as e:
         return jsonify({'error': str(e)})
 
 @app.route('/api/data/4hourly/monthly/<date>', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(month_range), AggregatedData)
 def get_4hourly_data_monthly_by_date(date):
     try:
         # Převedení řetězce s datem na objekt datetime
         selected_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        # Získání roku a měsíce zadaného data
-        year = selected_date.year
-        month = selected_date.month
-
-        # Získání dat z tabulky BaseMeteostation pro daný měsíc, kde čas odpovídá 0, 4, 8, 12, 16 a 20 hodin
-        hourly_data_monthly = db.session.query(AggregatedData).filter(
-            extract('year', AggregatedData.time) == year,
-            extract('month', AggregatedData.time) == month,
+        # Získání dat z tabulky AggregatedData pro daný měsíc, kde čas odpovídá 0, 4, 8, 12, 16 a 20 hodin
+        query = db.session.query(AggregatedData).filter(
+            date_range_filter(AggregatedData.time, *month_range(selected_date)),
             extract('hour', AggregatedData.time).in_([0, 4, 8, 12, 16, 20])
-        ).all()
-
-        # Příprava výstupu
-        data_list = [row.__dict__ for row in hourly_data_monthly]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
+        )
 
-        return jsonify(data_list)
+        return rows_response(query, AggregatedData)
 
     except Exception as e:
         return jsonify({'error': str(e)})
         
 @app.route('/api/data/daily/yearly/<date>', methods=['GET'])
 @jwt_required()
+@cached_response(closed_period(year_range), AggregatedDailyData)
 def get_daily_data_yearly_by_date(date):
     try:
         # Převedení řetězce s datem na objekt datetime
         selected_date = datetime.strptime(date, '%Y-%m-%d')
 
-        # Získání roku z vybraného data
-        selected_year = selected_date.year
-
-        # Získání dat z tabulky AggregatedDailyData pro daný rok
-        daily_data_yearly = db.session.query(AggregatedDailyData).filter(
-            extract('year', AggregatedDailyData.week_start) == selected_year
-        ).all()
-
-        # Příprava výstupu
-        data_list = [row.__dict__ for row in daily_data_yearly]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
+        # Získání dat z tabulky AggregatedDailyData pro rok vybraného data
+        query = db.session.query(AggregatedDailyData).filter(
+            date_range_filter(AggregatedDailyData.week_start, *year_range(selected_date))
+        )
 
-        return jsonify(data_list)
+        return rows_response(query, AggregatedDailyData)
 
     except Exception as e:
         return jsonify({'error': str(e)})
         
 @app.route('/api/data/meteostation/all_last_data', methods=['GET'])
 @jwt_required()
+@cached_response(None, get_station_table)
 def get_all_last_meteostation_data():
+    # Tabulka zvolené meteostanice (parametr station)
+    station_table = get_station_table()
+
     try:
-        # Získání posledních dat z tabulky BaseMeteostation
-        last_data = db.session.query(BaseMeteostation).order_by(desc(BaseMeteostation.time)).first()
+        # Den posledního měření z bufferu posledních měření, pokud ho obsahuje celý
+        ring = reading_ring_for(station_table)
+        if ring is not None and ring.last_time is not None:
+            response = ring_rows_response(station_table, *day_range(ring.last_time.date()))
+            if response is not None:
+                return response
+
+        # Získání posledních dat z tabulky meteostanice
+        last_data = db.session.query(station_table).order_by(desc(station_table.time)).first()
 
         # Pokud nebyla žádná data nalezena, vrátíme chybovou zprávu
         if not last_data:
@@ -695,24 +2129,19 @@ def get_all_last_meteostation_data():
         # Získání data z posledního záznamu
         reference_date = last_data.time.date()
 
-        # Vytvoření časového rozmezí od 00:00:00 do 23:59:59 pro vybraný den
-        start_of_day = datetime.combine(reference_date, datetime.min.time())
-        end_of_day = datetime.combine(reference_date, datetime.max.time())
+        # Vytvoření časového rozmezí pro vybraný den
+        start_of_day, end_of_day = day_range(reference_date)
 
         # Získání posledních dat z tabulky pro vybraný den
-        last_data_for_day = db.session.query(BaseMeteostation).filter(
-            BaseMeteostation.time.between(start_of_day, end_of_day)
-        ).all()
-
-        # Příprava výstupu
-        data_list = [row.__dict__ for row in last_data_for_day]
-        for item in data_list:
-            item.pop('_sa_instance_state', None)
+        query = db.session.query(station_table).filter(
+            date_range_filter(station_table.time, start_of_day, end_of_day)
+        )
 
-        return jsonify(data_list)
+        return rows_response(query, station_table)
 
     except Exception as e:
         return jsonify({'error': str(e)})
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
+    # Vývojový server, v produkci se spouští serve.py
+    app.run(debug=config['DEFAULT'].getboolean('DEBUG', fallback=False), host='0.0.0.0', threaded=True)
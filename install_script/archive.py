@@ -0,0 +1,348 @@
+import configparser
+import gzip
+import json
+import os
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy import MetaData, Table, and_, create_engine, delete, func, select
+from sqlalchemy.exc import NoSuchTableError
+
+from ring_buffer import MISSING, decode_value, encode_value, value_scales
+from stations import STATION_TABLE_PREFIX
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value):
+    if value.month == 12:
+        return datetime(value.year + 1, 1, 1)
+    return datetime(value.year, value.month + 1, 1)
+
+
+def write_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+@lru_cache(maxsize=8)
+def load_month_file(path, modified):
+    # Rozbalený měsíc se drží v paměti, dokud se soubor nezmění (modified = mtime souboru)
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+
+@lru_cache(maxsize=64)
+def load_index_file(path, modified):
+    # Index s předem převedenými rozsahy času měsíců – čte se při každém dotazu do archivu, ze souboru jen po změně
+    with open(path, encoding='utf-8') as file:
+        index = json.load(file)
+    month_ranges = [
+        (datetime.fromisoformat(month_info['min_time']), datetime.fromisoformat(month_info['max_time']), month_info)
+        for _, month_info in sorted(index['months'].items())
+        if month_info['min_time'] is not None
+    ]
+    return index, month_ranges
+
+
+def merge_by_id(existing, rows, column_names, scales):
+    # Sloučení již archivovaných řádků (n-tice zakódovaných hodnot seřazené podle id) s novými řádky
+    # z databáze (seřazené podle id) – při stejném id platí řádek z databáze
+    existing = iter(existing)
+    current = next(existing, None)
+    for row in rows:
+        while current is not None and current['id'] < row['id']:
+            yield current
+            current = next(existing, None)
+        if current is not None and current['id'] == row['id']:
+            current = next(existing, None)
+        yield {
+            column_name: encode_value(column_name, scales.get(column_name), row[column_name])
+            for column_name in column_names if column_name in row
+        }
+    while current is not None:
+        yield current
+        current = next(existing, None)
+
+
+class ArchiveStore:
+    # Archiv jedné tabulky meteostanice – soubor <rok>-<měsíc>.json.gz na měsíc (sloupce jako celá čísla)
+    # a index.json s rozsahem času a id každého měsíce
+    def __init__(self, archive_dir, table_name):
+        self.directory = os.path.join(archive_dir, table_name)
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def read_index(self):
+        # Vlastní kopie indexu pro zápis
+        try:
+            with open(self.index_path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'archived_before': None, 'months': {}}
+
+    def cached_index(self):
+        # Index a rozsahy měsíců jen pro čtení – soubor se načte znovu, až když se změní
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return {'archived_before': None, 'months': {}}, []
+        return load_index_file(self.index_path, (stat.st_mtime_ns, stat.st_ino, stat.st_size))
+
+    def archived_before(self):
+        # Všechna měření starší než tento čas jsou v archivu a ne v tabulce (None = archiv je prázdný)
+        value = self.cached_index()[0]['archived_before']
+        return datetime.fromisoformat(value) if value else None
+
+    def _month_path(self, month):
+        return os.path.join(self.directory, month.strftime('%Y-%m') + '.json.gz')
+
+    def _read_month(self, path):
+        try:
+            return load_month_file(path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def write_month(self, month, column_names, scales, rows):
+        # Sloučení s již archivovanými řádky měsíce (opakovaný běh po pádu, pozdě zapsaná měření). rows jsou řádky
+        # z databáze seřazené podle id (i postupně čtené přes kurzor) – hodnoty se ukládají rovnou do polí celých
+        # čísel po sloupcích a soubor se zapisuje průběžně. Vrací id zapsaných řádků z databáze
+        with self.lock:
+            path = self._month_path(month)
+            existing_rows = []
+            existing = self._read_month(path)
+            if existing is not None:
+                # Sloupce přidané do tabulky později (script_.php) i sloupce, které už v tabulce nejsou
+                scales = {**dict(zip(existing['columns'], existing['scales'])), **scales}
+                column_names = list(dict.fromkeys(existing['columns'] + column_names))
+                existing_rows = (dict(zip(existing['columns'], values)) for values in zip(*existing['data']))
+
+            written_ids = array('q')
+
+            def database_rows():
+                for row in rows:
+                    written_ids.append(row['id'])
+                    yield row
+
+            columns = [array('q') for _ in column_names]
+            for row in merge_by_id(existing_rows, database_rows(), column_names, scales):
+                for column_name, values in zip(column_names, columns):
+                    value = row.get(column_name)
+                    values.append(MISSING if value is None else value)
+
+            tmp_path = path + '.tmp'
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=9) as file:
+                file.write('{"columns":' + json.dumps(column_names, separators=(',', ':')))
+                file.write(',"scales":' + json.dumps([scales.get(column_name) for column_name in column_names]))
+                file.write(',"data":[')
+                for position, values in enumerate(columns):
+                    file.write(',[' if position else '[')
+                    file.write(','.join('null' if value == MISSING else str(value) for value in values))
+                    file.write(']')
+                file.write(']}')
+            os.replace(tmp_path, path)
+
+            ids = columns[column_names.index('id')]
+            times = [value for value in columns[column_names.index('time')] if value != MISSING]
+            index = self.read_index()
+            index['months'][month.strftime('%Y-%m')] = {
+                'file': os.path.basename(path),
+                'rows': len(ids),
+                'min_id': ids[0] if ids else None,
+                'max_id': ids[-1] if ids else None,
+                'min_time': decode_value('time', None, min(times)).isoformat() if times else None,
+                'max_time': decode_value('time', None, max(times)).isoformat() if times else None,
+            }
+            write_atomic(self.index_path, json.dumps(index, indent=1, sort_keys=True).encode())
+            return written_ids
+
+    def mark_archived_before(self, value):
+        # Posun hranice archivu, až když v tabulce nezůstalo žádné starší měření
+        with self.lock:
+            index = self.read_index()
+            if index['archived_before'] is None or value > datetime.fromisoformat(index['archived_before']):
+                index['archived_before'] = value.isoformat()
+                write_atomic(self.index_path, json.dumps(index, indent=1, sort_keys=True).encode())
+
+    def _overlapping_months(self, start, end):
+        # Měsíce, jejichž rozsah času z indexu zasahuje do intervalu [start, end)
+        return [
+            month_info for min_time, max_time, month_info in self.cached_index()[1]
+            if max_time >= start and min_time < end
+        ]
+
+    def overlaps(self, start, end):
+        return bool(self._overlapping_months(start, end))
+
+    def iter_month_rows(self, start, end, column_names):
+        # Po měsících: řádky s časem v intervalu [start, end) seřazené podle času a id, se sloupci aktuální tabulky
+        for month_info in self._overlapping_months(start, end):
+            month = self._read_month(os.path.join(self.directory, month_info['file']))
+            if month is None:
+                continue
+            columns = month['columns']
+            scales = month['scales']
+            time_index = columns.index('time')
+            rows = []
+            for values in zip(*month['data']):
+                if values[time_index] is None:
+                    continue
+                row_time = decode_value('time', None, values[time_index])
+                if start <= row_time < end:
+                    stored = {
+                        column_name: decode_value(column_name, scale, value)
+                        for column_name, scale, value in zip(columns, scales, values)
+                    }
+                    rows.append((row_time, stored.get('id'), {column_name: stored.get(column_name) for column_name in column_names}))
+            rows.sort(key=lambda item: item[:2])
+            yield [row for _, _, row in rows]
+
+    def rows_between(self, start, end, column_names):
+        # Řádky s časem v intervalu [start, end) seřazené podle id, se sloupci aktuální tabulky
+        rows = [row for month_rows in self.iter_month_rows(start, end, ['id'] + column_names) for row in month_rows]
+        rows.sort(key=lambda row: row['id'])
+        return [{column_name: row[column_name] for column_name in column_names} for row in rows]
+
+    def stats(self):
+        index = self.cached_index()[0]
+        return {
+            'archived_before': index['archived_before'],
+            'months': len(index['months']),
+            'rows': sum(month_info['rows'] for month_info in index['months'].values()),
+        }
+
+
+class ArchiveEngine:
+    # Přesun surových měření starších než after_days do archivu – vždy celé měsíce, od nejstaršího
+    def __init__(self, engine, archive_dir, after_days=365, archivable_id=None, batch_size=5000):
+        self.engine = engine
+        self.archive_dir = archive_dir
+        self.after_days = after_days
+        # Funkce vracející nejvyšší id, které už zpracoval rollup (None = bez omezení)
+        self.archivable_id = archivable_id
+        # Řádky se z databáze čtou i mažou po dávkách
+        self.batch_size = batch_size
+        self.stores = {}
+        self.lock = threading.Lock()
+
+    def store(self, table_name):
+        store = self.stores.get(table_name)
+        if store is None:
+            store = self.stores[table_name] = ArchiveStore(self.archive_dir, table_name)
+        return store
+
+    def cutoff(self):
+        # Archivují se jen měsíce, které celé skončily před hranicí stáří
+        return month_start(datetime.now() - timedelta(days=self.after_days))
+
+    def archive_table(self, table_name):
+        # Schéma se načítá při každém běhu – script_.php přidává sloupce za běhu
+        table = Table(table_name, MetaData(), autoload_with=self.engine)
+        scales = value_scales(table)
+        column_names = [column.name for column in table.columns]
+        store = self.store(table_name)
+        cutoff = self.cutoff()
+        max_id = self.archivable_id(table_name) if self.archivable_id is not None else None
+        archivable = table.c.time < cutoff if max_id is None else and_(table.c.time < cutoff, table.c.id <= max_id)
+        archived = 0
+        while True:
+            with self.engine.connect() as conn:
+                oldest = conn.execute(select(func.min(table.c.time)).where(archivable)).scalar()
+            if oldest is None:
+                return archived
+
+            month = month_start(oldest)
+            in_month = and_(table.c.time >= month, table.c.time < next_month(month))
+            # Nejdřív zápis souboru, až potom smazání z tabulky – po pádu se měsíc jen znovu sloučí.
+            # Řádky se čtou serverovým kurzorem po dávkách, v paměti jsou jen zakódované hodnoty měsíce
+            with self.engine.connect() as conn:
+                rows = conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(
+                    select(table).where(and_(in_month, archivable)).order_by(table.c.id)
+                ).mappings()
+                written_ids = store.write_month(month, column_names, scales, rows)
+            # Maže se jen to, co je v souboru – řádek potvrzený mezitím zůstane v tabulce do dalšího běhu
+            for batch_start in range(0, len(written_ids), self.batch_size):
+                with self.engine.begin() as conn:
+                    conn.execute(delete(table).where(table.c.id.in_(written_ids[batch_start:batch_start + self.batch_size].tolist())))
+            with self.engine.connect() as conn:
+                remaining = conn.execute(select(func.count()).select_from(table).where(in_month)).scalar()
+            archived += len(written_ids)
+            print(f"Archiv: {table_name} {month.strftime('%Y-%m')}, {len(written_ids)} řádků")
+
+            # Měsíc, ve kterém zůstala měření nezpracovaná rollupem, se dokončí při dalším běhu
+            if remaining:
+                return archived
+            store.mark_archived_before(next_month(month))
+
+    def run_once(self, table_names):
+        with self.lock:
+            return sum(self.archive_table(table_name) for table_name in table_names)
+
+
+def processed_id(engine, table_name, state_table_names):
+    # Nejvyšší id tabulky meteostanice, které zpracovaly všechny tabulky stavu (rollup_state, sketch_state).
+    # Chybějící tabulka stavu nebo záznam = ještě nic nezpracováno
+    last_ids = []
+    for state_table_name in state_table_names:
+        try:
+            state_table = Table(state_table_name, MetaData(), autoload_with=engine)
+        except NoSuchTableError:
+            last_ids.append(0)
+            continue
+        with engine.connect() as conn:
+            last_ids.append(conn.execute(
+                select(state_table.c.last_id).where(state_table.c.source_table == table_name)
+            ).scalar() or 0)
+    return min(last_ids) if last_ids else None
+
+
+class ArchiveWorker(threading.Thread):
+    # Vlákno, které v pravidelném intervalu archivuje staré měření všech meteostanic
+    def __init__(self, archive_engine, table_names, interval=86400):
+        super().__init__(name='archive-worker', daemon=True)
+        self.archive_engine = archive_engine
+        self.table_names = table_names
+        self.interval = interval
+
+    def run(self):
+        while True:
+            try:
+                self.archive_engine.run_once(self.table_names())
+            except Exception as e:
+                print(f"Archivace selhala: {e}")
+            time.sleep(self.interval)
+
+
+if __name__ == '__main__':
+    config = configparser.ConfigParser()
+    config.read(os.environ.get('WEATHER_API_CONFIG', '/var/www/html/config.cfg'))
+    engine = create_engine(config['DEFAULT']['SQLALCHEMY_DATABASE_URI'])
+    # Výchozí meteostanici zpracovává rollup a sketche (pokud jsou zapnuté) – archivovat se smí jen to,
+    # co už zpracovaly, stejně jako ve workeru API
+    default_table_name = STATION_TABLE_PREFIX + config['DEFAULT'].get('DEFAULT_STATION_ID', fallback='meteostation1')
+    state_table_names = []
+    if config['DEFAULT'].getint('ROLLUP_INTERVAL', fallback=0) > 0:
+        state_table_names.append('rollup_state')
+    if config['DEFAULT'].getint('SKETCH_INTERVAL', fallback=0) > 0:
+        state_table_names.append('sketch_state')
+    archive_engine = ArchiveEngine(
+        engine,
+        config['DEFAULT'].get('ARCHIVE_DIR', fallback='/var/lib/weather_api/archive'),
+        after_days=config['DEFAULT'].getint('ARCHIVE_AFTER_DAYS', fallback=365),
+        archivable_id=lambda table_name: (
+            processed_id(engine, table_name, state_table_names) if table_name == default_table_name else None
+        )
+    )
+    with engine.connect() as conn:
+        station_ids = conn.execute(select(Table('Meteostations', MetaData(), autoload_with=engine).c.meteostation_id)).scalars().all()
+    start = time.time()
+    processed = archive_engine.run_once([STATION_TABLE_PREFIX + station_id for station_id in station_ids])
+    print(f"Archivováno {processed} řádků za {time.time() - start:.2f} s")
@@ -0,0 +1,521 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import resource
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Date, DateTime, Integer, MetaData, Numeric, String, Table, create_engine, func, select, text
+from werkzeug.security import generate_password_hash
+
+from ingest import SENSORS, ensure_station_table
+from rollup import RollupEngine
+from sketches import SketchEngine
+from stations import STATION_TABLE_PREFIX
+
+# Benchmark nad syntetickými daty – vlastní databáze (SQLite v dočasném adresáři nebo lokální MariaDB),
+# vlastní konfigurace a uživatel, výsledky jako JSON pro porovnání mezi běhy
+
+BENCHMARK_USER = 'benchmark'
+BENCHMARK_CODE = 'benchmark'
+BENCHMARK_PASSKEY = 'benchmark'
+INSERT_BATCH_SIZE = 5000
+
+# Tabulky aggregated_*: (název, sloupec s datem, typ sloupce s datem)
+AGGREGATED_TABLES = [
+    ('aggregated_data', 'time', DateTime),
+    ('aggregated_daily_data', 'week_start', Date),
+    ('aggregated_weekly_data', 'week_start', Date),
+    ('aggregated_monthly_data', 'next_month_start', Date),
+]
+
+
+def create_schema(engine):
+    # Stejné tabulky jako na produkční databázi (Weather_table_* vytváří ensure_station_table)
+    metadata = MetaData()
+    for table_name, date_column_name, date_type in AGGREGATED_TABLES:
+        Table(
+            table_name, metadata,
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column(date_column_name, date_type, index=True),
+            *[Column(column_name, Numeric(5, 2)) for column_name in SENSORS]
+        )
+    Table(
+        'users', metadata,
+        Column('id', Integer, primary_key=True, autoincrement=True),
+        Column('username', String(50)),
+        Column('password', String(255)),
+        Column('token', String(512)),
+    )
+    Table(
+        'meteo_codes', metadata,
+        Column('id', Integer, primary_key=True, autoincrement=True),
+        Column('code', String(50)),
+    )
+    metadata.create_all(engine)
+    return metadata
+
+
+class WeatherModel:
+    # Syntetická meteostanice – roční a denní chod teploty, tlak a vítr jako náhodná procházka, občasné srážky
+    def __init__(self, rng, start):
+        self.rng = rng
+        self.offset = rng.uniform(-4, 4)
+        self.temperature_noise = 0.0
+        self.pressure = 29.92
+        self.wind_angle = rng.uniform(0, 360)
+        self.raining_until = start
+        self.rain_rate = 0.0
+        self.rain_event = 0.0
+        self.rain_hourly = []
+        self.rain_weekly = 0.0
+        self.rain_yearly = 0.0
+        self.rain_total = 0.0
+        self.gust_max = 0.0
+        self.last_time = start
+
+    def reading(self, moment, interval_minutes):
+        rng = self.rng
+        previous, self.last_time = self.last_time, moment
+        # Nulování součtů na začátku dne, týdne a roku jako u GW1000
+        if moment.date() != previous.date():
+            self.gust_max = 0.0
+            if moment.weekday() == 0:
+                self.rain_weekly = 0.0
+            if moment.year != previous.year:
+                self.rain_yearly = 0.0
+
+        day_of_year = moment.timetuple().tm_yday
+        hour = moment.hour + moment.minute / 60
+        season = math.sin(2 * math.pi * (day_of_year - 110) / 365)
+        daily = math.sin(2 * math.pi * (hour - 9) / 24)
+        self.temperature_noise = 0.95 * self.temperature_noise + rng.gauss(0, 0.4)
+        temperature = 50 + self.offset + 22 * season + 9 * daily + self.temperature_noise
+
+        self.pressure += 0.02 * (29.92 - self.pressure) + rng.gauss(0, 0.01)
+        self.wind_angle = (self.wind_angle + rng.gauss(0, 15)) % 360
+        wind_speed = rng.weibullvariate(6, 2)
+        wind_gust = wind_speed * rng.uniform(1.2, 1.8)
+        self.gust_max = max(self.gust_max, wind_gust)
+
+        # Déšť: začátek srážky s malou pravděpodobností, trvání v řádu hodin
+        if moment >= self.raining_until:
+            self.rain_rate = 0.0
+            if rng.random() < 0.004 * interval_minutes / 5:
+                self.raining_until = moment + timedelta(minutes=rng.randint(30, 360))
+                self.rain_rate = rng.uniform(0.02, 0.6)
+                self.rain_event = 0.0
+        rain = self.rain_rate * interval_minutes / 60
+        self.rain_event += rain
+        self.rain_weekly += rain
+        self.rain_yearly += rain
+        self.rain_total += rain
+        # Srážky za posledních 60 minut
+        self.rain_hourly = [(t, r) for t, r in self.rain_hourly if moment - t < timedelta(hours=1)] + [(moment, rain)]
+
+        cloudiness = 0.3 if self.rain_rate else rng.uniform(0.7, 1.0)
+        solar = max(0.0, math.sin(math.pi * (hour - 6) / 12)) * (600 + 300 * season) * cloudiness
+        humidity = 70 - 1.2 * (temperature - 50 - 22 * season) + (25 if self.rain_rate else 0) + rng.gauss(0, 3)
+
+        values = {
+            'indoor_temperature_F': 70 + 2 * daily + rng.gauss(0, 0.3),
+            'indoor_humidity_percent': 42 + 8 * season + rng.gauss(0, 1),
+            'pressure_relative_inHg': self.pressure,
+            'pressure_absolute_inHg': self.pressure - 0.62,
+            'outdoor_temperature_F': temperature,
+            'outdoor_humidity_percent': min(100.0, max(5.0, humidity)),
+            'wind_angle': self.wind_angle,
+            'wind_speed_mph': wind_speed,
+            'wind_gust_mph': wind_gust,
+            'wind_gust_max_mph': self.gust_max,
+            'solar_radiation_Wm2': solar,
+            'solar_uv': solar / 100,
+            'rain_rate_inhr': self.rain_rate,
+            'rain_event_in': self.rain_event,
+            'rain_hourly_in': sum(r for _, r in self.rain_hourly),
+            'rain_weekly_in': self.rain_weekly,
+            'rain_yearly_in': self.rain_yearly,
+            'rain_total_in': self.rain_total,
+        }
+        # Sloupce DECIMAL(5,2)
+        row = {column_name: round(min(999.99, max(-999.99, value)), 2) for column_name, value in values.items()}
+        row['time'] = moment
+        return row
+
+
+def generate_data(database_url, years=2.0, interval_minutes=5, stations=1, seed=1, default_station_id='meteostation1'):
+    engine = create_engine(database_url)
+    create_schema(engine)
+    rng = random.Random(seed)
+
+    # Data končí aktuální minutou, aby routy pro dnešek a poslední měření měly co vracet
+    end = datetime.now().replace(second=0, microsecond=0)
+    start = end - timedelta(days=round(365 * years))
+    station_ids = [default_station_id]
+    number = 1
+    while len(station_ids) < stations:
+        number += 1
+        if f'meteostation{number}' != default_station_id:
+            station_ids.append(f'meteostation{number}')
+
+    summary = {'start': start.isoformat(), 'end': end.isoformat(), 'interval_minutes': interval_minutes, 'stations': {}}
+    for station_id in station_ids:
+        table = ensure_station_table(engine, station_id)
+        with engine.connect() as conn:
+            if conn.execute(select(func.count()).select_from(table)).scalar():
+                raise SystemExit(f"Tabulka {table.name} už obsahuje data, benchmark potřebuje prázdnou databázi")
+
+        model = WeatherModel(random.Random(rng.random()), start)
+        moment = start
+        batch = []
+        count = 0
+        while moment <= end:
+            batch.append(model.reading(moment, interval_minutes))
+            moment += timedelta(minutes=interval_minutes)
+            if len(batch) >= INSERT_BATCH_SIZE:
+                with engine.begin() as conn:
+                    conn.execute(table.insert(), batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            with engine.begin() as conn:
+                conn.execute(table.insert(), batch)
+            count += len(batch)
+        summary['stations'][station_id] = count
+        print(f"{table.name}: {count} řádků", file=sys.stderr)
+
+    # Tabulky aggregated_* se počítají stejným rollupem jako na serveru (jen pro výchozí meteostanici)
+    rollup_start = time.time()
+    RollupEngine(engine, STATION_TABLE_PREFIX + default_station_id, batch_size=50000, settle_seconds=0).run_until_current()
+    summary['rollup_seconds'] = round(time.time() - rollup_start, 2)
+    print(f"Rollup: {summary['rollup_seconds']} s", file=sys.stderr)
+    # Sketche pro /api/stats/quantiles se dopočítají předem, aby je za běhu nepočítal worker na pozadí
+    sketch_start = time.time()
+    SketchEngine(engine, STATION_TABLE_PREFIX + default_station_id, batch_size=50000, settle_seconds=0).run_until_current()
+    summary['sketch_seconds'] = round(time.time() - sketch_start, 2)
+    print(f"Sketche: {summary['sketch_seconds']} s", file=sys.stderr)
+
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM users WHERE username = :username'), {'username': BENCHMARK_USER})
+        conn.execute(
+            text('INSERT INTO users (username, password) VALUES (:username, :password)'),
+            {'username': BENCHMARK_USER, 'password': generate_password_hash(BENCHMARK_USER)}
+        )
+        if not conn.execute(text('SELECT id FROM meteo_codes WHERE code = :code'), {'code': BENCHMARK_CODE}).first():
+            conn.execute(text('INSERT INTO meteo_codes (code) VALUES (:code)'), {'code': BENCHMARK_CODE})
+    engine.dispose()
+    return summary
+
+
+def write_config(path, database_url, response_cache_size):
+    # Konfigurace API jen pro benchmark – bez vláken na pozadí, která by zkreslovala měření
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SECRET_KEY': secrets.token_hex(16),
+        'JWT_SECRET_KEY': secrets.token_hex(16),
+        'RESPONSE_CACHE_SIZE': response_cache_size,
+        'RESPONSE_CACHE_DIR': '',
+        'SCHEMA_SNAPSHOT_PATH': '',
+        'ROLLUP_INTERVAL': 0,
+        # Worker sketchů jen doplní chybějící měření při startu, dál čeká celý den
+        'SKETCH_INTERVAL': 86400,
+        'COMMIT_SETTLE_SECONDS': 0,
+        'SPOOL_DIR': '',
+        'SLOW_QUERY_THRESHOLD_MS': 0,
+        'INGEST_PASSKEY': BENCHMARK_PASSKEY,
+    }
+    with open(path, 'w') as file:
+        file.write('[DEFAULT]\n')
+        for key, value in settings.items():
+            # configparser by jinak interpretoval % v URL databáze
+            file.write(f"{key} = {str(value).replace('%', '%%')}\n")
+
+
+def benchmark_routes(last_day, other_station_ids):
+    # (název, metoda, cesta, data formuláře) – všechny routy kromě nekonečného /api/stream/live,
+    # /api/register (mění uživatele) a /api/test/run_all_tests
+    day = last_day.isoformat()
+    week_ago = (last_day - timedelta(days=7)).isoformat()
+    routes = [
+        ('login', 'POST', '/api/login', {'username': BENCHMARK_USER, 'password': BENCHMARK_USER}),
+        ('is_valid', 'GET', '/api/is_valid', None),
+        ('last_data', 'GET', '/api/data/last_data', None),
+        ('all_last_data', 'GET', '/api/data/meteostation/all_last_data', None),
+        ('aggregated_today', 'GET', '/api/data/aggregated/today', None),
+        ('meteostation_today', 'GET', '/api/data/meteostation/today', None),
+        ('meteostation_today_max', 'GET', '/api/data/meteostation/today/max', None),
+        ('meteostation_today_min', 'GET', '/api/data/meteostation/today/min', None),
+        ('meteostation_today_avg', 'GET', '/api/data/meteostation/today/avg', None),
+        ('meteostation_date', 'GET', f'/api/data/meteostation/{day}', None),
+        ('meteostation_min_date', 'GET', f'/api/data/meteostation/min/{day}', None),
+        ('meteostation_max_date', 'GET', f'/api/data/meteostation/max/{day}', None),
+        ('daily_test', 'GET', f'/api/data/daily_test?date={day}&columns=outdoor_temperature_F,wind_speed_mph', None),
+        ('weekly_cols', 'GET', '/api/data/weekly/cols?columns=outdoor_temperature_F,pressure_relative_inHg', None),
+        ('daily', 'GET', '/api/data/daily', None),
+        ('daily_date', 'GET', f'/api/data/daily/{day}', None),
+        ('weekly', 'GET', '/api/data/weekly', None),
+        ('monthly', 'GET', '/api/data/monthly', None),
+        ('aggregated', 'GET', '/api/data/aggregated', None),
+        ('aggregated_date', 'GET', f'/api/data/aggregated/{day}', None),
+        ('aggregated_ndjson', 'GET', '/api/data/aggregated?format=ndjson', None),
+        ('aggregated_paginated', 'GET', '/api/data/aggregated?limit=1000', None),
+        ('aggregated_downsampled', 'GET', '/api/data/aggregated?max_points=500&columns=outdoor_temperature_F', None),
+        ('aggregated_downsampled_all', 'GET', '/api/data/aggregated?max_points=500', None),
+        ('columns', 'GET', '/api/columns', None),
+        ('range', 'GET', f'/api/data/range?from={week_ago}&to={day}&bucket=1h&agg=avg,max', None),
+        ('weekly_test', 'GET', f'/api/data/weekly_test/{day}', None),
+        ('monthly_test', 'GET', f'/api/data/monthly_test/{day}', None),
+        ('hourly_weekly', 'GET', f'/api/data/hourly/weekly/{day}', None),
+        ('hourly_weekly_columnar', 'GET', f'/api/data/hourly/weekly/{day}?layout=columnar', None),
+        ('4hourly_monthly', 'GET', f'/api/data/4hourly/monthly/{day}', None),
+        ('daily_yearly', 'GET', f'/api/data/daily/yearly/{day}', None),
+        ('export_csv', 'GET', f'/api/export?table=hourly&from={week_ago}&to={day}&format=csv', None),
+        ('export_arrow', 'GET', f'/api/export?table=hourly&from={week_ago}&to={day}&format=arrow', None),
+        ('export_parquet', 'GET', f'/api/export?table=hourly&from={week_ago}&to={day}&format=parquet', None),
+        ('quantiles', 'GET', f'/api/stats/quantiles?column=outdoor_temperature_F&from={week_ago}&to={day}&q=0.05,0.5,0.95&bins=20', None),
+        ('batch', 'POST', '/api/batch', {'requests': [
+            '/api/data/last_data',
+            '/api/data/meteostation/today/max',
+            f'/api/data/daily/{day}',
+            f'/api/data/range?from={week_ago}&to={day}&bucket=1d&agg=min,max',
+        ]}),
+        ('stations', 'GET', '/api/stations', None),
+        ('stations_last_data', 'GET', '/api/data/stations/last_data', None),
+        ('cache_stats', 'GET', '/api/cache/stats', None),
+        ('metrics', 'GET', '/api/metrics', None),
+    ]
+    # Ostatní meteostanice přes parametr station
+    for station_id in other_station_ids[:1]:
+        routes.append((f'last_data_{station_id}', 'GET', f'/api/data/last_data?station={station_id}', None))
+    # Příjem měření zapisuje do databáze, proto je poslední
+    routes.append(('ingest', 'POST', '/api/ingest', {'PASSKEY': BENCHMARK_PASSKEY, 'tempf': '55.3', 'humidity': '80', 'windspeedmph': '3.1'}))
+    return routes
+
+
+def current_rss():
+    # Aktuální RSS procesu v bajtech (Linux), jinde maximum z getrusage
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class RssSampler(threading.Thread):
+    # Špička RSS během měření jedné routy
+    def __init__(self, interval=0.01):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.peak = max(self.peak, current_rss())
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss())
+        return self.peak
+
+
+def percentile(sorted_values, fraction):
+    # Percentil metodou nejbližšího pořadí
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def run_route(client, headers, method, path, form, request_count, concurrency, warmup):
+    def call():
+        start = time.perf_counter()
+        if method == 'POST':
+            # Příjem měření posílá formulář jako meteostanice, ostatní routy JSON
+            if path == '/api/ingest':
+                response = client.post(path, headers=headers, data=form)
+            else:
+                response = client.post(path, headers=headers, json=form)
+        else:
+            response = client.get(path, headers=headers)
+        # Odpověď se čte celá, u streamovaných odpovědí je v čase zahrnuté i generování těla
+        size = len(response.get_data())
+        elapsed = time.perf_counter() - start
+        return elapsed, response.status_code, size
+
+    for _ in range(warmup):
+        call()
+
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: call(), range(request_count)))
+    wall_time = time.perf_counter() - start
+    peak_rss = sampler.stop()
+
+    latencies = sorted(elapsed for elapsed, _, _ in results)
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': request_count,
+        'errors': sum(1 for _, status, _ in results if status >= 400),
+        'status_codes': statuses,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'throughput_rps': round(request_count / wall_time, 2),
+        'response_bytes': round(sum(size for _, _, size in results) / len(results)),
+        'peak_rss_mb': round(peak_rss / (1024 * 1024), 1),
+    }
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='weather_benchmark_')
+    database_url = args.database_url or 'sqlite:///' + os.path.join(work_dir, 'weather.db')
+
+    print(f"Databáze: {database_url}", file=sys.stderr)
+    dataset = None
+    if not args.skip_generate:
+        dataset = generate_data(database_url, args.years, args.interval, args.stations, args.seed, args.station)
+
+    config_path = os.path.join(work_dir, 'config.cfg')
+    write_config(config_path, database_url, args.response_cache)
+    os.environ['WEATHER_API_CONFIG'] = config_path
+
+    # Import až po vytvoření konfigurace – aplikace čte konfiguraci při importu
+    # Výpisy aplikace při startu jdou na stderr, stdout je vyhrazený pro JSON s výsledky
+    import_start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        import API_server_3_10
+    startup_seconds = time.perf_counter() - import_start
+
+    app = API_server_3_10.app
+    client = app.test_client()
+    response = client.post('/api/login', json={'username': BENCHMARK_USER, 'password': BENCHMARK_USER})
+    if response.status_code != 200:
+        raise SystemExit(f"Přihlášení uživatele {BENCHMARK_USER} selhalo ({response.status_code}), vygenerujte data bez --skip-generate")
+    headers = {'Authorization': 'Bearer ' + response.json['access_token']}
+
+    last_day = (datetime.now() - timedelta(days=1)).date()
+    with app.app_context():
+        database_name = API_server_3_10.db.engine.dialect.name
+        other_station_ids = [
+            station_id for station_id in API_server_3_10.station_registry.list_station_ids()
+            if station_id != API_server_3_10.DEFAULT_STATION_ID
+        ]
+    selected = set(args.routes.split(',')) if args.routes else None
+    results = {}
+    for name, method, path, form in benchmark_routes(last_day, other_station_ids):
+        if selected is not None and name not in selected:
+            continue
+        result = run_route(client, headers, method, path, form, args.requests, args.concurrency, args.warmup)
+        result['method'] = method
+        result['path'] = path
+        results[name] = result
+        print(f"{name:28} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  p99 {result['p99_ms']:9.2f} ms  "
+              f"{result['throughput_rps']:8.1f} req/s  chyb {result['errors']}", file=sys.stderr)
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': database_name,
+        'settings': {
+            'years': args.years, 'interval_minutes': args.interval, 'stations': args.stations, 'seed': args.seed,
+            'requests': args.requests, 'concurrency': args.concurrency, 'warmup': args.warmup,
+            'response_cache': args.response_cache,
+        },
+        'dataset': dataset,
+        'startup_seconds': round(startup_seconds, 3),
+        'peak_rss_mb': round(current_rss() / (1024 * 1024), 1),
+        'routes': results,
+    }
+
+
+def compare_results(baseline_path, current_path, metric, tolerance):
+    # Porovnání dvou běhů, nenulový návratový kód při zhoršení o více než tolerance
+    with open(baseline_path) as file:
+        baseline = json.load(file)['routes']
+    with open(current_path) as file:
+        current = json.load(file)['routes']
+
+    regressions = 0
+    for name in sorted(set(baseline) & set(current)):
+        before = baseline[name][metric]
+        after = current[name][metric]
+        ratio = after / before if before else float('inf')
+        if metric == 'throughput_rps':
+            worse = ratio < 1 - tolerance
+        else:
+            worse = ratio > 1 + tolerance
+        regressions += worse
+        print(f"{name:28} {before:10.2f} -> {after:10.2f}  {ratio:6.2f}x{'  ZHORŠENÍ' if worse else ''}")
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f"{name:28} jen v {'původním' if name in baseline else 'novém'} běhu")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weather API benchmark on synthetic data')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_data_arguments(subparser):
+        subparser.add_argument('--database-url', default='', help='SQLAlchemy URL, default is SQLite in a temporary directory')
+        subparser.add_argument('--years', type=float, default=2.0)
+        subparser.add_argument('--interval', type=int, default=5, help='sampling interval in minutes')
+        subparser.add_argument('--stations', type=int, default=1)
+        subparser.add_argument('--seed', type=int, default=1)
+        subparser.add_argument('--station', default='meteostation1', help='default station with aggregated tables')
+
+    generate_parser = subparsers.add_parser('generate', help='only generate synthetic data')
+    add_data_arguments(generate_parser)
+
+    run_parser = subparsers.add_parser('run', help='generate data and benchmark all routes')
+    add_data_arguments(run_parser)
+    run_parser.add_argument('--skip-generate', action='store_true', help='use existing data in --database-url')
+    run_parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--warmup', type=int, default=5)
+    run_parser.add_argument('--response-cache', type=int, default=0, help='response cache size, 0 measures queries without cache')
+    run_parser.add_argument('--routes', default='', help='comma separated route names')
+    run_parser.add_argument('--output', default='', help='JSON output file, default stdout')
+
+    compare_parser = subparsers.add_parser('compare', help='compare two benchmark results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--metric', default='p95_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'throughput_rps', 'peak_rss_mb'])
+    compare_parser.add_argument('--tolerance', type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        if not args.database_url:
+            parser.error('generate requires --database-url')
+        print(json.dumps(generate_data(args.database_url, args.years, args.interval, args.stations, args.seed, args.station), indent=2))
+    elif args.command == 'run':
+        result = json.dumps(run_benchmark(args), indent=2)
+        if args.output:
+            with open(args.output, 'w') as file:
+                file.write(result + '\n')
+        else:
+            print(result)
+    else:
+        sys.exit(compare_results(args.baseline, args.current, args.metric, args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# numpy je volitelný – bez něj se body vybírají v čistém Pythonu (stejný výsledek, pomaleji)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _lttb_numpy(xs, ys, threshold):
+    # Osa x posunutá k nule – plochy se nezmění a velké časové značky neztratí přesnost
+    x = np.asarray(xs, dtype=np.float64)
+    x = x - x[0]
+    y = np.asarray(ys, dtype=np.float64)
+    length = len(x)
+    every = (length - 2) / (threshold - 2)
+
+    # Hranice všech intervalů a průměrné body následujících intervalů najednou
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges[-1] = min(edges[-1], length)
+    avg_starts = edges[1:]
+    avg_lengths = np.diff(np.append(avg_starts, length))
+    avg_x = np.add.reduceat(x, avg_starts) / avg_lengths
+    avg_y = np.add.reduceat(y, avg_starts) / avg_lengths
+
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        range_start = edges[i]
+        range_end = edges[i + 1]
+        point_x = x[a]
+        point_y = y[a]
+        areas = np.abs(
+            (point_x - avg_x[i]) * (y[range_start:range_end] - point_y)
+            - (point_x - x[range_start:range_end]) * (avg_y[i] - point_y)
+        )
+        a = int(range_start + np.argmax(areas))
+        selected.append(a)
+
+    selected.append(length - 1)
+    return selected
+
+
+def lttb_indices(xs, ys, threshold):
+    # Largest-Triangle-Three-Buckets – vybere body, které nejvíc mění tvar křivky
+    length = len(xs)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+    if np is not None:
+        return _lttb_numpy(xs, ys, threshold)
+
+    every = (length - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+
+    for i in range(threshold - 2):
+        # Průměrný bod následujícího intervalu
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, length)
+        avg_length = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / avg_length
+        avg_y = sum(ys[avg_start:avg_end]) / avg_length
+
+        # Bod aktuálního intervalu s největší plochou trojúhelníku
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        point_x = xs[a]
+        point_y = ys[a]
+        dx = point_x - avg_x
+        dy = avg_y - point_y
+        max_area = -1.0
+        next_a = range_start
+        for j in range(range_start, range_end):
+            area = abs(dx * (ys[j] - point_y) - (point_x - xs[j]) * dy)
+            if area > max_area:
+                max_area = area
+                next_a = j
+
+        selected.append(next_a)
+        a = next_a
+
+    selected.append(length - 1)
+    return selected
+
+
+def minmax_indices(xs, ys, threshold):
+    # Z každého intervalu se ponechá minimum i maximum, špičky tak nikdy nezmizí
+    length = len(xs)
+    if threshold >= length or threshold < 4:
+        return list(range(length))
+
+    bucket_count = (threshold - 2) // 2
+    every = (length - 2) / bucket_count
+    values = np.asarray(ys, dtype=np.float64) if np is not None else ys
+    selected = {0, length - 1}
+    for i in range(bucket_count):
+        bucket_start = int(i * every) + 1
+        bucket_end = min(int((i + 1) * every) + 1, length - 1)
+        if bucket_start >= bucket_end:
+            continue
+        if np is not None:
+            bucket = values[bucket_start:bucket_end]
+            selected.add(bucket_start + int(np.argmin(bucket)))
+            selected.add(bucket_start + int(np.argmax(bucket)))
+        else:
+            bucket = range(bucket_start, bucket_end)
+            selected.add(min(bucket, key=ys.__getitem__))
+            selected.add(max(bucket, key=ys.__getitem__))
+    return sorted(selected)
+
+
+DOWNSAMPLING_METHODS = {
+    'lttb': lttb_indices,
+    'minmax': minmax_indices,
+}
+# Obě metody potřebují aspoň 4 body (první, poslední a jeden interval)
+MIN_SERIES_POINTS = 4
+
+
+def by_priority(xs, ys, indices):
+    # Vybrané body série od nejdůležitějšího: první a poslední, minimum a maximum, pak podle plochy
+    # trojúhelníku se sousedními vybranými body (jak moc by se křivka bez bodu změnila)
+    if len(indices) <= 2:
+        return list(indices)
+    first, last = indices[0], indices[-1]
+    inner = indices[1:-1]
+    extremes = [min(inner, key=ys.__getitem__), max(inner, key=ys.__getitem__)]
+    areas = {}
+    for previous, current, following in zip(indices, inner, indices[2:]):
+        areas[current] = abs(
+            xs[previous] * (ys[current] - ys[following])
+            + xs[current] * (ys[following] - ys[previous])
+            + xs[following] * (ys[previous] - ys[current])
+        )
+    rest = sorted((index for index in inner if index not in extremes), key=areas.__getitem__, reverse=True)
+    return [first, last] + list(dict.fromkeys(extremes)) + rest
+
+
+def downsample_indices(x_values, series, max_points, method='lttb'):
+    # Indexy nejvýše max_points bodů ve vzestupném pořadí. Každá série dostane předem svůj díl z max_points,
+    # takže se sjednocení do max_points vejde. Když je sérií víc, než kolik unese max_points, berou se body
+    # všech sérií střídavě podle priority – první a poslední bod a špičky každé série mají přednost
+    select_indices = DOWNSAMPLING_METHODS[method]
+    share = max(max_points // max(len(series), 1), MIN_SERIES_POINTS)
+    ranked = []
+    for y_values in series:
+        # Chybějící hodnoty (NULL) se do výběru dané série nezapočítávají
+        valid = [i for i, value in enumerate(y_values) if value is not None]
+        xs = [x_values[i] for i in valid]
+        ys = [float(y_values[i]) for i in valid]
+        ranked.append([valid[i] for i in by_priority(xs, ys, select_indices(xs, ys, share))])
+
+    selected = set()
+    for level in range(max(map(len, ranked), default=0)):
+        for order in ranked:
+            if level < len(order) and len(selected) < max_points:
+                selected.add(order[level])
+    return sorted(selected)
+
+
+def downsample_rows(rows, x_values, series, max_points, method='lttb'):
+    # Vrací nejvýše max_points řádků v původním pořadí
+    return [rows[i] for i in downsample_indices(x_values, series, max_points, method)]
@@ -0,0 +1,109 @@
+import csv
+import io
+
+from sqlalchemy import Date, DateTime, Float, Integer, Numeric
+
+# pyarrow je volitelný – bez něj je k dispozici jen export do CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def arrow_available():
+    return pa is not None
+
+
+def arrow_type(column_type):
+    # Typ sloupce v Arrow podle typu v databázi – DECIMAL zůstává přesný, DATETIME jako timestamp
+    if isinstance(column_type, Numeric) and not isinstance(column_type, Float) and column_type.scale is not None:
+        return pa.decimal128(column_type.precision or 38, column_type.scale)
+    if isinstance(column_type, (Float, Numeric)):
+        return pa.float64()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp('s')
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def arrow_schema(columns):
+    return pa.schema([pa.field(column.key, arrow_type(column.type)) for column in columns])
+
+
+def record_batch(schema, rows):
+    # Řádky dávky se převedou na sloupce
+    values = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.record_batch(
+        [pa.array(column_values, type=field.type) for column_values, field in zip(values, schema)],
+        schema=schema
+    )
+
+
+class ChunkSink(io.RawIOBase):
+    # Souborový objekt, do kterého zapisuje pyarrow – zapsaná data se průběžně odesílají klientovi
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def generate_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in columns])
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generate_arrow(columns, batches, file_format):
+    # Každá dávka z kurzoru je jeden record batch (u Parquet jedna row group)
+    schema = arrow_schema(columns)
+    sink = ChunkSink()
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in batches:
+            writer.write_batch(record_batch(schema, rows))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def generate_export(columns, batches, file_format):
+    if file_format == 'csv':
+        return generate_csv(columns, batches)
+    return generate_arrow(columns, batches, file_format)
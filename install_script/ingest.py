@@ -0,0 +1,264 @@
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Numeric, String, Table, and_, select
+
+from stations import STATION_ID_PATTERN, STATION_TABLE_PREFIX
+
+
+# Definice pole senzorů a jim odpovídajících klíčů (názvů) z GW1000 – stejné jako ve script_.php
+SENSORS = {
+    'indoor_temperature_F': 'tempinf',
+    'indoor_humidity_percent': 'humidityin',
+    'pressure_relative_inHg': 'baromrelin',
+    'pressure_absolute_inHg': 'baromabsin',
+    'outdoor_temperature_F': 'tempf',
+    'outdoor_humidity_percent': 'humidity',
+    'wind_angle': 'winddir',
+    'wind_speed_mph': 'windspeedmph',
+    'wind_gust_mph': 'windgustmph',
+    'wind_gust_max_mph': 'maxdailygust',
+    'solar_radiation_Wm2': 'solarradiation',
+    'solar_uv': 'uv',
+    'rain_rate_inhr': 'rainratein',
+    'rain_event_in': 'eventrainin',
+    'rain_hourly_in': 'hourlyrainin',
+    'rain_weekly_in': 'weeklyrainin',
+    'rain_yearly_in': 'yearlyrainin',
+    'rain_total_in': 'totalrainin',
+}
+
+# Sloupce měření jsou DECIMAL(5,2), sluneční záření a tlak (i v hPa) potřebují DECIMAL(6,2)
+VALUE_QUANTUM = Decimal('0.01')
+VALUE_LIMIT = Decimal('1000')
+WIDE_COLUMNS = ('solar_radiation_Wm2', 'pressure_relative_inHg', 'pressure_absolute_inHg')
+
+
+class ValueOutOfRange(ValueError):
+    pass
+
+
+def value_range(column):
+    # Krok a mez hodnoty podle typu sloupce – DECIMAL(p,s) pojme absolutní hodnotu menší než 10^(p-s)
+    column_type = column.type
+    if isinstance(column_type, Integer):
+        return Decimal(1), None
+    if isinstance(column_type, Numeric) and column_type.precision is not None and column_type.scale is not None:
+        return Decimal(1).scaleb(-column_type.scale), Decimal(1).scaleb(column_type.precision - column_type.scale)
+    return VALUE_QUANTUM, None
+
+
+def coerce_value(raw_value, quantum=VALUE_QUANTUM, limit=VALUE_LIMIT):
+    # Převod hodnoty z formuláře na Decimal, neplatná hodnota -> None, hodnota mimo rozsah sloupce -> ValueOutOfRange
+    if raw_value is None or raw_value == '':
+        return None
+    try:
+        value = Decimal(str(raw_value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not value.is_finite():
+        return None
+    if limit is not None and abs(value) >= limit:
+        raise ValueOutOfRange(raw_value)
+    value = value.quantize(quantum)
+    # Zaokrouhlení může hodnotu posunout až na mez (999.996 -> 1000.00)
+    if limit is not None and abs(value) >= limit:
+        raise ValueOutOfRange(raw_value)
+    return value
+
+
+def parse_dateutc(raw_value):
+    # Čas měření z meteostanice (dateutc v UTC, "now" = čas příjmu) jako místní čas jako ve sloupci time
+    if raw_value is None or raw_value.strip().lower() in ('', 'now'):
+        return None
+    try:
+        value = datetime.strptime(raw_value.strip(), '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise ValueError(f"Invalid dateutc {raw_value}")
+    return value.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def parse_reading(form, table, reading_time=None):
+    # Z dat ve formátu Ecowitt sestaví řádek pro tabulku meteostanice
+    # Čas s přesností na sekundy jako DATETIME v databázi, přednost má čas měření dateutc
+    row = {'time': reading_time or parse_dateutc(form.get('dateutc')) or datetime.now().replace(microsecond=0)}
+    for column in table.columns:
+        if column.name in ('id', 'time'):
+            continue
+        # Známé senzory podle slovníku, ostatní sloupce tabulky podle stejnojmenného klíče
+        sensor_key = SENSORS.get(column.name, column.name)
+        try:
+            row[column.name] = coerce_value(form.get(sensor_key), *value_range(column))
+        except ValueOutOfRange:
+            # Hodnota by se do sloupce nevešla – měření se odmítne, NULL by ji tiše ztratil
+            message = f"Value {form.get(sensor_key)} of {sensor_key} is out of range for column {table.name}.{column.name}"
+            print(f"Příjem měření: {message}, sloupec je potřeba rozšířit (ALTER TABLE ... MODIFY)")
+            raise ValueOutOfRange(message)
+    return row
+
+
+def ensure_station_table(engine, station_id):
+    # Jednorázová kontrola schématu – tabulka meteostanice a záznam v Meteostations
+    if not STATION_ID_PATTERN.match(station_id):
+        raise ValueError(f"Invalid station id {station_id}")
+
+    metadata = MetaData()
+    station_table = Table(
+        STATION_TABLE_PREFIX + station_id, metadata,
+        Column('id', Integer, primary_key=True, autoincrement=True),
+        Column('time', DateTime, index=True),
+        *[Column(column_name, Numeric(6, 2) if column_name in WIDE_COLUMNS else Numeric(5, 2)) for column_name in SENSORS]
+    )
+    meteostations_table = Table(
+        'Meteostations', metadata,
+        Column('id', Integer, primary_key=True, autoincrement=True),
+        Column('meteostation_id', String(50)),
+    )
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        existing = conn.execute(
+            select(meteostations_table.c.id).where(meteostations_table.c.meteostation_id == station_id)
+        ).first()
+        if existing is None:
+            conn.execute(meteostations_table.insert().values(meteostation_id=station_id))
+
+    # Skutečné sloupce tabulky (mohla být vytvořena dříve s jinými senzory)
+    return Table(station_table.name, MetaData(), autoload_with=engine)
+
+
+def insert_missing_readings(conn, table, rows):
+    # Vloží jen měření, která v tabulce meteostanice ještě nejsou se stejným časem i hodnotami
+    # (přehrání je tak idempotentní, jiné měření ve stejné sekundě se zachová)
+    column_names = [column.name for column in table.columns if column.name != 'id']
+    times = [row['time'] for row in rows]
+    existing = {
+        tuple(existing_row) for existing_row in conn.execute(
+            select(*[table.c[column_name] for column_name in column_names])
+            .where(and_(table.c.time >= min(times), table.c.time <= max(times)))
+        )
+    }
+    missing = []
+    for row in rows:
+        key = tuple(row.get(column_name) for column_name in column_names)
+        if key not in existing:
+            existing.add(key)
+            missing.append(row)
+    if missing:
+        conn.execute(table.insert(), missing)
+    return missing
+
+
+class BufferedWriter:
+    # Sbírá měření v paměti a zapisuje je dávkově (executemany) po dosažení velikosti nebo času
+    def __init__(self, engine, table, batch_size=50, flush_interval=2.0, listeners=None,
+                 station_id=None, spool=None, slow_write_seconds=5.0):
+        self.engine = engine
+        self.table = table
+        self.station_id = station_id
+        self.spool = spool
+        self.slow_write_seconds = slow_write_seconds
+        self.writing_since = None
+        self.column_names = [column.name for column in table.columns]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.listeners = listeners or []
+        self.buffer = []
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.oldest_time = None
+        # Dávka, která se právě zapisuje – do zápisu a zpracování posluchači ještě není v databázi
+        self.in_flight = []
+        self.written = 0
+
+        self.thread = threading.Thread(target=self._run, name=f'writer-{table.name}', daemon=True)
+        self.thread.start()
+
+    def submit(self, row):
+        # Databáze zapisuje příliš dlouho – měření jde rovnou do spoolu, příjem se neblokuje
+        writing_since = self.writing_since
+        if self.spool is not None and writing_since is not None and time.monotonic() - writing_since > self.slow_write_seconds:
+            self.spool.append(self.station_id, [row])
+            return
+
+        with self.condition:
+            if not self.buffer:
+                self.oldest_time = time.monotonic()
+            self.buffer.append(row)
+            # Probuzení zapisovacího vlákna – první měření spouští odpočet, plná dávka zápis
+            if len(self.buffer) == 1 or len(self.buffer) >= self.batch_size:
+                self.condition.notify()
+
+    def oldest_reading_time(self):
+        # Nejstarší čas měření, které ještě není v databázi (None = žádné)
+        with self.condition:
+            times = [row['time'] for row in self.buffer + self.in_flight if row.get('time') is not None]
+        return min(times) if times else None
+
+    def _take(self):
+        with self.condition:
+            rows = self.buffer
+            self.buffer = []
+            self.oldest_time = None
+            self.in_flight = rows
+            return rows
+
+    def flush(self):
+        with self.flush_lock:
+            rows = self._take()
+            if not rows:
+                return 0
+            self.writing_since = time.monotonic()
+            try:
+                self.write(rows)
+            except Exception:
+                try:
+                    if self.spool is None:
+                        raise OSError('spool is disabled')
+                    # Databáze je nedostupná – měření se uloží do lokálního spoolu a přehrají později
+                    self.spool.append(self.station_id, rows)
+                except OSError:
+                    # Neuložená měření se vrátí na začátek bufferu a zkusí se znovu
+                    with self.condition:
+                        self.buffer[:0] = rows
+                        self.oldest_time = self.oldest_time or time.monotonic()
+                raise
+            finally:
+                self.writing_since = None
+                with self.condition:
+                    self.in_flight = []
+            return len(rows)
+
+    def write(self, rows, deduplicate=False):
+        with self.engine.begin() as conn:
+            if deduplicate:
+                rows = insert_missing_readings(conn, self.table, rows)
+            else:
+                conn.execute(self.table.insert(), rows)
+        self.written += len(rows)
+        for listener in self.listeners:
+            try:
+                listener(self.table.name, rows)
+            except Exception as e:
+                print(f"Chyba při zpracování nových měření: {e}")
+        return len(rows)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                # Čekání, než se naplní dávka nebo vyprší interval od nejstaršího měření
+                while True:
+                    if self.buffer:
+                        age = time.monotonic() - self.oldest_time
+                        if len(self.buffer) >= self.batch_size or age >= self.flush_interval:
+                            break
+                        self.condition.wait(self.flush_interval - age)
+                    else:
+                        self.condition.wait()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Zápis měření do databáze selhal: {e}")
+                time.sleep(self.flush_interval)
@@ -23,13 +23,54 @@ sed -e "s/%PASS%/$PASS/g" < config_.cfg | sudo tee config.cfg
 #Přesun do složky s Python soubory
 sudo mv API_server_3_10.py /var/www/html
 sudo mv testing_api.py /var/www/html
+sudo mv testing_modules.py /var/www/html
+sudo mv response_cache.py /var/www/html
+sudo mv running_stats.py /var/www/html
+sudo mv downsampling.py /var/www/html
+sudo mv rollup.py /var/www/html
+sudo mv ingest.py /var/www/html
+sudo mv spool.py /var/www/html
+sudo mv stations.py /var/www/html
+sudo mv schema_snapshot.py /var/www/html
+sudo mv serve.py /var/www/html
+sudo mv live_feed.py /var/www/html
+sudo mv json_encoding.py /var/www/html
+sudo mv export.py /var/www/html
+sudo mv metrics.py /var/www/html
+sudo mv slow_query_log.py /var/www/html
+sudo mv benchmark.py /var/www/html
+sudo mv ring_buffer.py /var/www/html
+sudo mv archive.py /var/www/html
+sudo mv sketches.py /var/www/html
+sudo mv statements.py /var/www/html
 sudo mv config.cfg /var/www/html
 sudo mv requirements.txt /var/www/html
 sudo mv script.php /var/www/html
 
+#Adresář pro cache odpovědí API
+sudo mkdir -p /var/cache/weather_api
+sudo chown pi:pi /var/cache/weather_api
+
+#Adresář pro spool měření při výpadku databáze
+sudo mkdir -p /var/spool/weather_api
+sudo chown pi:pi /var/spool/weather_api
+
+#Adresář pro log pomalých dotazů
+sudo mkdir -p /var/log/weather_api
+sudo chown pi:pi /var/log/weather_api
+
+#Adresář pro archiv starých měření
+sudo mkdir -p /var/lib/weather_api/archive
+sudo chown -R pi:pi /var/lib/weather_api
+
 #Instalace Python závislostí
 sudo pip3 install -r /var/www/html/requirements.txt
 
+#Volitelné knihovny pro rychlejší JSON, kompresi brotli, zřeďování grafů a export do Arrow/Parquet (API funguje i bez nich)
+sudo pip3 install orjson Brotli || true
+sudo pip3 install numpy || true
+sudo pip3 install pyarrow || true
+
 #Vytvoření databáze
 sudo mysql -u root -e "CREATE DATABASE IF NOT EXISTS Ecowitt_database;"
 
@@ -60,7 +101,7 @@ After=network.target
 
 [Service]
 Type=simple
-ExecStart=/usr/bin/python3 $HTML_DIR/API_server_3_10.py
+ExecStart=/usr/bin/python3 $HTML_DIR/serve.py
 Restart=always
 User=pi
 
@@ -69,7 +110,7 @@ WantedBy=multi-user.target
 EOF
 
 #Spuštění API serveru
-/usr/bin/python3 $HTML_DIR/API_server_3_10.py &
+/usr/bin/python3 $HTML_DIR/serve.py &
 
 #Nastavení oprávnění adresáře /var/www/html
 sudo chmod -R 755 $HTML_DIR
@@ -0,0 +1,82 @@
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+# Volitelné rychlejší knihovny – bez nich se použije standardní json a gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Klíče seřazené jako v DefaultJSONProvider, datum se předá do default (HTTP date jako ve Flasku)
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS if orjson is not None else 0
+)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # JSON provider celé aplikace (jsonify, app.json.dumps, request.json) přes orjson, bez něj standardní json.
+    # Výstup odpovídá DefaultJSONProvider – datum jako HTTP date, Decimal jako řetězec, seřazené klíče
+    def encode(self, obj, **kwargs):
+        # Serializace do bajtů – orjson jen pro kompaktní výstup bez dalších parametrů json.dumps
+        if orjson is not None and set(kwargs) <= {'separators'}:
+            try:
+                return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+            except TypeError:
+                # Celá čísla nad 64 bitů, klíče, které nejdou seřadit, apod.
+                pass
+        return super().dumps(obj, **kwargs).encode()
+
+    def dumps(self, obj, **kwargs):
+        return self.encode(obj, **kwargs).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # Čitelný výstup s odsazením (debug režim) zůstává na DefaultJSONProvider
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj, separators=(',', ':')) + b'\n', mimetype=self.mimetype)
+
+
+def columnar_value(value, float_digits):
+    # DECIMAL a FLOAT jako čísla zaokrouhlená na float_digits míst, datum v ISO formátu
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), float_digits)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_columnar(column_names, rows, float_digits=2):
+    # {"columns": [...], "data": [[...], ...]} – názvy sloupců se neopakují v každém řádku
+    payload = {
+        'columns': list(column_names),
+        'data': [[columnar_value(value, float_digits) for value in row] for row in rows],
+    }
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        # Kvalita brotli 0–11, úroveň gzip 1–9 – přepočet na zhruba stejnou rychlost
+        return brotli.compress(data, quality=min(11, max(0, level - 1)))
+    return gzip.compress(data, compresslevel=level)
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+
+
+class LiveChannel:
+    # Nová měření jedné meteostanice – historie posledních událostí sdílená všemi odběrateli
+    def __init__(self, history_size=500):
+        self.history = deque(maxlen=history_size)
+        self.condition = threading.Condition()
+        self.last_id = None
+        self.subscribers = 0
+
+    def publish(self, events):
+        # events: seznam (id, serializovaný řádek) seřazený podle id
+        with self.condition:
+            for event_id, data in events:
+                if self.last_id is None or event_id > self.last_id:
+                    self.history.append((event_id, data))
+                    self.last_id = event_id
+            self.condition.notify_all()
+
+    def events_after(self, last_id):
+        # None = události po last_id už v historii nejsou (klient je musí dohnat z databáze)
+        with self.condition:
+            if self.history and last_id < self.history[0][0] - 1:
+                return None
+            return [event for event in self.history if event[0] > last_id]
+
+    def oldest_id(self):
+        with self.condition:
+            return self.history[0][0] if self.history else 0
+
+    def wait(self, last_id, timeout):
+        # Čeká na měření novější než last_id, nejdéle timeout sekund (False = nic nového)
+        with self.condition:
+            if self.last_id is None or self.last_id <= last_id:
+                self.condition.wait(timeout)
+            return self.last_id is not None and self.last_id > last_id
+
+
+class LiveFeed(threading.Thread):
+    # Jediné vlákno, které hlídá nová měření a rozesílá je všem odběratelům (SSE)
+    def __init__(self, fetch_events, poll_interval=5.0, history_size=500, max_subscribers=8):
+        super().__init__(name='live-feed', daemon=True)
+        self.fetch_events = fetch_events
+        self.poll_interval = poll_interval
+        self.history_size = history_size
+        self.max_subscribers = max_subscribers
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+
+    def channel(self, station_id):
+        channel = self.channels.get(station_id)
+        if channel is None:
+            with self.lock:
+                channel = self.channels.get(station_id)
+                if channel is None:
+                    channel = LiveChannel(self.history_size)
+                    # Výchozí stav kanálu je poslední měření v tabulce
+                    channel.publish(self.fetch_events(station_id, None, 1))
+                    self.channels[station_id] = channel
+        return channel
+
+    def subscribe(self, station_id):
+        # Každé spojení drží vlákno serveru, proto je počet odběratelů omezený
+        channel = self.channel(station_id)
+        with self.lock:
+            if sum(channel.subscribers for channel in self.channels.values()) >= self.max_subscribers:
+                return None
+            channel.subscribers += 1
+        return channel
+
+    def unsubscribe(self, channel):
+        with self.lock:
+            channel.subscribers -= 1
+
+    def wake(self):
+        # Okamžitá kontrola, např. po zápisu nových měření přes /api/ingest
+        self.wake_event.set()
+
+    def poll(self):
+        # Jeden dotaz na meteostanici bez ohledu na počet připojených klientů
+        for station_id, channel in list(self.channels.items()):
+            while True:
+                events = self.fetch_events(station_id, channel.last_id, self.history_size)
+                if events:
+                    channel.publish(events)
+                if len(events) < self.history_size:
+                    break
+
+    def run(self):
+        while True:
+            self.wake_event.wait(self.poll_interval)
+            self.wake_event.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Live feed: kontrola nových měření selhala: {e}")
+                time.sleep(self.poll_interval)
@@ -0,0 +1,97 @@
+import threading
+import time
+from bisect import bisect_left
+
+from json_encoding import FastJSONProvider
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    # Čítače a histogramy ve formátu pro Prometheus (text exposition format)
+    def __init__(self, prefix='weather_api'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.descriptions = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def counter(self, name, description):
+        self.descriptions[name] = ('counter', description, None)
+        self.counters[name] = {}
+
+    def histogram(self, name, description, buckets):
+        self.descriptions[name] = ('histogram', description, tuple(buckets))
+        self.histograms[name] = {}
+
+    def inc(self, name, labels=(), value=1):
+        labels = tuple(labels)
+        with self.lock:
+            series = self.counters[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, value, labels=()):
+        labels = tuple(labels)
+        buckets = self.descriptions[name][2]
+        with self.lock:
+            series = self.histograms[name]
+            state = series.get(labels)
+            if state is None:
+                # Počty v jednotlivých intervalech, součet a počet pozorování
+                state = series[labels] = [[0] * len(buckets), 0.0, 0]
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (metric_type, description, buckets) in self.descriptions.items():
+                full_name = f'{self.prefix}_{name}'
+                lines.append(f'# HELP {full_name} {description}')
+                lines.append(f'# TYPE {full_name} {metric_type}')
+                if metric_type == 'counter':
+                    for labels, value in sorted(self.counters[name].items()):
+                        lines.append(f'{full_name}{format_labels(labels)} {format_value(value)}')
+                    continue
+                for labels, (bucket_counts, total, count) in sorted(self.histograms[name].items()):
+                    # Hodnoty bucketů jsou kumulativní
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(f'{full_name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+                    lines.append(f'{full_name}_bucket{format_labels(labels + (("le", "+Inf"),))} {count}')
+                    lines.append(f'{full_name}_sum{format_labels(labels)} {format_value(total)}')
+                    lines.append(f'{full_name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+class TimedJSONProvider(FastJSONProvider):
+    # JSON provider Flasku, který hlásí dobu serializace (jsonify i app.json.dumps)
+    timing_callback = None
+
+    def encode(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().encode(obj, **kwargs)
+        finally:
+            if self.timing_callback is not None:
+                self.timing_callback(time.perf_counter() - start)
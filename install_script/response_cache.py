@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Na disku: tělo odpovědi a vedle něj JSON s klíčem, typem, hlavičkami a otiskem těla
+BODY_SUFFIX = '.body'
+META_SUFFIX = '.json'
+
+
+class ResponseCache:
+    # LRU cache odpovědí API, záznamy bez watermarku (uzavřená období) jsou neměnné
+    def __init__(self, max_entries=512, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir or None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Zvyšuje se s každým zneplatněním uzavřených období – odpověď vypočtená před ním se neuloží
+        self.generation = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Soubory ze starší verze (pickle) se už nečtou
+            for path in self._cache_files('.pickle'):
+                self._remove_file(path)
+
+    def _file_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+    def _cache_files(self, suffix):
+        # Jen soubory cache (název je SHA-1 klíče) – složku může sdílet např. snímek schématu
+        return [
+            os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+            if name.endswith(suffix) and len(name) == 40 + len(suffix)
+            and all(character in '0123456789abcdef' for character in name[:40])
+        ]
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _load(self, key):
+        # Neměnné záznamy uložené na disku z předchozího běhu serveru – hodnota je (tělo, mimetype, hlavičky)
+        file_path = self._file_path(key)
+        try:
+            with open(file_path + META_SUFFIX, encoding='utf-8') as file:
+                meta = json.load(file)
+            with open(file_path + BODY_SUFFIX, 'rb') as file:
+                body = file.read()
+            if meta['key'] != key or meta['sha256'] != hashlib.sha256(body).hexdigest():
+                return None
+            period_end = datetime.fromisoformat(meta['period_end']) if meta['period_end'] else None
+            value = (body, meta['mimetype'], dict(meta['headers']))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return {'value': value, 'watermark': None, 'period_end': period_end}
+
+    def _store(self, key, value, period_end):
+        body, mimetype, headers = value
+        file_path = self._file_path(key)
+        meta = {
+            'key': key,
+            'mimetype': mimetype,
+            'headers': headers,
+            'period_end': period_end.isoformat() if period_end else None,
+            'sha256': hashlib.sha256(body).hexdigest(),
+        }
+        try:
+            # Tělo první, JSON nakonec – záznam bez platného JSON se nenačte
+            for suffix, mode, data in ((BODY_SUFFIX, 'wb', body), (META_SUFFIX, 'w', json.dumps(meta))):
+                with open(file_path + suffix + '.tmp', mode) as file:
+                    file.write(data)
+                os.replace(file_path + suffix + '.tmp', file_path + suffix)
+        except OSError as e:
+            print(f"Nelze uložit odpověď do cache na disku: {e}")
+
+    def _insert(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, watermark=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.cache_dir and watermark is None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._insert(key, entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            # Data pro aktuální období se změnila od uložení odpovědi
+            if entry['watermark'] != watermark:
+                del self.entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['value']
+
+    def set(self, key, value, watermark=None, period_end=None, generation=None):
+        # generation = hodnota self.generation před výpočtem odpovědi (None = bez kontroly)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._insert(key, {'value': value, 'watermark': watermark, 'period_end': period_end})
+        if self.cache_dir and watermark is None:
+            self._store(key, value, period_end)
+
+    def invalidate_period(self, since):
+        # Zpožděná měření (spool, rollup) – zahodí uzavřená období, která končí po čase since
+        with self.lock:
+            self.generation += 1
+            stale_keys = [
+                key for key, entry in self.entries.items()
+                if entry['watermark'] is None and (entry['period_end'] is None or entry['period_end'] > since)
+            ]
+            for key in stale_keys:
+                del self.entries[key]
+            self.invalidations += len(stale_keys)
+
+            if self.cache_dir:
+                for path in self._cache_files(META_SUFFIX):
+                    try:
+                        with open(path, encoding='utf-8') as file:
+                            period_end = json.load(file)['period_end']
+                        period_end = datetime.fromisoformat(period_end) if period_end else None
+                    except (OSError, ValueError, KeyError, TypeError):
+                        period_end = None
+                    if period_end is None or period_end > since:
+                        self._remove_file(path)
+                        self._remove_file(path[:-len(META_SUFFIX)] + BODY_SUFFIX)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+            }
@@ -0,0 +1,251 @@
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import Float, Integer, Numeric
+
+from rollup import CommitHorizon
+
+EPOCH = datetime(1970, 1, 1)
+# Hodnota NULL v poli celých čísel
+MISSING = -2 ** 63
+
+
+def to_micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+def value_scales(table):
+    # Počet desetinných míst sloupců měření – DECIMAL(5,2) se ukládá jako celé číslo v setinách
+    if 'id' not in table.columns or 'time' not in table.columns:
+        raise ValueError(f"Table {table.name} has no id or time column")
+    scales = {}
+    for column in table.columns:
+        if column.name in ('id', 'time'):
+            continue
+        if isinstance(column.type, Integer):
+            scales[column.name] = 0
+        elif isinstance(column.type, Numeric) and not isinstance(column.type, Float) and column.type.scale is not None:
+            scales[column.name] = column.type.scale
+        else:
+            raise ValueError(f"Column {column.name} cannot be stored as a scaled integer")
+    return scales
+
+
+def encode_value(column_name, scale, value):
+    # Hodnota sloupce jako celé číslo – čas v mikrosekundách, DECIMAL vynásobený 10^scale
+    if value is None:
+        return None
+    if column_name == 'time':
+        return to_micros(value)
+    if scale is None or scale == 0:
+        return int(value)
+    return int(Decimal(value).scaleb(scale).to_integral_value())
+
+
+def decode_value(column_name, scale, value):
+    if value is None:
+        return None
+    if column_name == 'time':
+        return from_micros(value)
+    if scale is None or scale == 0:
+        return value
+    # Stejný typ jako z databáze (Decimal s pevným počtem desetinných míst)
+    return Decimal(value).scaleb(-scale)
+
+
+class ReadingRing:
+    # Posledních N hodin měření jedné meteostanice v kruhovém bufferu – každý sloupec je jedno pole celých čísel
+    __slots__ = (
+        'table_name', 'column_names', 'scales', 'capacity', 'window', 'values', 'id_values', 'time_values',
+        'start', 'size', 'last_id', 'last_time', 'covered_from', 'lock'
+    )
+
+    def __init__(self, table, capacity=8640, window_hours=24):
+        scales = value_scales(table)
+        self.table_name = table.name
+        self.column_names = [column.name for column in table.columns]
+        # Počet desetinných míst ve stejném pořadí jako column_names (id a time mají None)
+        self.scales = [scales.get(column_name) for column_name in self.column_names]
+        self.capacity = capacity
+        self.window = timedelta(hours=window_hours)
+        self.values = [array('q', bytes(8 * capacity)) for _ in self.column_names]
+        self.id_values = self.values[self.column_names.index('id')]
+        self.time_values = self.values[self.column_names.index('time')]
+        self.start = 0
+        self.size = 0
+        self.last_id = 0
+        self.last_time = None
+        # Od tohoto času jsou v bufferu všechna měření z databáze (None = buffer ještě není načtený)
+        self.covered_from = None
+        self.lock = threading.Lock()
+
+    def _evict_oldest(self):
+        # Plný buffer – nejstarší měření se přepíše, pokrytí začíná až dalším
+        self.start = (self.start + 1) % self.capacity
+        self.size -= 1
+        oldest_time = self.time_values[self.start]
+        if oldest_time != MISSING and self.covered_from is not None:
+            self.covered_from = max(self.covered_from, from_micros(oldest_time))
+
+    def _write(self, position, row):
+        for column_name, scale, values in zip(self.column_names, self.scales, self.values):
+            value = encode_value(column_name, scale, row[column_name])
+            values[position] = MISSING if value is None else value
+        if row['time'] is not None and (self.last_time is None or row['time'] > self.last_time):
+            self.last_time = row['time']
+
+    def _append(self, row):
+        if row['id'] <= self.last_id:
+            self._insert(row)
+            return
+        if self.size == self.capacity:
+            self._evict_oldest()
+        self._write((self.start + self.size) % self.capacity, row)
+        self.size += 1
+        self.last_id = row['id']
+
+    def _insert(self, row):
+        # Pozdě potvrzený řádek s nižším id se zařadí podle id – bývá jen mezi několika posledními
+        offset = self.size
+        while offset and self.id_values[(self.start + offset - 1) % self.capacity] > row['id']:
+            offset -= 1
+        if offset and self.id_values[(self.start + offset - 1) % self.capacity] == row['id']:
+            return
+        if self.size == self.capacity:
+            # Řádek starší než celý plný buffer je mimo pokrytí
+            if not offset:
+                return
+            self._evict_oldest()
+            offset -= 1
+        for shifted in range(self.size, offset, -1):
+            target = (self.start + shifted) % self.capacity
+            source = (self.start + shifted - 1) % self.capacity
+            for values in self.values:
+                values[target] = values[source]
+        self._write((self.start + offset) % self.capacity, row)
+        self.size += 1
+
+    def load(self, rows, covered_from, last_id, last_time):
+        # Počáteční stav z databáze – řádky seřazené podle id, last_id a last_time jsou maxima celé tabulky
+        with self.lock:
+            self.start = 0
+            self.size = 0
+            self.last_id = 0
+            self.last_time = None
+            self.covered_from = covered_from
+            for row in rows:
+                self._append(row)
+            self.last_id = max(self.last_id, last_id or 0)
+            if last_time is not None and (self.last_time is None or last_time > self.last_time):
+                self.last_time = last_time
+
+    def extend(self, rows):
+        with self.lock:
+            for row in rows:
+                self._append(row)
+
+    def trim(self, now):
+        # Měření starší než okno se uvolní, pokrytí začíná začátkem okna
+        cutoff = now - self.window
+        cutoff_micros = to_micros(cutoff)
+        with self.lock:
+            while self.size and self.time_values[self.start] < cutoff_micros:
+                self.start = (self.start + 1) % self.capacity
+                self.size -= 1
+            if self.covered_from is not None:
+                self.covered_from = max(self.covered_from, cutoff)
+
+    def _row(self, position):
+        return {
+            column_name: None if values[position] == MISSING else decode_value(column_name, scale, values[position])
+            for column_name, scale, values in zip(self.column_names, self.scales, self.values)
+        }
+
+    def covers(self, start):
+        return self.covered_from is not None and start >= self.covered_from
+
+    def last_row(self):
+        with self.lock:
+            if not self.size:
+                return None
+            return self._row((self.start + self.size - 1) % self.capacity)
+
+    def rows_between(self, start, end, after_id=0):
+        # Řádky s časem v intervalu [start, end) a id > after_id, None = interval není celý v bufferu
+        start_micros = to_micros(start)
+        end_micros = to_micros(end)
+        ids = self.id_values
+        with self.lock:
+            if not self.covers(start):
+                return None
+            rows = []
+            for offset in range(self.size):
+                position = (self.start + offset) % self.capacity
+                if start_micros <= self.time_values[position] < end_micros and ids[position] > after_id:
+                    rows.append(self._row(position))
+            return rows
+
+    def ids_after(self, after_id):
+        # Id řádků v bufferu větší než after_id (hledá se od konce)
+        with self.lock:
+            ids = set()
+            for offset in range(self.size - 1, -1, -1):
+                row_id = self.id_values[(self.start + offset) % self.capacity]
+                if row_id <= after_id:
+                    break
+                ids.add(row_id)
+            return ids
+
+    def stats(self):
+        with self.lock:
+            return {
+                'rows': self.size,
+                'capacity': self.capacity,
+                'last_id': self.last_id,
+                'covered_from': self.covered_from.isoformat() if self.covered_from else None,
+            }
+
+
+class RingFeeder(threading.Thread):
+    # Dočítání nových řádků (id > poslední id v bufferu) – po zápisu přes /api/ingest hned, jinak po poll_interval.
+    # Řádky nad horizontem potvrzených zápisů se čtou znovu, aby se doplnil i pozdě potvrzený řádek s nižším id
+    def __init__(self, ring, fetch_rows, poll_interval=5.0, batch_size=1000, settle_seconds=5.0):
+        super().__init__(name='ring-feeder', daemon=True)
+        self.ring = ring
+        self.fetch_rows = fetch_rows
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        # Zápisy rozpracované při načtení bufferu mohou mít id kdekoli mezi načtenými řádky
+        self.horizon = CommitHorizon(settle_seconds, settled_id=min(ring.ids_after(0), default=ring.last_id + 1) - 1)
+        self.wake_event = threading.Event()
+
+    def wake(self):
+        self.wake_event.set()
+
+    def poll(self):
+        after_id = self.horizon.observe(self.ring.last_id)
+        present_ids = self.ring.ids_after(after_id)
+        while True:
+            rows = self.fetch_rows(after_id, self.batch_size)
+            self.ring.extend([row for row in rows if row['id'] not in present_ids])
+            if len(rows) < self.batch_size:
+                break
+            after_id = rows[-1]['id']
+        self.ring.trim(datetime.now())
+
+    def run(self):
+        while True:
+            self.wake_event.wait(self.poll_interval)
+            self.wake_event.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Buffer posledních měření: načtení nových řádků selhalo: {e}")
+                time.sleep(self.poll_interval)
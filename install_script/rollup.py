@@ -0,0 +1,354 @@
+import configparser
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Column, Date, DateTime, Float, Integer, MetaData, Numeric, String, Table,
+    and_, bindparam, create_engine, func, select
+)
+
+
+def hour_start(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(value):
+    return datetime.combine(value.date(), datetime.min.time())
+
+
+def week_start(value):
+    return day_start(value) - timedelta(days=value.weekday())
+
+
+def next_month_start(value):
+    # Měsíční agregace je označená začátkem následujícího měsíce (sloupec next_month_start)
+    if value.month == 12:
+        return datetime(value.year + 1, 1, 1)
+    return datetime(value.year, value.month + 1, 1)
+
+
+# Úrovně agregace: (název, cílová tabulka, sloupec s datem, začátek intervalu)
+ROLLUP_LEVELS = [
+    ('hourly', 'aggregated_data', 'time', hour_start),
+    ('daily', 'aggregated_daily_data', 'week_start', day_start),
+    ('weekly', 'aggregated_weekly_data', 'week_start', week_start),
+    ('monthly', 'aggregated_monthly_data', 'next_month_start', next_month_start),
+]
+
+
+class CommitHorizon:
+    # Nejvyšší id, pod kterým jsou všechny zápisy dokončené. Auto-increment přiděluje id už při INSERT, takže řádek
+    # s nižším id se může objevit až po vyšším – id viděné před settle_seconds je bezpečné (zápis netrvá déle)
+    def __init__(self, settle_seconds=5.0, settled_id=0):
+        self.settle_seconds = settle_seconds
+        self.settled_id = settled_id
+        # (čas, nejvyšší viditelné id) v rostoucím pořadí
+        self.observations = deque()
+        self.lock = threading.Lock()
+
+    def observe(self, max_id):
+        # Zaznamená nejvyšší viditelné id, vrací id, do kterého je zpracování bezpečné
+        now = time.monotonic()
+        with self.lock:
+            last_observed = self.observations[-1][1] if self.observations else self.settled_id
+            if max_id is not None and max_id > last_observed:
+                self.observations.append((now, max_id))
+            while self.observations and now - self.observations[0][0] >= self.settle_seconds:
+                self.settled_id = self.observations.popleft()[1]
+            return self.settled_id
+
+    def wait_time(self):
+        # Za kolik sekund se posune settled_id (None = všechna viděná id jsou už bezpečná)
+        with self.lock:
+            if not self.observations:
+                return None
+            return max(self.observations[0][0] + self.settle_seconds - time.monotonic(), 0)
+
+
+class RollupEngine:
+    # Přírůstková agregace surových měření do tabulek aggregated_*
+    def __init__(self, engine, source_table_name='Weather_table_meteostation1', batch_size=5000, schema_metadata=None,
+                 on_batch=None, settle_seconds=5.0):
+        self.engine = engine
+        self.source_table_name = source_table_name
+        self.batch_size = batch_size
+        self.horizon = CommitHorizon(settle_seconds)
+        # Volá se po zapsání dávky s nejstarším časem jejích měření (např. zneplatnění cache odpovědí)
+        self.on_batch = on_batch
+        self.lock = threading.Lock()
+
+        self.metadata = MetaData()
+        # Poslední zpracované id zdrojové tabulky (high-water mark)
+        self.state_table = Table(
+            'rollup_state', self.metadata,
+            Column('source_table', String(64), primary_key=True),
+            Column('last_id', Integer, nullable=False, default=0),
+            Column('updated_at', DateTime),
+        )
+        # Součet, počet, minimum a maximum každého sloupce v intervalu – z nich se počítá průměr
+        self.partials_table = Table(
+            'rollup_partials', self.metadata,
+            Column('source_table', String(64), primary_key=True),
+            Column('level', String(16), primary_key=True),
+            Column('bucket_start', DateTime, primary_key=True),
+            Column('column_name', String(64), primary_key=True),
+            Column('value_sum', Float, nullable=False),
+            Column('value_count', Integer, nullable=False),
+            Column('value_min', Float),
+            Column('value_max', Float),
+        )
+        self.metadata.create_all(engine)
+
+        # Tabulky ze snímku schématu se znovu nereflektují
+        reflected = schema_metadata if schema_metadata is not None else MetaData()
+        self.source_table = Table(source_table_name, reflected, autoload_with=engine)
+        self.source_columns = [
+            column.name for column in self.source_table.columns
+            if column.name != 'id' and isinstance(column.type, (Numeric, Integer))
+        ]
+
+        # Cílové tabulky, které v databázi existují, a sloupce společné se zdrojovou tabulkou
+        self.levels = []
+        for level, table_name, date_column_name, bucket_function in ROLLUP_LEVELS:
+            try:
+                target_table = Table(table_name, reflected, autoload_with=engine)
+            except Exception:
+                print(f"Rollup: tabulka {table_name} neexistuje, úroveň {level} se přeskočí")
+                continue
+            target_columns = [column_name for column_name in self.source_columns if column_name in target_table.columns]
+            self.levels.append((level, target_table, date_column_name, bucket_function, target_columns))
+
+        # Nejstarší čas měření, které rollup ještě nezpracoval, se drží v paměti – požadavky API se na něj nemusí
+        # ptát databáze. Přepočítá se po každém běhu, zapisovače měření hlásí nové řádky přes mark_pending
+        self.pending_lock = threading.Lock()
+        self.pending_time = None
+        self.marked_time = None
+        self.refresh_pending_time()
+
+    def _last_id(self, conn):
+        state = conn.execute(
+            select(self.state_table.c.last_id)
+            .where(self.state_table.c.source_table == self.source_table_name)
+            .with_for_update()
+        ).scalar()
+        if state is None:
+            conn.execute(self.state_table.insert().values(source_table=self.source_table_name, last_id=0))
+            return 0
+        return state
+
+    def _fold(self, rows):
+        # Částečné agregace nových řádků po (úroveň, začátek intervalu, sloupec)
+        partials = {}
+        for row in rows:
+            for level, _, _, bucket_function, target_columns in self.levels:
+                bucket = bucket_function(row.time)
+                for column_name in target_columns:
+                    value = row._mapping[column_name]
+                    if value is None:
+                        continue
+                    value = float(value)
+                    key = (level, bucket, column_name)
+                    partial = partials.get(key)
+                    if partial is None:
+                        partials[key] = [value, 1, value, value]
+                    else:
+                        partial[0] += value
+                        partial[1] += 1
+                        if value < partial[2]:
+                            partial[2] = value
+                        if value > partial[3]:
+                            partial[3] = value
+        return partials
+
+    def _merge_partials(self, conn, partials):
+        # Sloučení s již uloženými částečnými agregacemi dotčených intervalů
+        table = self.partials_table
+        existing = set()
+        for level in {key[0] for key in partials}:
+            buckets = {key[1] for key in partials if key[0] == level}
+            stored_rows = conn.execute(
+                select(table).where(
+                    table.c.source_table == self.source_table_name,
+                    table.c.level == level,
+                    table.c.bucket_start.in_(buckets)
+                )
+            )
+            for stored in stored_rows:
+                key = (stored.level, stored.bucket_start, stored.column_name)
+                partial = partials.get(key)
+                if partial is None:
+                    continue
+                existing.add(key)
+                partial[0] += stored.value_sum
+                partial[1] += stored.value_count
+                if stored.value_min is not None and stored.value_min < partial[2]:
+                    partial[2] = stored.value_min
+                if stored.value_max is not None and stored.value_max > partial[3]:
+                    partial[3] = stored.value_max
+
+        updates = []
+        inserts = []
+        for key, (value_sum, value_count, value_min, value_max) in partials.items():
+            values = {
+                'b_source_table': self.source_table_name, 'b_level': key[0], 'b_bucket_start': key[1],
+                'b_column_name': key[2], 'value_sum': value_sum, 'value_count': value_count,
+                'value_min': value_min, 'value_max': value_max,
+            }
+            (updates if key in existing else inserts).append(values)
+
+        if updates:
+            conn.execute(
+                table.update().where(and_(
+                    table.c.source_table == bindparam('b_source_table'),
+                    table.c.level == bindparam('b_level'),
+                    table.c.bucket_start == bindparam('b_bucket_start'),
+                    table.c.column_name == bindparam('b_column_name'),
+                )),
+                updates
+            )
+        if inserts:
+            conn.execute(table.insert(), [
+                {
+                    'source_table': values['b_source_table'], 'level': values['b_level'],
+                    'bucket_start': values['b_bucket_start'], 'column_name': values['b_column_name'],
+                    'value_sum': values['value_sum'], 'value_count': values['value_count'],
+                    'value_min': values['value_min'], 'value_max': values['value_max'],
+                }
+                for values in inserts
+            ])
+
+    def _write_aggregates(self, conn, partials):
+        # Přepsání jen dotčených řádků v tabulkách aggregated_*
+        for level, target_table, date_column_name, _, target_columns in self.levels:
+            date_column = target_table.c[date_column_name]
+            only_date = isinstance(date_column.type, Date) and not isinstance(date_column.type, DateTime)
+            buckets = {key[1] for key in partials if key[0] == level}
+            for bucket in sorted(buckets):
+                values = {}
+                for column_name in target_columns:
+                    partial = partials.get((level, bucket, column_name))
+                    if partial is None:
+                        continue
+                    scale = getattr(target_table.c[column_name].type, 'scale', None)
+                    average = partial[0] / partial[1]
+                    values[column_name] = round(average, scale) if scale is not None else average
+
+                bucket_value = bucket.date() if only_date else bucket
+                result = conn.execute(target_table.update().where(date_column == bucket_value).values(**values))
+                if result.rowcount == 0:
+                    conn.execute(target_table.insert().values(**{date_column_name: bucket_value}, **values))
+
+    def run_once(self):
+        # Zpracuje jednu dávku nových řádků, vrací jejich počet
+        with self.lock:
+            with self.engine.begin() as conn:
+                last_id = self._last_id(conn)
+                # Jen řádky pod horizontem potvrzených zápisů – high-water mark nesmí přeskočit pozdě potvrzený řádek
+                settled_id = self.horizon.observe(conn.execute(select(func.max(self.source_table.c.id))).scalar())
+                rows = conn.execute(
+                    select(self.source_table)
+                    .where(self.source_table.c.id > last_id, self.source_table.c.id <= settled_id)
+                    .order_by(self.source_table.c.id)
+                    .limit(self.batch_size)
+                ).all()
+                if not rows:
+                    return 0
+
+                partials = self._fold(rows)
+                self._merge_partials(conn, partials)
+                self._write_aggregates(conn, partials)
+
+                # Posun high-water mark ve stejné transakci – běh je opakovatelný a idempotentní
+                conn.execute(
+                    self.state_table.update()
+                    .where(self.state_table.c.source_table == self.source_table_name)
+                    .values(last_id=rows[-1].id, updated_at=datetime.now())
+                )
+
+            times = [row.time for row in rows if row.time is not None]
+            if self.on_batch is not None and times:
+                try:
+                    self.on_batch(self.source_table_name, min(times))
+                except Exception as e:
+                    print(f"Rollup: chyba při zpracování dávky: {e}")
+            return len(rows)
+
+    def _query_pending_time(self):
+        state_table = self.state_table
+        last_id = (
+            select(state_table.c.last_id).where(state_table.c.source_table == self.source_table_name).scalar_subquery()
+        )
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.min(self.source_table.c.time)).where(self.source_table.c.id > func.coalesce(last_id, 0))
+            ).scalar()
+
+    def refresh_pending_time(self):
+        # Čas nahlášený během dotazu se neztratí – dotaz nemusel vidět řádky potvrzené až po jeho začátku
+        with self.pending_lock:
+            self.marked_time = None
+        pending_time = self._query_pending_time()
+        with self.pending_lock:
+            self.pending_time = min((value for value in (pending_time, self.marked_time) if value is not None), default=None)
+            self.marked_time = None
+
+    def mark_pending(self, oldest_time):
+        # Nově zapsaná měření čekají na další běh rollupu
+        with self.pending_lock:
+            if self.pending_time is None or oldest_time < self.pending_time:
+                self.pending_time = oldest_time
+            if self.marked_time is None or oldest_time < self.marked_time:
+                self.marked_time = oldest_time
+
+    def oldest_pending_time(self):
+        # Nejstarší čas měření, které rollup ještě nezpracoval (None = vše zpracováno), bez dotazu do databáze
+        with self.pending_lock:
+            return self.pending_time
+
+    def run_until_current(self):
+        total = 0
+        while True:
+            processed = self.run_once()
+            total += processed
+            if processed < self.batch_size:
+                self.refresh_pending_time()
+                return total
+
+
+class RollupWorker(threading.Thread):
+    # Vlákno, které v pravidelném intervalu dopočítává agregace
+    def __init__(self, rollup_engine, interval=10):
+        super().__init__(name='rollup-worker', daemon=True)
+        self.rollup_engine = rollup_engine
+        self.interval = interval
+        self.wake_event = threading.Event()
+
+    def wake(self):
+        # Okamžité spuštění, např. po zápisu nových měření
+        self.wake_event.set()
+
+    def run(self):
+        while True:
+            try:
+                self.rollup_engine.run_until_current()
+            except Exception as e:
+                print(f"Rollup selhal: {e}")
+            # Nové řádky nad horizontem se zpracují hned, jak se horizont posune
+            settle_wait = self.rollup_engine.horizon.wait_time()
+            self.wake_event.wait(self.interval if settle_wait is None else min(self.interval, settle_wait))
+            self.wake_event.clear()
+
+
+if __name__ == '__main__':
+    config = configparser.ConfigParser()
+    config.read('/var/www/html/config.cfg')
+    rollup_engine = RollupEngine(
+        create_engine(config['DEFAULT']['SQLALCHEMY_DATABASE_URI']),
+        batch_size=config['DEFAULT'].getint('ROLLUP_BATCH_SIZE', fallback=5000),
+        settle_seconds=0
+    )
+    start = time.time()
+    processed = rollup_engine.run_until_current()
+    print(f"Zpracováno {processed} řádků za {time.time() - start:.2f} s")
@@ -0,0 +1,97 @@
+import threading
+
+
+class RunningStats:
+    # Průběžné minimum, maximum a průměr všech sloupců za jeden den
+    def __init__(self, column_names, numeric_column_names):
+        self.column_names = list(column_names)
+        self.numeric_column_names = list(numeric_column_names)
+        self.lock = threading.Lock()
+        self.day = None
+        self.last_id = 0
+        self.min_values = {}
+        self.max_values = {}
+        self.sums = {}
+        self.counts = {}
+        # Řádky nad horizontem potvrzených zápisů – započtou se jen do výsledku, trvale až po potvrzení
+        self.tail = []
+
+    def seed(self, day, last_id, min_values, max_values, sums, counts):
+        # Počáteční stav z jednoho agregačního dotazu (MIN/MAX/SUM/COUNT) nad daným dnem
+        with self.lock:
+            self.day = day
+            self.last_id = last_id or 0
+            self.min_values = dict(min_values)
+            self.max_values = dict(max_values)
+            self.sums = dict(sums)
+            self.counts = dict(counts)
+            self.tail = []
+
+    def _accumulate(self, min_values, max_values, sums, counts, row):
+        for column_name in self.column_names:
+            value = row.get(column_name)
+            if value is None:
+                continue
+            current_min = min_values.get(column_name)
+            if current_min is None or value < current_min:
+                min_values[column_name] = value
+            current_max = max_values.get(column_name)
+            if current_max is None or value > current_max:
+                max_values[column_name] = value
+            if column_name in self.numeric_column_names:
+                total = sums.get(column_name)
+                sums[column_name] = value if total is None else total + value
+                counts[column_name] = counts.get(column_name, 0) + 1
+
+    def update(self, row):
+        # Započtení jednoho nového řádku, řádek je slovník {sloupec: hodnota}
+        with self.lock:
+            row_id = row.get('id')
+            if row_id is not None and row_id <= self.last_id:
+                return
+            self._accumulate(self.min_values, self.max_values, self.sums, self.counts, row)
+            if row_id is not None:
+                self.last_id = row_id
+
+    def advance(self, rows, settled_id):
+        # Řádky s id > last_id seřazené podle id. Do settled_id jsou všechny zápisy potvrzené – ty se započtou
+        # natrvalo a last_id se posune. Mezi novější řádky může ještě přibýt pozdě potvrzený řádek s nižším id,
+        # proto se drží zvlášť a při dalším volání se načtou znovu
+        with self.lock:
+            tail = []
+            for row in rows:
+                if row['id'] <= self.last_id:
+                    continue
+                if row['id'] <= settled_id:
+                    self._accumulate(self.min_values, self.max_values, self.sums, self.counts, row)
+                else:
+                    tail.append(row)
+            self.last_id = max(self.last_id, settled_id or 0)
+            self.tail = tail
+
+    def _totals(self):
+        if not self.tail:
+            return self.min_values, self.max_values, self.sums, self.counts
+        totals = dict(self.min_values), dict(self.max_values), dict(self.sums), dict(self.counts)
+        for row in self.tail:
+            self._accumulate(*totals, row)
+        return totals
+
+    def minimums(self):
+        with self.lock:
+            min_values = self._totals()[0]
+            return {column_name: min_values.get(column_name) for column_name in self.column_names}
+
+    def maximums(self):
+        with self.lock:
+            max_values = self._totals()[1]
+            return {column_name: max_values.get(column_name) for column_name in self.column_names}
+
+    def averages(self, digits=2):
+        with self.lock:
+            _, _, sums, counts = self._totals()
+            return {
+                column_name: round(sums[column_name] / counts[column_name], digits)
+                if counts.get(column_name) else None
+                for column_name in self.numeric_column_names
+            }
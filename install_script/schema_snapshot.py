@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import sys
+
+import sqlalchemy
+from sqlalchemy import Column, ForeignKeyConstraint, Index, MetaData, Table, text
+from sqlalchemy.types import TypeEngine
+from sqlalchemy.util import get_cls_kwargs
+
+# Dotazy, jejichž výsledek určuje otisk schématu (změna sloupce nebo indexu = nový snímek)
+FINGERPRINT_QUERIES = {
+    'mysql': [
+        "SELECT table_name, column_name, column_type, is_nullable, column_key, column_default, extra "
+        "FROM information_schema.columns WHERE table_schema = DATABASE() "
+        "ORDER BY table_name, ordinal_position",
+        "SELECT table_name, index_name, non_unique, seq_in_index, column_name "
+        "FROM information_schema.statistics WHERE table_schema = DATABASE() "
+        "ORDER BY table_name, index_name, seq_in_index",
+    ],
+    'sqlite': [
+        "SELECT type, name, tbl_name, sql FROM sqlite_master ORDER BY type, name",
+    ],
+}
+
+
+def schema_fingerprint(engine):
+    # Otisk schématu z information_schema (sqlite_master na SQLite), None = databáze nepodporuje
+    queries = FINGERPRINT_QUERIES.get(engine.dialect.name)
+    if queries is None:
+        return None
+    checksum = hashlib.sha256(sqlalchemy.__version__.encode())
+    with engine.connect() as conn:
+        for query in queries:
+            for row in conn.execute(text(query)):
+                checksum.update(repr(tuple(row)).encode())
+    return checksum.hexdigest()
+
+
+def describe_type(column_type):
+    # Typ sloupce jako třída SQLAlchemy a argumenty jejího konstruktoru
+    type_class = type(column_type)
+    return {
+        'class': f'{type_class.__module__}.{type_class.__qualname__}',
+        'arguments': {
+            name: getattr(column_type, name) for name in sorted(get_cls_kwargs(type_class)) if hasattr(column_type, name)
+        },
+    }
+
+
+def build_type(description):
+    # Jen třídy typů ze SQLAlchemy, které už jsou načtené – obsah souboru neurčuje, jaký kód se spustí
+    module_name, _, class_name = description['class'].rpartition('.')
+    module = sys.modules.get(module_name) if module_name.startswith('sqlalchemy.') else None
+    type_class = getattr(module, class_name, None)
+    if not (isinstance(type_class, type) and issubclass(type_class, TypeEngine)):
+        raise ValueError(f"Unsupported column type {description['class']}")
+    return type_class(**description['arguments'])
+
+
+def describe_metadata(metadata):
+    tables = []
+    for table in metadata.tables.values():
+        tables.append({
+            'name': table.name,
+            'columns': [
+                {
+                    'name': column.name,
+                    'type': describe_type(column.type),
+                    'nullable': column.nullable,
+                    'primary_key': column.primary_key,
+                    'autoincrement': column.autoincrement,
+                    'server_default': str(column.server_default.arg) if column.server_default is not None else None,
+                    'comment': column.comment,
+                }
+                for column in table.columns
+            ],
+            'indexes': [
+                {'name': index.name, 'columns': [column.name for column in index.columns], 'unique': index.unique}
+                for index in sorted(table.indexes, key=lambda index: index.name or '')
+            ],
+            'foreign_keys': [
+                {
+                    'name': constraint.name,
+                    'columns': list(constraint.column_keys),
+                    'references': [element.target_fullname for element in constraint.elements],
+                }
+                for constraint in sorted(table.foreign_key_constraints, key=lambda constraint: constraint.name or '')
+            ],
+        })
+    return {'tables': tables}
+
+
+def build_metadata(description):
+    metadata = MetaData()
+    for table_description in description['tables']:
+        table = Table(
+            table_description['name'], metadata,
+            *[
+                Column(
+                    column['name'], build_type(column['type']),
+                    nullable=column['nullable'], primary_key=column['primary_key'],
+                    autoincrement=column['autoincrement'], comment=column['comment'],
+                    server_default=text(column['server_default']) if column['server_default'] is not None else None
+                )
+                for column in table_description['columns']
+            ],
+            *[
+                ForeignKeyConstraint(foreign_key['columns'], foreign_key['references'], name=foreign_key['name'])
+                for foreign_key in table_description['foreign_keys']
+            ]
+        )
+        for index in table_description['indexes']:
+            Index(index['name'], *[table.columns[column_name] for column_name in index['columns']], unique=index['unique'])
+    return metadata
+
+
+def load_snapshot(path, fingerprint):
+    try:
+        with open(path, encoding='utf-8') as file:
+            snapshot = json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Snímek schématu {path} nelze načíst: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('fingerprint') != fingerprint:
+        return None
+    try:
+        return build_metadata(snapshot['metadata'])
+    except Exception as e:
+        # Neznámý nebo neplatný popis – schéma se načte z databáze a snímek se přepíše
+        print(f"Snímek schématu {path} nelze použít: {e}")
+        return None
+
+
+def save_snapshot(path, fingerprint, metadata):
+    # Uloží se jen popis, ze kterého jde sestavit stejná metadata (jinak se schéma načítá z databáze při každém startu)
+    try:
+        description = json.loads(json.dumps(describe_metadata(metadata)))
+        if describe_metadata(build_metadata(description)) != description:
+            raise ValueError('column types cannot be restored')
+    except (TypeError, ValueError) as e:
+        print(f"Snímek schématu {path} nelze uložit: {e}")
+        return False
+
+    # Zápis přes dočasný soubor, aby souběžný start nenačetl rozepsaný snímek
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump({'fingerprint': fingerprint, 'metadata': description}, file)
+        os.replace(temporary_path, path)
+    except OSError as e:
+        print(f"Snímek schématu {path} nelze uložit: {e}")
+        return False
+    return True
+
+
+def load_schema_metadata(engine, snapshot_path=''):
+    # Metadata všech tabulek – ze snímku, pokud se schéma od posledního startu nezměnilo
+    fingerprint = schema_fingerprint(engine) if snapshot_path else None
+    if fingerprint is not None:
+        metadata = load_snapshot(snapshot_path, fingerprint)
+        if metadata is not None:
+            return metadata
+
+    metadata = MetaData()
+    metadata.reflect(engine)
+    if fingerprint is not None and save_snapshot(snapshot_path, fingerprint, metadata):
+        print(f"Snímek schématu uložen do {snapshot_path}")
+    return metadata
@@ -0,0 +1,20 @@
+from waitress import serve
+
+# Počet vláken serveru počítá API_server_3_10 (podle něj dimenzuje pool spojení), aplikace běží v jednom
+# procesu – zapisovače měření, rollup a cache odpovědí jsou sdílené v paměti
+from API_server_3_10 import DB_MAX_OVERFLOW, DB_POOL_SIZE, SERVER_THREADS, app, config
+
+SERVER_HOST = config['DEFAULT'].get('SERVER_HOST', fallback='0.0.0.0')
+SERVER_PORT = config['DEFAULT'].getint('SERVER_PORT', fallback=5000)
+
+if __name__ == '__main__':
+    print(f"API server na {SERVER_HOST}:{SERVER_PORT}, vláken: {SERVER_THREADS}, pool spojení: {DB_POOL_SIZE} + {DB_MAX_OVERFLOW}")
+    serve(
+        app,
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        threads=SERVER_THREADS,
+        connection_limit=config['DEFAULT'].getint('SERVER_CONNECTION_LIMIT', fallback=100),
+        channel_timeout=config['DEFAULT'].getint('SERVER_CHANNEL_TIMEOUT', fallback=120),
+        ident='weather-api',
+    )
@@ -0,0 +1,372 @@
+import configparser
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Column, DateTime, Float, Integer, LargeBinary, MetaData, Numeric, String, Table, and_, bindparam, create_engine,
+    func, or_, select
+)
+
+from ring_buffer import encode_value
+from rollup import CommitHorizon, day_start, hour_start
+
+# Úrovně, pro které se ukládají sketche: (název, začátek intervalu)
+SKETCH_LEVELS = [
+    ('hourly', hour_start),
+    ('daily', day_start),
+]
+
+
+class QuantileSketch:
+    # Histogram s intervaly pevné šířky nad celými čísly (hodnota * 10^scale) – slučitelný sčítáním,
+    # při překročení max_bins se šířka intervalu zdvojnásobí. Není to t-digest ani KLL: pořadí kvantilu je
+    # přesné, hodnota je střed intervalu, ve kterém kvantil leží, s absolutní chybou nejvýše max_error()
+    # (polovina šířky intervalu, šířka je zhruba rozsah hodnot / max_bins zaokrouhlený na mocninu dvou)
+    __slots__ = ('width', 'counts', 'count', 'min_value', 'max_value', 'max_bins')
+
+    def __init__(self, max_bins=512, width=1):
+        self.width = width
+        self.counts = {}
+        self.count = 0
+        self.min_value = None
+        self.max_value = None
+        self.max_bins = max_bins
+
+    def add(self, value, count=1):
+        index = value // self.width
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+        if len(self.counts) > self.max_bins:
+            self._compact()
+
+    def _coarsen(self, width):
+        # Převod na větší šířku intervalu (šířky jsou mocniny dvou, index se jen vydělí)
+        factor = width // self.width
+        if factor <= 1:
+            return
+        counts = {}
+        for index, count in self.counts.items():
+            counts[index // factor] = counts.get(index // factor, 0) + count
+        self.counts = counts
+        self.width = width
+
+    def _compact(self):
+        while len(self.counts) > self.max_bins:
+            self._coarsen(self.width * 2)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        width = max(self.width, other.width)
+        self._coarsen(width)
+        factor = width // other.width
+        for index, count in other.counts.items():
+            self.counts[index // factor] = self.counts.get(index // factor, 0) + count
+        self.count += other.count
+        if self.min_value is None or other.min_value < self.min_value:
+            self.min_value = other.min_value
+        if self.max_value is None or other.max_value > self.max_value:
+            self.max_value = other.max_value
+        self._compact()
+
+    def _bin_value(self, index):
+        # Střed intervalu, omezený skutečným minimem a maximem
+        value = index * self.width + (self.width - 1) / 2
+        return min(max(value, self.min_value), self.max_value)
+
+    def max_error(self):
+        # Nejvyšší absolutní chyba hodnoty kvantilu – vzdálenost středu intervalu od jeho okraje
+        return (self.width - 1) / 2
+
+    def quantile(self, q):
+        # Kvantil metodou nejbližšího pořadí
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min_value
+        if q >= 1:
+            return self.max_value
+        rank = max(1, math.ceil(q * self.count))
+        cumulative = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            if cumulative >= rank:
+                return self._bin_value(index)
+        return self.max_value
+
+    def histogram(self, bins):
+        # Rozdělení do bins intervalů stejné šířky mezi minimem a maximem: [(od, do, počet), ...]
+        if not self.count:
+            return []
+        span = (self.max_value - self.min_value) or 1
+        step = span / bins
+        counts = [0] * bins
+        for index, count in self.counts.items():
+            position = int((self._bin_value(index) - self.min_value) / step)
+            counts[min(position, bins - 1)] += count
+        return [(self.min_value + step * position, self.min_value + step * (position + 1), count)
+                for position, count in enumerate(counts)]
+
+    def to_bytes(self):
+        # Indexy intervalů jako rozdíly od předchozího – po kompresi zlib jen desítky bajtů na sketch
+        indexes = sorted(self.counts)
+        deltas = [indexes[0]] + [b - a for a, b in zip(indexes, indexes[1:])] if indexes else []
+        payload = [self.width, self.min_value, self.max_value, deltas, [self.counts[index] for index in indexes]]
+        return zlib.compress(json.dumps(payload, separators=(',', ':')).encode())
+
+    @classmethod
+    def from_bytes(cls, data, max_bins=512):
+        width, min_value, max_value, deltas, counts = json.loads(zlib.decompress(data))
+        sketch = cls(max_bins=max_bins, width=width)
+        index = 0
+        for delta, count in zip(deltas, counts):
+            index += delta
+            sketch.counts[index] = count
+        sketch.count = sum(counts)
+        sketch.min_value = min_value
+        sketch.max_value = max_value
+        return sketch
+
+
+def column_scale(column_type):
+    # Počet desetinných míst, se kterými se hodnoty ukládají – FLOAT a DECIMAL bez měřítka na setiny
+    if isinstance(column_type, Integer):
+        return 0
+    if isinstance(column_type, Numeric) and not isinstance(column_type, Float) and column_type.scale is not None:
+        return column_type.scale
+    return 2
+
+
+class SketchEngine:
+    # Přírůstkové sketche každého sloupce po hodinách a dnech, stejně jako RollupEngine podle high-water mark id
+    def __init__(self, engine, source_table_name='Weather_table_meteostation1', batch_size=5000, max_bins=512,
+                 schema_metadata=None, settle_seconds=5.0):
+        self.engine = engine
+        self.source_table_name = source_table_name
+        self.batch_size = batch_size
+        self.max_bins = max_bins
+        self.horizon = CommitHorizon(settle_seconds)
+        self.lock = threading.Lock()
+
+        self.metadata = MetaData()
+        self.state_table = Table(
+            'sketch_state', self.metadata,
+            Column('source_table', String(64), primary_key=True),
+            Column('last_id', Integer, nullable=False, default=0),
+            Column('updated_at', DateTime),
+        )
+        self.sketches_table = Table(
+            'rollup_sketches', self.metadata,
+            Column('source_table', String(64), primary_key=True),
+            Column('level', String(16), primary_key=True),
+            Column('bucket_start', DateTime, primary_key=True),
+            Column('column_name', String(64), primary_key=True),
+            Column('value_count', Integer, nullable=False),
+            Column('sketch', LargeBinary, nullable=False),
+        )
+        self.metadata.create_all(engine)
+
+        reflected = schema_metadata if schema_metadata is not None else MetaData()
+        self.source_table = Table(source_table_name, reflected, autoload_with=engine)
+        self.scales = {
+            column.name: column_scale(column.type) for column in self.source_table.columns
+            if column.name != 'id' and isinstance(column.type, (Numeric, Integer))
+        }
+
+    def _last_id(self, conn):
+        state = conn.execute(
+            select(self.state_table.c.last_id)
+            .where(self.state_table.c.source_table == self.source_table_name)
+            .with_for_update()
+        ).scalar()
+        if state is None:
+            conn.execute(self.state_table.insert().values(source_table=self.source_table_name, last_id=0))
+            return 0
+        return state
+
+    def _fold(self, rows):
+        sketches = {}
+        for row in rows:
+            if row.time is None:
+                continue
+            buckets = [(level, bucket_function(row.time)) for level, bucket_function in SKETCH_LEVELS]
+            for column_name, scale in self.scales.items():
+                value = row._mapping[column_name]
+                if value is None:
+                    continue
+                scaled = encode_value(column_name, scale, value)
+                for level, bucket in buckets:
+                    key = (level, bucket, column_name)
+                    sketch = sketches.get(key)
+                    if sketch is None:
+                        sketch = sketches[key] = QuantileSketch(self.max_bins)
+                    sketch.add(scaled)
+        return sketches
+
+    def _store(self, conn, sketches):
+        # Sloučení s uloženými sketchi dotčených intervalů a zápis zpět
+        table = self.sketches_table
+        existing = set()
+        for level in {key[0] for key in sketches}:
+            buckets = {key[1] for key in sketches if key[0] == level}
+            stored_rows = conn.execute(
+                select(table).where(
+                    table.c.source_table == self.source_table_name,
+                    table.c.level == level,
+                    table.c.bucket_start.in_(buckets)
+                )
+            )
+            for stored in stored_rows:
+                key = (stored.level, stored.bucket_start, stored.column_name)
+                sketch = sketches.get(key)
+                if sketch is None:
+                    continue
+                existing.add(key)
+                sketch.merge(QuantileSketch.from_bytes(stored.sketch, self.max_bins))
+
+        updates = []
+        inserts = []
+        for key, sketch in sketches.items():
+            values = {
+                'b_level': key[0], 'b_bucket_start': key[1], 'b_column_name': key[2],
+                'value_count': sketch.count, 'sketch': sketch.to_bytes(),
+            }
+            (updates if key in existing else inserts).append(values)
+
+        if updates:
+            conn.execute(
+                table.update().where(and_(
+                    table.c.source_table == self.source_table_name,
+                    table.c.level == bindparam('b_level'),
+                    table.c.bucket_start == bindparam('b_bucket_start'),
+                    table.c.column_name == bindparam('b_column_name'),
+                )),
+                updates
+            )
+        if inserts:
+            conn.execute(table.insert(), [
+                {
+                    'source_table': self.source_table_name, 'level': values['b_level'],
+                    'bucket_start': values['b_bucket_start'], 'column_name': values['b_column_name'],
+                    'value_count': values['value_count'], 'sketch': values['sketch'],
+                }
+                for values in inserts
+            ])
+
+    def run_once(self):
+        # Zpracuje jednu dávku nových řádků, vrací jejich počet
+        with self.lock, self.engine.begin() as conn:
+            last_id = self._last_id(conn)
+            # Sketche se jen sčítají – řádek pod high-water mark by se už nezapočítal, proto jen pod horizontem
+            settled_id = self.horizon.observe(conn.execute(select(func.max(self.source_table.c.id))).scalar())
+            rows = conn.execute(
+                select(self.source_table)
+                .where(self.source_table.c.id > last_id, self.source_table.c.id <= settled_id)
+                .order_by(self.source_table.c.id)
+                .limit(self.batch_size)
+            ).all()
+            if not rows:
+                return 0
+
+            self._store(conn, self._fold(rows))
+            conn.execute(
+                self.state_table.update()
+                .where(self.state_table.c.source_table == self.source_table_name)
+                .values(last_id=rows[-1].id, updated_at=datetime.now())
+            )
+            return len(rows)
+
+    def run_until_current(self):
+        total = 0
+        while True:
+            processed = self.run_once()
+            total += processed
+            if processed < self.batch_size:
+                return total
+
+    def merged_sketch(self, column_name, start, end):
+        # Sketch pro interval rozšířený na celé hodiny – celé dny z denních sketchů, okraje z hodinových
+        table = self.sketches_table
+        start = hour_start(start)
+        if end != hour_start(end):
+            end = hour_start(end) + timedelta(hours=1)
+        first_day = start if start == day_start(start) else day_start(start) + timedelta(days=1)
+        last_day = day_start(end)
+        if first_day < last_day:
+            buckets = or_(
+                and_(table.c.level == 'daily', table.c.bucket_start >= first_day, table.c.bucket_start < last_day),
+                and_(table.c.level == 'hourly', table.c.bucket_start >= start, table.c.bucket_start < first_day),
+                and_(table.c.level == 'hourly', table.c.bucket_start >= last_day, table.c.bucket_start < end),
+            )
+        else:
+            buckets = and_(table.c.level == 'hourly', table.c.bucket_start >= start, table.c.bucket_start < end)
+
+        sketch = QuantileSketch(self.max_bins)
+        with self.engine.connect() as conn:
+            stored_rows = conn.execute(
+                select(table.c.sketch).where(
+                    table.c.source_table == self.source_table_name,
+                    table.c.column_name == column_name,
+                    buckets
+                )
+            )
+            for stored in stored_rows:
+                sketch.merge(QuantileSketch.from_bytes(stored.sketch, self.max_bins))
+        return sketch, start, end
+
+    def stats(self):
+        with self.engine.connect() as conn:
+            last_id = conn.execute(
+                select(self.state_table.c.last_id).where(self.state_table.c.source_table == self.source_table_name)
+            ).scalar()
+            sketches = conn.execute(
+                select(func.count(), func.sum(func.length(self.sketches_table.c.sketch)))
+                .where(self.sketches_table.c.source_table == self.source_table_name)
+            ).one()
+        return {'last_id': last_id or 0, 'sketches': sketches[0], 'bytes': sketches[1] or 0}
+
+
+class SketchWorker(threading.Thread):
+    # Vlákno, které v pravidelném intervalu doplňuje sketche o nová měření
+    def __init__(self, sketch_engine, interval=60):
+        super().__init__(name='sketch-worker', daemon=True)
+        self.sketch_engine = sketch_engine
+        self.interval = interval
+        self.wake_event = threading.Event()
+
+    def wake(self):
+        self.wake_event.set()
+
+    def run(self):
+        while True:
+            try:
+                self.sketch_engine.run_until_current()
+            except Exception as e:
+                print(f"Výpočet sketchů selhal: {e}")
+            settle_wait = self.sketch_engine.horizon.wait_time()
+            self.wake_event.wait(self.interval if settle_wait is None else min(self.interval, settle_wait))
+            self.wake_event.clear()
+
+
+if __name__ == '__main__':
+    # Jednorázové dopočítání sketchů pro celou historii meteostanice
+    config = configparser.ConfigParser()
+    config.read(os.environ.get('WEATHER_API_CONFIG', '/var/www/html/config.cfg'))
+    sketch_engine = SketchEngine(
+        create_engine(config['DEFAULT']['SQLALCHEMY_DATABASE_URI']),
+        batch_size=config['DEFAULT'].getint('SKETCH_BATCH_SIZE', fallback=5000),
+        max_bins=config['DEFAULT'].getint('SKETCH_MAX_BINS', fallback=512),
+        settle_seconds=0
+    )
+    start = time.time()
+    processed = sketch_engine.run_until_current()
+    print(f"Zpracováno {processed} řádků za {time.time() - start:.2f} s")
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# Příkaz pro zobrazení plánu dotazu podle databáze
+EXPLAIN_PREFIXES = {
+    'mysql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+class SlowQueryLog(threading.Thread):
+    # Pomalé dotazy se zapisují do rotovaného logu (jeden JSON na řádek) ve vlastním vlákně,
+    # EXPLAIN se spouští jen jednou pro každý tvar dotazu
+    def __init__(self, engine, path, threshold_seconds, max_bytes=5 * 1024 * 1024, backup_count=3, queue_size=100):
+        super().__init__(name='slow-query-log', daemon=True)
+        self.engine = engine
+        self.threshold_seconds = threshold_seconds
+        self.explain_prefix = EXPLAIN_PREFIXES.get(engine.dialect.name)
+        self.explained = set()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.logger = logging.getLogger('weather_api.slow_queries')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.logger.addHandler(handler)
+
+    def record(self, statement, parameters, elapsed, route, executemany=False):
+        # Volá se z after_cursor_execute – jen vložení do fronty, požadavek se nezdržuje
+        # Dotazy EXPLAIN z vlákna logu se nezaznamenávají
+        if elapsed < self.threshold_seconds or threading.current_thread() is self:
+            return
+        try:
+            self.queue.put_nowait((datetime.now(), statement, parameters, elapsed, route, executemany))
+        except queue.Full:
+            self.dropped += 1
+
+    def explain(self, statement, parameters):
+        with self.engine.connect() as conn:
+            result = conn.exec_driver_sql(self.explain_prefix + statement, parameters)
+            return [dict(row._mapping) for row in result]
+
+    def write_entry(self, logged_at, statement, parameters, elapsed, route, executemany):
+        shape = hashlib.sha1(statement.encode()).hexdigest()[:16]
+        entry = {
+            'time': logged_at.isoformat(timespec='milliseconds'),
+            'route': route,
+            'duration_ms': round(elapsed * 1000, 1),
+            'shape': shape,
+            'statement': statement,
+            'parameters': parameters if not executemany else f'{len(parameters)} parameter sets',
+        }
+        # Plán dotazu jen u prvního výskytu tvaru, další záznamy na něj odkazují přes shape
+        if (shape not in self.explained and self.explain_prefix is not None and not executemany
+                and statement.lstrip().upper().startswith('SELECT')):
+            self.explained.add(shape)
+            try:
+                entry['explain'] = self.explain(statement, parameters)
+            except Exception as e:
+                entry['explain_error'] = str(e)
+        self.logger.info(json.dumps(entry, default=str, ensure_ascii=False))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self.write_entry(*item)
+            except Exception as e:
+                print(f"Zápis do logu pomalých dotazů selhal: {e}")
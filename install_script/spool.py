@@ -0,0 +1,224 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+# Hlavička záznamu: délka dat a CRC32 (big-endian)
+RECORD_HEADER = struct.Struct('>II')
+SEGMENT_PREFIX = 'spool-'
+SEGMENT_SUFFIX = '.log'
+# Segment s nečitelnými částmi – ponechá se k ruční kontrole, znovu se nepřehrává
+DAMAGED_SUFFIX = '.damaged'
+
+
+def encode_record(station_id, row):
+    payload = {
+        'station': station_id,
+        'row': {
+            key: value.isoformat() if isinstance(value, datetime) else None if value is None else str(value)
+            for key, value in row.items()
+        },
+    }
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    return RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def decode_record(data):
+    payload = json.loads(data)
+    row = {}
+    for key, value in payload['row'].items():
+        if value is None:
+            row[key] = None
+        elif key == 'time':
+            row[key] = datetime.fromisoformat(value)
+        else:
+            row[key] = Decimal(value)
+    return payload['station'], row
+
+
+def record_at(data, offset):
+    # Celý platný záznam začínající na offset: ((stanice, řádek), konec záznamu), jinak None
+    if offset + RECORD_HEADER.size > len(data):
+        return None
+    length, checksum = RECORD_HEADER.unpack_from(data, offset)
+    start = offset + RECORD_HEADER.size
+    if length == 0 or start + length > len(data):
+        return None
+    record = data[start:start + length]
+    if zlib.crc32(record) != checksum:
+        return None
+    try:
+        return decode_record(record), start + length
+    except (ValueError, KeyError, TypeError, AttributeError, ArithmeticError):
+        return None
+
+
+class WriteAheadSpool:
+    # Lokální spool měření pro dobu, kdy je databáze nedostupná nebo pomalá
+    def __init__(self, directory, segment_size=4 * 1024 * 1024, fsync_interval=1.0):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.file = None
+        self.last_fsync = 0.0
+        self.dirty = False
+        os.makedirs(directory, exist_ok=True)
+        # Nejstarší čas měření, které čeká na přehrání (i ze spoolu z předchozího běhu)
+        self.oldest_time = None
+        for name in self._segments():
+            for _, row in self.read_segment(os.path.join(directory, name))[0]:
+                if row.get('time') is not None and (self.oldest_time is None or row['time'] < self.oldest_time):
+                    self.oldest_time = row['time']
+
+    def _segments(self):
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _open_segment(self):
+        # Nový segment má pořadové číslo o jedna vyšší než poslední existující (i odložený jako poškozený)
+        sequences = [
+            int(name[len(SEGMENT_PREFIX):].split('.')[0]) for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX)
+        ]
+        sequence = max(sequences) + 1 if sequences else 1
+        path = os.path.join(self.directory, f'{SEGMENT_PREFIX}{sequence:012d}{SEGMENT_SUFFIX}')
+        self.file = open(path, 'ab')
+
+    def _close_segment(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+            self.dirty = False
+
+    def append(self, station_id, rows):
+        with self.lock:
+            if self.file is None:
+                self._open_segment()
+            for row in rows:
+                self.file.write(encode_record(station_id, row))
+                if row.get('time') is not None and (self.oldest_time is None or row['time'] < self.oldest_time):
+                    self.oldest_time = row['time']
+            self.file.flush()
+            self.dirty = True
+
+            # fsync dávkově, nejvýše jednou za fsync_interval
+            if time.monotonic() - self.last_fsync >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.last_fsync = time.monotonic()
+                self.dirty = False
+
+            if self.file.tell() >= self.segment_size:
+                self._close_segment()
+
+    def sync(self):
+        with self.lock:
+            if self.file is not None and self.dirty:
+                os.fsync(self.file.fileno())
+                self.last_fsync = time.monotonic()
+                self.dirty = False
+
+    def rotate(self):
+        # Uzavření rozepsaného segmentu, aby ho šlo přehrát
+        with self.lock:
+            self._close_segment()
+
+    def closed_segments(self):
+        with self.lock:
+            current = os.path.basename(self.file.name) if self.file is not None else None
+            return [os.path.join(self.directory, name) for name in self._segments() if name != current]
+
+    def read_segment(self, path):
+        # Vrací (záznamy, počet přeskočených bajtů). Za poškozeným nebo neúplným záznamem se hledá další,
+        # jehož hlavička i CRC sedí – chyba uprostřed segmentu nepřijde o záznamy za ní
+        with open(path, 'rb') as file:
+            data = file.read()
+        records = []
+        skipped = 0
+        damaged = False
+        offset = 0
+        while offset < len(data):
+            found = record_at(data, offset)
+            if found is None:
+                if not damaged:
+                    print(f"Spool: poškozený záznam v {path} na pozici {offset}, hledá se další platný záznam")
+                    damaged = True
+                skipped += 1
+                offset += 1
+                continue
+            record, offset = found
+            records.append(record)
+            damaged = False
+        return records, skipped
+
+    def _segment_removed(self):
+        if not self._segments():
+            self.oldest_time = None
+
+    def remove_segment(self, path):
+        with self.lock:
+            os.remove(path)
+            self._segment_removed()
+
+    def quarantine_segment(self, path):
+        with self.lock:
+            os.replace(path, path + DAMAGED_SUFFIX)
+            self._segment_removed()
+        print(f"Spool: segment {path} nebyl čitelný celý, ponechán jako {path + DAMAGED_SUFFIX}")
+
+    def oldest_reading_time(self):
+        with self.lock:
+            return self.oldest_time
+
+    def pending_segments(self):
+        return len(self._segments())
+
+
+class SpoolReplayer(threading.Thread):
+    # Po obnovení databáze přehraje spool dávkově do tabulek meteostanic
+    def __init__(self, spool, write_batch, interval=5.0, batch_size=1000):
+        super().__init__(name='spool-replayer', daemon=True)
+        self.spool = spool
+        self.write_batch = write_batch
+        self.interval = interval
+        self.batch_size = batch_size
+
+    def replay(self):
+        # Rozepsaný segment se uzavře, až jsou přehrané všechny starší
+        if not self.spool.closed_segments():
+            self.spool.rotate()
+        replayed = 0
+        for path in self.spool.closed_segments():
+            by_station = {}
+            records, skipped = self.spool.read_segment(path)
+            for station_id, row in records:
+                by_station.setdefault(station_id, []).append(row)
+            for station_id, rows in by_station.items():
+                for start in range(0, len(rows), self.batch_size):
+                    replayed += self.write_batch(station_id, rows[start:start + self.batch_size])
+            # Segment se smaže až po úspěšném zápisu všech záznamů a jen pokud byl přečtený celý
+            if skipped:
+                self.spool.quarantine_segment(path)
+            else:
+                self.spool.remove_segment(path)
+        return replayed
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.spool.sync()
+                if self.spool.pending_segments():
+                    replayed = self.replay()
+                    if replayed:
+                        print(f"Spool: přehráno {replayed} měření do databáze")
+            except Exception as e:
+                print(f"Spool: přehrání zatím není možné: {e}")
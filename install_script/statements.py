@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import and_, bindparam, select
+
+
+class InvalidColumnError(ValueError):
+    # Sloupec, který tabulka nemá – API vrací 400
+    def __init__(self, table_name, column_names):
+        super().__init__(f"Unknown columns: {', '.join(column_names)}")
+        self.table_name = table_name
+        self.column_names = column_names
+
+
+class StatementCache:
+    # Core select() pro každou kombinaci (tabulka, sloupce, tvar filtru) se sestaví jen jednou – hodnoty filtru
+    # jsou bindparam, takže opakovaný dotaz najde i zkompilované SQL v cache SQLAlchemy
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.statements = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def columns(self, table, column_names):
+        # Kontrola názvů podle metadat tabulky v paměti, bez dotazu do databáze
+        unknown_columns = [column_name for column_name in column_names if column_name not in table.columns]
+        if unknown_columns:
+            raise InvalidColumnError(table.name, unknown_columns)
+        return [table.columns[column_name] for column_name in column_names]
+
+    def select(self, table, column_names=None, ranges=(), equal=()):
+        # ranges: podmínka <sloupec>_start <= sloupec < <sloupec>_end, equal: sloupec = <sloupec>
+        # Klíčem je objekt tabulky – po nové reflexi (přidané sloupce) se sestaví nový dotaz
+        key = (table, None if column_names is None else tuple(column_names), tuple(ranges), tuple(equal))
+        with self.lock:
+            statement = self.statements.get(key)
+            if statement is not None:
+                self.statements.move_to_end(key)
+                self.hits += 1
+                return statement
+
+        columns = list(table.columns) if column_names is None else self.columns(table, column_names)
+        self.columns(table, list(ranges) + list(equal))
+        conditions = [
+            and_(table.columns[column_name] >= bindparam(column_name + '_start'),
+                 table.columns[column_name] < bindparam(column_name + '_end'))
+            for column_name in ranges
+        ]
+        conditions += [table.columns[column_name] == bindparam(column_name) for column_name in equal]
+        statement = select(*columns).where(*conditions)
+
+        with self.lock:
+            self.misses += 1
+            self.statements[key] = statement
+            while len(self.statements) > self.max_entries:
+                self.statements.popitem(last=False)
+                self.evictions += 1
+        return statement
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.statements),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,89 @@
+import re
+import threading
+import time
+
+from sqlalchemy import MetaData, Table, select
+from sqlalchemy.ext.automap import automap_base
+
+STATION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_]{1,48}$')
+STATION_TABLE_PREFIX = 'Weather_table_'
+
+
+class StationNotFound(LookupError):
+    pass
+
+
+class StationRegistry:
+    # Seznam meteostanic z tabulky Meteostations a jejich namapované třídy (Weather_table_<stanice>)
+    def __init__(self, engine, default_station_id, list_ttl=60.0, schema_metadata=None, missing_ttl=60.0):
+        self.engine = engine
+        self.schema_metadata = schema_metadata
+        self.default_station_id = default_station_id
+        self.list_ttl = list_ttl
+        self.lock = threading.Lock()
+        self.classes = {}
+        # Neexistující stanice -> čas zjištění, dotazy na ně nejdou do databáze po dobu missing_ttl sekund
+        self.missing_ttl = missing_ttl
+        self.missing = {}
+        self.station_ids = []
+        self.station_ids_loaded = 0.0
+        self.meteostations_table = None
+
+    def list_station_ids(self):
+        # Seznam stanic se načítá nejvýše jednou za list_ttl sekund
+        if time.monotonic() - self.station_ids_loaded > self.list_ttl:
+            with self.lock:
+                if self.meteostations_table is None:
+                    self.meteostations_table = Table('Meteostations', self.schema_metadata or MetaData(), autoload_with=self.engine)
+                with self.engine.connect() as conn:
+                    self.station_ids = [
+                        station_id for station_id in conn.execute(
+                            select(self.meteostations_table.c.meteostation_id).order_by(self.meteostations_table.c.id)
+                        ).scalars()
+                        if station_id and STATION_ID_PATTERN.match(station_id)
+                    ]
+                self.station_ids_loaded = time.monotonic()
+        return self.station_ids
+
+    def get(self, station_id=None):
+        station_id = station_id or self.default_station_id
+        table_class = self.classes.get(station_id)
+        if table_class is not None:
+            return table_class
+
+        if not STATION_ID_PATTERN.match(station_id):
+            raise StationNotFound(f"Invalid station {station_id}")
+        missing_since = self.missing.get(station_id)
+        if missing_since is not None and time.monotonic() - missing_since < self.missing_ttl:
+            raise StationNotFound(f"Station {station_id} not found")
+
+        with self.lock:
+            table_class = self.classes.get(station_id)
+            if table_class is not None:
+                return table_class
+
+            # Tabulka stanice se namapuje až při prvním použití – ze snímku schématu, jinak reflexí. Mapuje se do
+            # vlastních metadat a vlastní automap třídy, sdílený Base, ze kterého čtou ostatní vlákna, se nemění
+            table_name = STATION_TABLE_PREFIX + station_id
+            metadata = MetaData()
+            try:
+                if self.schema_metadata is not None and table_name in self.schema_metadata.tables:
+                    self.schema_metadata.tables[table_name].to_metadata(metadata)
+                else:
+                    Table(table_name, metadata, autoload_with=self.engine)
+                station_base = automap_base(metadata=metadata)
+                station_base.prepare()
+                table_class = station_base.classes[table_name]
+            except Exception:
+                self.missing[station_id] = time.monotonic()
+                raise StationNotFound(f"Station {station_id} not found")
+
+            self.missing.pop(station_id, None)
+            self.classes[station_id] = table_class
+            return table_class
+
+    def invalidate(self):
+        # Nová stanice (např. z /api/ingest) – seznam se načte znovu a neexistující stanice se zkusí znovu
+        self.station_ids_loaded = 0.0
+        with self.lock:
+            self.missing.clear()
@@ -1,5 +1,15 @@
 import unittest
-from API_server_3_10 import app
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Column, DateTime, Integer, MetaData, Numeric, Table, create_engine
+from sqlalchemy.pool import StaticPool
+
+import API_server_3_10
+from API_server_3_10 import app, date_range_filter, day_range, month_range, week_range, year_range
+from sketches import SketchEngine
 
 class TestFlaskAPI(unittest.TestCase):
 
@@ -24,6 +34,253 @@ class TestFlaskAPI(unittest.TestCase):
         response = self.app.get('/api/data/aggregated/today', headers=headers)
         self.assertEqual(response.status_code, 200)
 
+    # Testování cesty '/api/data/aggregated' - streamování NDJSON
+    def test_get_aggregated_data_ndjson(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/aggregated?format=ndjson', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+
+    # Testování cesty '/api/data/aggregated' - stránkování přes kurzor
+    def test_get_aggregated_data_paginated(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/aggregated?limit=10', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.json['data']), 10)
+        self.assertIn('next_cursor', response.json)
+
+    # Testování cesty '/api/data/aggregated' - stránka jako NDJSON se streamuje, kurzor je v hlavičce
+    def test_get_aggregated_data_paginated_ndjson(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        page = self.app.get('/api/data/aggregated?limit=10', headers=headers).json
+        response = self.app.get('/api/data/aggregated?limit=10&format=ndjson', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), len(page['data']))
+        self.assertEqual(response.headers.get('X-Next-Cursor'), page['next_cursor'])
+
+    # Testování cesty '/api/cache/stats' - opakovaný dotaz na uzavřený den se vrací z cache
+    def test_cache_stats(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        self.app.get('/api/data/meteostation/2024-01-15', headers=headers)
+        hits_before = self.app.get('/api/cache/stats', headers=headers).json['hits']
+        self.app.get('/api/data/meteostation/2024-01-15', headers=headers)
+        hits_after = self.app.get('/api/cache/stats', headers=headers).json['hits']
+        self.assertEqual(hits_after, hits_before + 1)
+
+    # Uzavřený den se smí cachovat natrvalo, dnešní data se pokaždé ověří
+    def test_cache_control(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/meteostation/2024-01-15', headers=headers)
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        response = self.app.get('/api/data/meteostation/today', headers=headers)
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+
+    # JSON provider aplikace (orjson, pokud je nainstalovaný) dává stejný výstup jako výchozí provider Flasku
+    def test_json_provider(self):
+        data = {'time': datetime(2024, 1, 15, 10, 30), 'day': date(2024, 1, 15), 'value': Decimal('1.50'), 'id': 2 ** 70, 'b': [None, 1.5]}
+        expected = DefaultJSONProvider(app).dumps(data, separators=(',', ':'))
+        self.assertEqual(app.json.dumps(data, separators=(',', ':')), expected)
+        with app.test_request_context():
+            self.assertEqual(app.json.response(data).get_data(as_text=True), expected + '\n')
+        self.assertEqual(app.json.loads(expected)['value'], '1.50')
+
+    # Testování cesty '/api/data/meteostation/today/max' a '/api/data/meteostation/today/avg'
+    def test_get_meteostation_today_extrema(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/meteostation/today/max', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('time', response.json)
+        response = self.app.get('/api/data/meteostation/today/avg', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+    # Testování cesty '/api/data/range' - agregace po hodinových intervalech
+    def test_get_range_data(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/range?from=2024-01-01&to=2024-01-08&bucket=1h&agg=avg,max', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.json), 7 * 24)
+        response = self.app.get('/api/data/range?from=2024-01-01&bucket=2h', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    # Testování cesty '/api/data/aggregated' - zředění série pro graf
+    def test_get_aggregated_data_downsampled(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/aggregated?max_points=100&columns=wind_gust_mph', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.json), 100)
+        # Bez columns se zřeďují všechny číselné sloupce, limit max_points platí pro celý výsledek
+        response = self.app.get('/api/data/aggregated?max_points=50', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.json), 50)
+        response = self.app.get('/api/data/aggregated?max_points=50&downsample=minmax', headers=headers)
+        self.assertLessEqual(len(response.json), 50)
+        # S columns se vrací jen sloupec s datem a vybrané sloupce
+        response = self.app.get('/api/data/aggregated?max_points=20&columns=wind_gust_mph', headers=headers)
+        self.assertEqual(set(response.json[0]), {'time', 'wind_gust_mph'})
+
+    # Testování cesty '/api/ingest' - příjem dat z GW1000
+    def test_ingest_reading(self):
+        # Bez nastaveného PASSKEY je příjem vypnutý
+        with patch.object(API_server_3_10, 'INGEST_PASSKEY', ''):
+            response = self.app.post('/api/ingest', data={'tempf': '55.3'})
+            self.assertEqual(response.status_code, 503)
+        with patch.object(API_server_3_10, 'INGEST_PASSKEY', 'tajne'):
+            response = self.app.post('/api/ingest', data={'PASSKEY': 'spatne', 'tempf': '55.3'})
+            self.assertEqual(response.status_code, 403)
+            response = self.app.post(
+                '/api/ingest', data={'PASSKEY': 'tajne', 'tempf': '55.3', 'humidity': '80', 'windgustmph': 'neplatne'}
+            )
+            self.assertEqual(response.status_code, 200)
+            response = self.app.post('/api/ingest?station=neplatna;stanice', data={'PASSKEY': 'tajne', 'tempf': '55.3'})
+            self.assertEqual(response.status_code, 400)
+            response = self.app.post('/api/ingest', data={'PASSKEY': 'tajne', 'dateutc': 'vcera'})
+            self.assertEqual(response.status_code, 400)
+
+    # Testování cesty '/api/data/stations/last_data' - poslední měření všech meteostanic
+    def test_get_all_stations_last_data(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/stations/last_data', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('meteostation1', response.json)
+        response = self.app.get('/api/data/last_data?station=neexistujici', headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+    # Testování cesty '/api/stream/live' - první událost je poslední měření
+    def test_live_stream(self):
+        response = self.app.get('/api/stream/live?jwt=' + self.token, buffered=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/event-stream'))
+        received = ''
+        for chunk in response.response:
+            received += chunk.decode() if isinstance(chunk, bytes) else chunk
+            if 'event: reading' in received:
+                break
+        response.close()
+        self.assertIn('data: {', received)
+
+    # Testování podmíněného GET - stejná data vrací 304 bez těla
+    def test_conditional_get(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/last_data', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers.get('ETag')
+        self.assertIsNotNone(etag)
+        response = self.app.get('/api/data/last_data', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+
+    # Testování parametru layout=columnar a komprese gzip
+    def test_columnar_layout(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/hourly/weekly/2024-01-15?layout=columnar', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('columns', response.json)
+        self.assertIn('data', response.json)
+        response = self.app.get('/api/data/hourly/weekly/2024-01-15?layout=columnar', headers={**headers, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept-Encoding', response.headers.get('Vary', ''))
+
+    # Testování cesty '/api/export' - export do CSV
+    def test_export_csv(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/export?table=hourly&from=2024-01-01&to=2024-01-08&format=csv', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertTrue(response.is_streamed)
+        self.assertIn('time', response.get_data(as_text=True).splitlines()[0])
+        response = self.app.get('/api/export?table=neexistujici&from=2024-01-01', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    # Testování cesty '/api/metrics' - metriky ve formátu Prometheus
+    def test_metrics(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        self.app.get('/api/data/last_data', headers=headers)
+        response = self.app.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('weather_api_requests_total{route="get_last_weather_data"', response.get_data(as_text=True))
+        # Z adresy mimo INTERNAL_ALLOWED_NETWORKS jsou metriky i spuštění testů zakázané
+        response = self.app.get('/api/metrics', environ_base={'REMOTE_ADDR': '203.0.113.5'})
+        self.assertEqual(response.status_code, 403)
+        response = self.app.get('/api/test/run_all_tests', headers=headers, environ_base={'REMOTE_ADDR': '203.0.113.5'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.app.get('/api/test/run_all_tests').status_code, 401)
+
+    # Testování bufferu posledních měření - poslední měření se vrací z paměti
+    def test_reading_ring(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        stats = self.app.get('/api/cache/stats', headers=headers).json
+        self.assertIn('reading_ring', stats)
+        response = self.app.get('/api/data/last_data', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.json['id'], stats['reading_ring']['last_id'])
+
+    # Testování archivu - staré datum se čte z archivu nebo z tabulky stejně
+    def test_archived_date(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/meteostation/2020-01-15', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.json, list)
+        response = self.app.get('/api/data/meteostation/max/2020-01-15', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('time', response.json)
+
+    # Testování cesty '/api/stats/quantiles'
+    def test_quantiles(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        # Sketche nad známými hodnotami 1.00 až 100.00 v samostatné databázi v paměti
+        engine = create_engine('sqlite://', poolclass=StaticPool)
+        metadata = MetaData()
+        table = Table(
+            'Weather_table_quantiles', metadata,
+            Column('id', Integer, primary_key=True), Column('time', DateTime), Column('outdoor_temperature_F', Numeric(5, 2))
+        )
+        metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(table.insert(), [
+                {'time': datetime(2001, 1, 1) + timedelta(minutes=10 * i), 'outdoor_temperature_F': Decimal(i + 1)}
+                for i in range(100)
+            ])
+        seeded_engine = SketchEngine(engine, 'Weather_table_quantiles', batch_size=30, settle_seconds=0)
+        seeded_engine.run_until_current()
+
+        with patch.object(API_server_3_10, 'sketch_engine', seeded_engine):
+            response = self.app.get('/api/stats/quantiles?column=outdoor_temperature_F&from=2001-01-01&to=2001-01-02&q=0,0.5,0.95,1&bins=4', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json['count'], 100)
+            self.assertEqual(response.json['resolution'], 0.01)
+            self.assertEqual((response.json['method'], response.json['max_error']), ('fixed-width histogram', 0.0))
+            self.assertEqual(response.json['quantiles'], {'0.0': 1.0, '0.5': 50.0, '0.95': 95.0, '1.0': 100.0})
+            self.assertEqual([item['count'] for item in response.json['histogram']], [25, 25, 25, 25])
+
+            # Dvě hodiny uprostřed dne – jen z hodinových sketchů
+            response = self.app.get('/api/stats/quantiles?column=outdoor_temperature_F&from=2001-01-01T10:00&to=2001-01-01T12:00&q=0,1', headers=headers)
+            self.assertEqual(response.json['count'], 12)
+            self.assertEqual(response.json['quantiles'], {'0.0': 61.0, '1.0': 72.0})
+
+            response = self.app.get('/api/stats/quantiles?column=outdoor_temperature_F&from=2001-01-01&q=2', headers=headers)
+            self.assertEqual(response.status_code, 400)
+
+    # Testování cesty '/api/batch'
+    def test_batch(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        requests = ['/api/data/last_data', {'id': 'max', 'path': '/api/data/meteostation/today/max'}, '/api/data/last_data']
+        response = self.app.post('/api/batch', json={'requests': requests}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json['responses']], ['/api/data/last_data', 'max', '/api/data/last_data'])
+        self.assertEqual(response.json['responses'][0], response.json['responses'][2])
+        response = self.app.post('/api/batch', json={'requests': ['/api/stream/live']}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    # Testování neplatných názvů sloupců
+    def test_invalid_columns(self):
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.app.get('/api/data/weekly/cols?columns=week_start,not_a_column', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], 'Unknown columns: not_a_column')
+        response = self.app.get('/api/data/daily_test?columns=week_start', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
     # Testování cesty '/api/login' - úspěšné přihlášení
     def test_login_success(self):
         response = self.app.post('/api/login', json={'username': 'honza', 'password': 'heslo'})
@@ -50,5 +307,25 @@ class TestFlaskAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['valid_token'], 1)
         
+class TestDateRanges(unittest.TestCase):
+
+    # Intervaly jsou polootevřené [začátek, konec) a sousední na sebe navazují
+    def test_ranges(self):
+        wednesday = date(2024, 2, 28)
+        self.assertEqual(day_range(wednesday), (datetime(2024, 2, 28), datetime(2024, 2, 29)))
+        self.assertEqual(week_range(wednesday), (datetime(2024, 2, 26), datetime(2024, 3, 4)))
+        self.assertEqual(week_range(date(2024, 3, 4))[0], week_range(wednesday)[1])
+        self.assertEqual(month_range(wednesday), (datetime(2024, 2, 1), datetime(2024, 3, 1)))
+        self.assertEqual(month_range(date(2023, 12, 31)), (datetime(2023, 12, 1), datetime(2024, 1, 1)))
+        self.assertEqual(year_range(wednesday), (datetime(2024, 1, 1), datetime(2025, 1, 1)))
+
+    # Podmínka porovnává samotný sloupec (bez DATE()), aby ji databáze vyhodnotila přes index
+    def test_range_filter(self):
+        condition = date_range_filter(Column('time', DateTime), *day_range(date(2024, 2, 28)))
+        self.assertEqual(str(condition), 'time >= :time_1 AND time < :time_2')
+        self.assertEqual(
+            [clause.right.value for clause in condition.clauses], [datetime(2024, 2, 28), datetime(2024, 2, 29)]
+        )
+
 if __name__ == '__main__':
     unittest.main()
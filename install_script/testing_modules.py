@@ -0,0 +1,694 @@
+import io
+import math
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Numeric, String, Table, create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from archive import ArchiveEngine, processed_id
+from downsampling import downsample_rows, lttb_indices, minmax_indices
+from export import arrow_available, generate_export
+from ingest import ValueOutOfRange, insert_missing_readings, parse_reading
+from response_cache import ResponseCache
+from ring_buffer import ReadingRing, RingFeeder
+from rollup import CommitHorizon, RollupEngine
+from running_stats import RunningStats
+from schema_snapshot import load_schema_metadata, schema_fingerprint
+from sketches import QuantileSketch
+from spool import SpoolReplayer, WriteAheadSpool, encode_record
+from statements import InvalidColumnError, StatementCache
+from stations import STATION_TABLE_PREFIX, StationNotFound, StationRegistry
+
+# Testy samostatných modulů bez databáze a bez Flask aplikace
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    # Záznam s watermarkem platí jen pro stejný watermark
+    def test_watermark(self):
+        cache = ResponseCache()
+        cache.set('/a', 'value', watermark=5)
+        self.assertEqual(cache.get('/a', 5), 'value')
+        self.assertIsNone(cache.get('/a', 6))
+        self.assertIsNone(cache.get('/a', 5))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    # Nejdéle nepoužitý záznam se zahodí jako první
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set('/a', 1)
+        cache.set('/b', 2)
+        cache.get('/a')
+        cache.set('/c', 3)
+        self.assertIsNone(cache.get('/b'))
+        self.assertEqual(cache.get('/a'), 1)
+        self.assertEqual(cache.get('/c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    # Odpověď vypočtená před zneplatněním se neuloží
+    def test_generation(self):
+        cache = ResponseCache()
+        generation = cache.generation
+        cache.invalidate_period(datetime(2024, 1, 1))
+        cache.set('/a', 'value', generation=generation)
+        self.assertIsNone(cache.get('/a'))
+        cache.set('/a', 'value', generation=cache.generation)
+        self.assertEqual(cache.get('/a'), 'value')
+
+    # Uzavřená období se načtou z disku i po restartu
+    def test_disk_roundtrip(self):
+        value = (b'{"a":1}\n', 'application/json', {'X-Query-Count': '1'})
+        ResponseCache(cache_dir=self.cache_dir).set('/a', value, period_end=datetime(2024, 1, 2))
+        self.assertEqual(ResponseCache(cache_dir=self.cache_dir).get('/a'), value)
+        # Aktuální období (s watermarkem) se na disk neukládá
+        ResponseCache(cache_dir=self.cache_dir).set('/b', value, watermark=1)
+        self.assertIsNone(ResponseCache(cache_dir=self.cache_dir).get('/b'))
+
+    # Tělo, které neodpovídá otisku v JSON, se nepoužije
+    def test_disk_corrupted_body(self):
+        value = (b'{"a":1}\n', 'application/json', {})
+        ResponseCache(cache_dir=self.cache_dir).set('/a', value, period_end=datetime(2024, 1, 2))
+        body_path = next(
+            os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.body')
+        )
+        with open(body_path, 'wb') as file:
+            file.write(b'{"a":2}\n')
+        self.assertIsNone(ResponseCache(cache_dir=self.cache_dir).get('/a'))
+
+    # Zpožděná měření zahodí jen období končící po jejich čase, cizí soubory ve složce zůstanou
+    def test_invalidate_period(self):
+        with open(os.path.join(self.cache_dir, 'schema.json'), 'w') as file:
+            file.write('{}')
+        cache = ResponseCache(cache_dir=self.cache_dir)
+        cache.set('/old', (b'old', 'application/json', {}), period_end=datetime(2024, 1, 2))
+        cache.set('/new', (b'new', 'application/json', {}), period_end=datetime(2024, 2, 2))
+        cache.invalidate_period(datetime(2024, 1, 15))
+        self.assertIsNotNone(cache.get('/old'))
+        self.assertIsNone(cache.get('/new'))
+
+        restarted = ResponseCache(cache_dir=self.cache_dir)
+        self.assertEqual(restarted.get('/old'), (b'old', 'application/json', {}))
+        self.assertIsNone(restarted.get('/new'))
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, 'schema.json')))
+
+
+class TestRunningStats(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = RunningStats(['id', 'time', 'temperature'], ['temperature'])
+        self.stats.seed(
+            datetime(2024, 1, 1).date(), 10,
+            {'time': datetime(2024, 1, 1, 0, 5), 'temperature': Decimal('1.50')},
+            {'time': datetime(2024, 1, 1, 9, 0), 'temperature': Decimal('4.50')},
+            {'temperature': Decimal('6.00')}, {'temperature': 2}
+        )
+
+    # Nové řádky upraví minimum, maximum i průměr, NULL se nezapočítá
+    def test_update(self):
+        self.stats.update({'id': 11, 'time': datetime(2024, 1, 1, 10, 0), 'temperature': Decimal('-0.50')})
+        self.stats.update({'id': 12, 'time': datetime(2024, 1, 1, 10, 5), 'temperature': None})
+        self.assertEqual(self.stats.minimums()['temperature'], Decimal('-0.50'))
+        self.assertEqual(self.stats.maximums()['temperature'], Decimal('4.50'))
+        self.assertEqual(self.stats.maximums()['time'], datetime(2024, 1, 1, 10, 5))
+        self.assertEqual(self.stats.averages(), {'temperature': Decimal('1.83')})
+
+    # Řádek, který už je v počátečním stavu (id <= last_id), se nezapočítá podruhé
+    def test_already_counted(self):
+        self.stats.update({'id': 10, 'time': datetime(2024, 1, 1, 10, 0), 'temperature': Decimal('100')})
+        self.assertEqual(self.stats.maximums()['temperature'], Decimal('4.50'))
+        self.assertEqual(self.stats.averages(), {'temperature': Decimal('3.00')})
+
+    # Řádky nad potvrzeným id se jen přičtou k výsledku – pozdě potvrzený řádek s nižším id se pak nepřeskočí
+    def test_advance(self):
+        self.stats.advance([{'id': 12, 'time': datetime(2024, 1, 1, 10, 5), 'temperature': Decimal('8.00')}], 10)
+        self.assertEqual(self.stats.maximums()['temperature'], Decimal('8.00'))
+        self.assertEqual(self.stats.last_id, 10)
+        self.stats.advance([
+            {'id': 11, 'time': datetime(2024, 1, 1, 10, 0), 'temperature': Decimal('-1.00')},
+            {'id': 12, 'time': datetime(2024, 1, 1, 10, 5), 'temperature': Decimal('8.00')},
+        ], 12)
+        self.assertEqual(self.stats.minimums()['temperature'], Decimal('-1.00'))
+        self.assertEqual(self.stats.averages(), {'temperature': Decimal('3.25')})
+        self.assertEqual(self.stats.last_id, 12)
+        self.assertEqual(self.stats.tail, [])
+
+    # Bez hodnot je průměr None
+    def test_empty(self):
+        stats = RunningStats(['id', 'temperature'], ['temperature'])
+        self.assertEqual(stats.averages(), {'temperature': None})
+        self.assertEqual(stats.minimums(), {'id': None, 'temperature': None})
+
+
+class TestDownsampling(unittest.TestCase):
+
+    def setUp(self):
+        self.xs = list(range(1000))
+        self.ys = [(x % 50) / 10 for x in self.xs]
+        self.ys[500] = 1000.0
+
+    # LTTB vrátí přesně threshold bodů včetně prvního, posledního a výrazné špičky
+    def test_lttb(self):
+        indices = lttb_indices(self.xs, self.ys, 100)
+        self.assertEqual(len(indices), 100)
+        self.assertEqual(indices, sorted(indices))
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertIn(500, indices)
+        self.assertEqual(lttb_indices(self.xs[:10], self.ys[:10], 100), list(range(10)))
+
+    # Min/max ponechá minimum i maximum každého intervalu
+    def test_minmax(self):
+        indices = minmax_indices(self.xs, self.ys, 100)
+        self.assertLessEqual(len(indices), 100)
+        self.assertIn(500, indices)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+
+    # Víc sérií se vejde do max_points, pořadí řádků zůstane a NULL hodnoty se přeskočí
+    def test_downsample_rows(self):
+        rows = [{'x': x} for x in self.xs]
+        series = [self.ys, [None if x % 3 else float(-x) for x in self.xs], [float(x % 7) for x in self.xs]]
+        for method in ('lttb', 'minmax'):
+            for max_points in (3, 10, 50, 200):
+                selected = downsample_rows(rows, self.xs, series, max_points, method)
+                self.assertLessEqual(len(selected), max_points)
+                self.assertEqual(selected, sorted(selected, key=lambda row: row['x']))
+                self.assertEqual((selected[0]['x'], selected[-1]['x']), (0, 999))
+        self.assertEqual(len(downsample_rows(rows[:20], self.xs[:20], [self.ys[:20]], 50)), 20)
+
+    # Špička každé série zůstane, i když se do max_points nevejde plný díl pro všechny série
+    def test_downsample_peaks(self):
+        rows = list(range(1000))
+        series = []
+        for peak in range(100, 900, 100):
+            y_values = [float(x % 7) for x in self.xs]
+            y_values[peak + 13] = 500.0
+            series.append(y_values)
+        for method in ('lttb', 'minmax'):
+            for max_points in (30, 50):
+                selected = downsample_rows(rows, self.xs, series, max_points, method)
+                self.assertLessEqual(len(selected), max_points)
+                for peak in range(100, 900, 100):
+                    self.assertIn(peak + 13, selected)
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spool = WriteAheadSpool(self.directory)
+        self.rows = [{'time': datetime(2024, 1, 1, 0, minute), 'temperature': Decimal(minute)} for minute in range(10)]
+        self.spool.append('meteostation1', self.rows)
+        self.spool.rotate()
+        self.path = self.spool.closed_segments()[0]
+        self.record_size = len(encode_record('meteostation1', self.rows[0]))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def damage(self, change):
+        with open(self.path, 'rb') as file:
+            data = bytearray(file.read())
+        data = change(data)
+        with open(self.path, 'wb') as file:
+            file.write(data)
+
+    def replay(self):
+        written = []
+        SpoolReplayer(self.spool, lambda station_id, rows: written.extend(rows) or len(rows)).replay()
+        return written
+
+    # Nepoškozený segment se přečte celý a po přehrání smaže
+    def test_roundtrip(self):
+        records, skipped = self.spool.read_segment(self.path)
+        self.assertEqual(skipped, 0)
+        self.assertEqual(records, [('meteostation1', row) for row in self.rows])
+        self.assertEqual(self.spool.oldest_reading_time(), datetime(2024, 1, 1))
+        self.assertEqual(self.replay(), self.rows)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertIsNone(self.spool.oldest_reading_time())
+
+    # Poškozený záznam uprostřed – záznamy za ním se najdou podle další platné hlavičky
+    def test_corrupted_record(self):
+        def flip_byte(data):
+            data[self.record_size * 3 + 20] ^= 0xff
+            return data
+        self.damage(flip_byte)
+        records, skipped = self.spool.read_segment(self.path)
+        self.assertEqual([row for _, row in records], self.rows[:3] + self.rows[4:])
+        self.assertEqual(skipped, self.record_size)
+
+    # Useknutý poslední záznam (pád při zápisu) – přehraje se zbytek, segment se odloží
+    def test_truncated_segment(self):
+        self.damage(lambda data: data[:-5])
+        self.assertEqual(self.replay(), self.rows[:-1])
+        self.assertEqual(os.listdir(self.directory), [os.path.basename(self.path) + '.damaged'])
+
+        # Nový segment nepřepíše odložený
+        self.spool.append('meteostation1', self.rows[:1])
+        self.spool.rotate()
+        self.assertEqual(len(self.spool.closed_segments()), 1)
+        self.assertNotEqual(self.spool.closed_segments()[0], self.path)
+        self.assertEqual(self.replay(), self.rows[:1])
+
+    # Segment se nesmaže, když zápis do databáze selže
+    def test_failed_replay_keeps_segment(self):
+        def failing_write(station_id, rows):
+            raise ConnectionError('database is down')
+        with self.assertRaises(ConnectionError):
+            SpoolReplayer(self.spool, failing_write).replay()
+        self.assertEqual(self.spool.closed_segments(), [self.path])
+
+
+class TestStationRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool)
+        metadata = MetaData()
+        meteostations = Table(
+            'Meteostations', metadata,
+            Column('id', Integer, primary_key=True), Column('meteostation_id', String(50))
+        )
+        for station_id in ('meteostation1', 'garden'):
+            Table(STATION_TABLE_PREFIX + station_id, metadata, Column('id', Integer, primary_key=True), Column('time', DateTime))
+        metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(meteostations.insert(), [
+                {'meteostation_id': 'meteostation1'}, {'meteostation_id': 'garden'}, {'meteostation_id': 'bad id; --'}
+            ])
+        self.registry = StationRegistry(self.engine, 'meteostation1')
+
+    # Id, které nemůže být součástí názvu tabulky, se ze seznamu vynechá
+    def test_list_station_ids(self):
+        self.assertEqual(self.registry.list_station_ids(), ['meteostation1', 'garden'])
+
+    # Tabulka se namapuje při prvním použití, další volání vrátí stejnou třídu
+    def test_get(self):
+        table_class = self.registry.get()
+        self.assertEqual(table_class.__table__.name, 'Weather_table_meteostation1')
+        self.assertIs(self.registry.get('meteostation1'), table_class)
+        self.assertEqual(self.registry.get('garden').__table__.name, 'Weather_table_garden')
+
+    # Neplatné id se do databáze vůbec nedostane, chybějící tabulka je StationNotFound
+    def test_not_found(self):
+        with self.assertRaises(StationNotFound):
+            self.registry.get('bad id; --')
+        with self.assertRaises(StationNotFound):
+            self.registry.get('missing')
+        self.assertEqual(self.registry.get('garden').__table__.name, 'Weather_table_garden')
+
+    # Chybějící stanice se po dobu missing_ttl v databázi znovu nehledá, invalidate ji zkusí znovu
+    def test_missing_cached(self):
+        with self.assertRaises(StationNotFound):
+            self.registry.get('orchard')
+        Table(STATION_TABLE_PREFIX + 'orchard', MetaData(), Column('id', Integer, primary_key=True)).create(self.engine)
+        # Tabulka už existuje, ale registr si pamatuje, že chybí
+        with self.assertRaises(StationNotFound):
+            self.registry.get('orchard')
+        self.registry.invalidate()
+        self.assertEqual(self.registry.get('orchard').__table__.name, 'Weather_table_orchard')
+
+    # Každá stanice má vlastní metadata, sdílená metadata ostatních tabulek se nemění
+    def test_separate_metadata(self):
+        self.assertIsNot(self.registry.get('garden').__table__.metadata, self.registry.get().__table__.metadata)
+        self.assertEqual(list(self.registry.get('garden').__table__.metadata.tables), ['Weather_table_garden'])
+
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool)
+        metadata = MetaData()
+        self.table = Table(
+            'Weather_table_test', metadata,
+            Column('id', Integer, primary_key=True), Column('time', DateTime),
+            Column('outdoor_temperature_F', Numeric(5, 2)), Column('solar_radiation_Wm2', Numeric(6, 2))
+        )
+        metadata.create_all(self.engine)
+
+    # Rozsah hodnoty podle přesnosti sloupce, čas měření z dateutc (UTC) se převede na místní čas
+    def test_parse_reading(self):
+        row = parse_reading({'tempf': '55.333', 'solarradiation': '1203.5', 'dateutc': '2024-01-15 10:00:00'}, self.table)
+        self.assertEqual(row['outdoor_temperature_F'], Decimal('55.33'))
+        self.assertEqual(row['solar_radiation_Wm2'], Decimal('1203.50'))
+        self.assertEqual(row['time'], datetime(2024, 1, 15, 10, tzinfo=timezone.utc).astimezone().replace(tzinfo=None))
+        self.assertIsNone(parse_reading({'tempf': 'neplatne'}, self.table)['outdoor_temperature_F'])
+        with self.assertRaises(ValueOutOfRange):
+            parse_reading({'tempf': '999.996'}, self.table)
+        with self.assertRaises(ValueError):
+            parse_reading({'dateutc': '15.1.2024'}, self.table)
+
+    # Duplicita je jen měření se stejným časem i hodnotami, jiné měření ve stejné sekundě se vloží
+    def test_insert_missing_readings(self):
+        rows = [
+            {'time': datetime(2024, 1, 15, 10), 'outdoor_temperature_F': Decimal('55.30'), 'solar_radiation_Wm2': None},
+            {'time': datetime(2024, 1, 15, 10), 'outdoor_temperature_F': Decimal('56.10'), 'solar_radiation_Wm2': None},
+        ]
+        with self.engine.begin() as conn:
+            self.assertEqual(len(insert_missing_readings(conn, self.table, rows[:1])), 1)
+            self.assertEqual(insert_missing_readings(conn, self.table, rows + rows), rows[1:])
+            self.assertEqual(len(conn.execute(self.table.select()).all()), 2)
+
+class TestSchemaSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'schema')
+        self.engine = create_engine('sqlite://', poolclass=StaticPool)
+        self.table = Table(
+            'Weather_table_test', MetaData(),
+            Column('id', Integer, primary_key=True), Column('time', DateTime), Column('temperature', Numeric(5, 2))
+        )
+        self.table.create(self.engine)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def add_column(self):
+        with self.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE Weather_table_test ADD COLUMN pressure NUMERIC(5, 2)'))
+
+    # Otisk se změní s novým indexem i sloupcem, jinak zůstává stejný
+    def test_fingerprint(self):
+        fingerprint = schema_fingerprint(self.engine)
+        self.assertEqual(schema_fingerprint(self.engine), fingerprint)
+        Index('ix_Weather_table_test_time', self.table.c.time).create(self.engine)
+        indexed = schema_fingerprint(self.engine)
+        self.assertNotEqual(indexed, fingerprint)
+        self.add_column()
+        self.assertNotIn(schema_fingerprint(self.engine), (fingerprint, indexed))
+
+    # Další start použije snímek bez reflexe, po změně schématu se reflektuje znovu
+    def test_snapshot_reuse(self):
+        load_schema_metadata(self.engine, self.path)
+        self.assertTrue(os.path.exists(self.path))
+        with patch.object(MetaData, 'reflect', side_effect=AssertionError('schema reflected')):
+            metadata = load_schema_metadata(self.engine, self.path)
+        table = metadata.tables['Weather_table_test']
+        self.assertEqual(list(table.columns.keys()), ['id', 'time', 'temperature'])
+        self.assertEqual((table.c.temperature.type.precision, table.c.temperature.type.scale), (5, 2))
+
+        self.add_column()
+        self.assertIn('pressure', load_schema_metadata(self.engine, self.path).tables['Weather_table_test'].columns)
+
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.engine = create_engine('sqlite://', poolclass=StaticPool)
+        metadata = MetaData()
+        self.table = Table(
+            'Weather_table_test', metadata,
+            Column('id', Integer, primary_key=True), Column('time', DateTime), Column('temp', Numeric(5, 2))
+        )
+        self.state_table = Table(
+            'rollup_state', metadata, Column('source_table', String(64), primary_key=True), Column('last_id', Integer)
+        )
+        metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(self.table.insert(), [
+                {'time': datetime(2020, 1, 1) + timedelta(hours=hour), 'temp': Decimal(hour % 50)} for hour in range(24 * 40)
+            ])
+            conn.execute(self.state_table.insert(), [{'source_table': 'Weather_table_test', 'last_id': 500}])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Archivují se po dávkách jen řádky zpracované rollupem, zbytek měsíce zůstane v tabulce
+    def test_archivable_id(self):
+        archive_engine = ArchiveEngine(
+            self.engine, self.directory, after_days=0, batch_size=64,
+            archivable_id=lambda table_name: processed_id(self.engine, table_name, ['rollup_state', 'sketch_state'])
+        )
+        # Bez tabulky sketch_state se nearchivuje nic
+        self.assertEqual(archive_engine.run_once(['Weather_table_test']), 0)
+        archive_engine.archivable_id = lambda table_name: processed_id(self.engine, table_name, ['rollup_state'])
+        self.assertEqual(archive_engine.run_once(['Weather_table_test']), 500)
+        store = archive_engine.store('Weather_table_test')
+        self.assertIsNone(store.archived_before())
+        rows = store.rows_between(datetime(2020, 1, 1), datetime(2020, 2, 1), ['id', 'temp'])
+        self.assertEqual([row['id'] for row in rows], list(range(1, 501)))
+        self.assertEqual(rows[49]['temp'], Decimal('49.00'))
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text('SELECT COUNT(*) FROM Weather_table_test')).scalar(), 24 * 40 - 500)
+
+    # Index se čte ze souboru jen po změně
+    def test_index_cached(self):
+        archive_engine = ArchiveEngine(self.engine, self.directory, after_days=0)
+        archive_engine.run_once(['Weather_table_test'])
+        store = archive_engine.store('Weather_table_test')
+        self.assertTrue(store.overlaps(datetime(2020, 1, 5), datetime(2020, 1, 6)))
+        with patch('archive.json.load', side_effect=AssertionError):
+            self.assertTrue(store.overlaps(datetime(2020, 2, 5), datetime(2020, 2, 6)))
+            self.assertFalse(store.overlaps(datetime(2020, 3, 5), datetime(2020, 3, 6)))
+            self.assertEqual(store.archived_before(), datetime(2020, 3, 1))
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.columns = [Column('time', DateTime), Column('id', Integer), Column('temperature', Numeric(5, 2))]
+        self.batches = [
+            [(datetime(2024, 1, 1, 0, 0), 1, Decimal('-1.25')), (datetime(2024, 1, 1, 0, 5), 2, None)],
+            [],
+            [(datetime(2024, 1, 1, 0, 10), 3, Decimal('20.00'))],
+        ]
+
+    # CSV s hlavičkou, prázdná hodnota pro NULL
+    def test_csv(self):
+        data = ''.join(generate_export(self.columns, iter(self.batches), 'csv'))
+        self.assertEqual(data.splitlines(), [
+            'time,id,temperature',
+            '2024-01-01 00:00:00,1,-1.25',
+            '2024-01-01 00:05:00,2,',
+            '2024-01-01 00:10:00,3,20.00',
+        ])
+
+    # Arrow i Parquet zachovají typy sloupců a všechny řádky
+    @unittest.skipUnless(arrow_available(), 'pyarrow is not installed')
+    def test_arrow_and_parquet(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrow_data = b''.join(generate_export(self.columns, iter(self.batches), 'arrow'))
+        table = pa.ipc.open_stream(arrow_data).read_all()
+        self.assertEqual(table.column('temperature').to_pylist(), [Decimal('-1.25'), None, Decimal('20.00')])
+        self.assertEqual(str(table.schema.field('temperature').type), 'decimal128(5, 2)')
+
+        parquet_data = b''.join(generate_export(self.columns, iter(self.batches), 'parquet'))
+        table = pq.read_table(io.BytesIO(parquet_data))
+        self.assertEqual(table.column('id').to_pylist(), [1, 2, 3])
+        self.assertEqual(table.column('time').to_pylist()[2], datetime(2024, 1, 1, 0, 10))
+
+
+class TestReadingRing(unittest.TestCase):
+
+    def setUp(self):
+        self.table = Table(
+            'Weather_table_test', MetaData(),
+            Column('id', Integer, primary_key=True), Column('time', DateTime), Column('temperature', Numeric(5, 2))
+        )
+        self.start = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+        self.ring = ReadingRing(self.table, capacity=5, window_hours=24)
+        self.ring.load([], self.start, 0, None)
+
+    def row(self, row_id, temperature=Decimal('1.50')):
+        return {'id': row_id, 'time': self.start + timedelta(minutes=row_id), 'temperature': temperature}
+
+    def ids(self):
+        return [row['id'] for row in self.ring.rows_between(self.ring.covered_from, self.start + timedelta(days=1))]
+
+    # Hodnoty se vrátí ve stejném typu jako z databáze
+    def test_roundtrip(self):
+        self.ring.extend([self.row(1, Decimal('-12.34')), self.row(2, None)])
+        self.assertEqual(self.ring.rows_between(self.start, self.start + timedelta(days=1)), [
+            self.row(1, Decimal('-12.34')), self.row(2, None)
+        ])
+        self.assertEqual(self.ring.last_row()['id'], 2)
+        self.assertIsNone(self.ring.rows_between(self.start - timedelta(hours=1), self.start))
+
+    # Plný buffer přepíše nejstarší řádek a posune začátek pokrytí
+    def test_capacity(self):
+        self.ring.extend([self.row(row_id) for row_id in range(1, 8)])
+        self.assertEqual(self.ids(), [3, 4, 5, 6, 7])
+        self.assertEqual(self.ring.covered_from, self.start + timedelta(minutes=3))
+
+    # Pozdě potvrzený řádek s nižším id se zařadí podle id, duplicitní řádek se ignoruje
+    def test_late_row(self):
+        self.ring.extend([self.row(1), self.row(2), self.row(4), self.row(5)])
+        self.ring.extend([self.row(3), self.row(4)])
+        self.assertEqual(self.ids(), [1, 2, 3, 4, 5])
+        self.ring.extend([self.row(6), self.row(0)])
+        self.assertEqual(self.ids(), [2, 3, 4, 5, 6])
+        self.assertEqual(self.ring.ids_after(3), {4, 5, 6})
+
+    # Feeder čte znovu id nad horizontem potvrzených zápisů a doplní řádek potvrzený později
+    def test_feeder_late_commit(self):
+        visible = [self.row(1), self.row(3)]
+
+        def fetch_rows(after_id, limit):
+            return [row for row in sorted(visible, key=lambda row: row['id']) if row['id'] > after_id][:limit]
+
+        feeder = RingFeeder(self.ring, fetch_rows, settle_seconds=3600)
+        feeder.poll()
+        self.assertEqual(self.ids(), [1, 3])
+        visible.append(self.row(2))
+        feeder.poll()
+        self.assertEqual(self.ids(), [1, 2, 3])
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def setUp(self):
+        generator = random.Random(42)
+        self.values = [int(generator.gauss(1500, 800)) for _ in range(20000)]
+
+    def exact_quantile(self, values, q):
+        ordered = sorted(values)
+        return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+    def sketch(self, values, max_bins=64):
+        sketch = QuantileSketch(max_bins)
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    # Bez zhuštění intervalů jsou kvantily přesné
+    def test_exact(self):
+        sketch = self.sketch(range(1, 101), max_bins=512)
+        self.assertEqual([sketch.quantile(q) for q in (0, 0.01, 0.5, 0.95, 1)], [1, 1, 50, 95, 100])
+        self.assertEqual(sketch.width, 1)
+
+    # Po zhuštění je chyba kvantilu nejvýše max_error (polovina šířky intervalu)
+    def test_error_bound(self):
+        sketch = self.sketch(self.values)
+        self.assertLessEqual(len(sketch.counts), 64)
+        self.assertEqual(sketch.count, len(self.values))
+        self.assertEqual((sketch.quantile(0), sketch.quantile(1)), (min(self.values), max(self.values)))
+        self.assertEqual(sketch.max_error(), (sketch.width - 1) / 2)
+        for q in (0.001, 0.05, 0.25, 0.5, 0.75, 0.95, 0.999):
+            self.assertLessEqual(abs(sketch.quantile(q) - self.exact_quantile(self.values, q)), sketch.max_error())
+
+    # Sloučení po částech dá stejný sketch jako jeden průchod všemi hodnotami
+    def test_merge(self):
+        merged = QuantileSketch(64)
+        for start in range(0, len(self.values), 1000):
+            merged.merge(self.sketch(self.values[start:start + 1000]))
+        single = self.sketch(self.values)
+        merged._coarsen(single.width)
+        single._coarsen(merged.width)
+        self.assertEqual(merged.counts, single.counts)
+        self.assertEqual((merged.count, merged.min_value, merged.max_value), (single.count, single.min_value, single.max_value))
+        merged.merge(QuantileSketch(64))
+        self.assertEqual(merged.count, len(self.values))
+
+    # Uložení a načtení zachová celý sketch, histogram obsahuje všechny hodnoty
+    def test_bytes_and_histogram(self):
+        sketch = self.sketch(self.values)
+        restored = QuantileSketch.from_bytes(sketch.to_bytes(), 64)
+        self.assertEqual(
+            (restored.width, restored.counts, restored.count, restored.min_value, restored.max_value),
+            (sketch.width, sketch.counts, sketch.count, sketch.min_value, sketch.max_value)
+        )
+        self.assertEqual(sum(count for _, _, count in sketch.histogram(10)), len(self.values))
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+        self.assertEqual(QuantileSketch.from_bytes(QuantileSketch().to_bytes()).count, 0)
+
+
+class TestStatementCache(unittest.TestCase):
+
+    def setUp(self):
+        self.table = Table(
+            'Weather_table_test', MetaData(),
+            Column('id', Integer, primary_key=True), Column('time', DateTime), Column('temperature', Numeric(5, 2))
+        )
+        self.cache = StatementCache(max_entries=2)
+
+    # Stejná kombinace sloupců a filtru vrátí stejný dotaz, hodnoty filtru jsou bindparam
+    def test_reuse(self):
+        statement = self.cache.select(self.table, ['time', 'temperature'], ranges=('time',))
+        self.assertIs(self.cache.select(self.table, ['time', 'temperature'], ranges=('time',)), statement)
+        self.assertEqual([column.name for column in statement.selected_columns], ['time', 'temperature'])
+        self.assertEqual(set(statement.compile().params), {'time_start', 'time_end'})
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    # Neznámý sloupec ve výběru i ve filtru
+    def test_invalid_columns(self):
+        with self.assertRaises(InvalidColumnError) as context:
+            self.cache.select(self.table, ['time', 'pressure', 'wind'])
+        self.assertEqual(str(context.exception), 'Unknown columns: pressure, wind')
+        self.assertEqual(context.exception.column_names, ['pressure', 'wind'])
+        with self.assertRaises(InvalidColumnError):
+            self.cache.select(self.table, equal=('station',))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    # Nejvýše max_entries dotazů, nejstarší se zahodí
+    def test_eviction(self):
+        self.cache.select(self.table)
+        self.cache.select(self.table, ['id'])
+        self.cache.select(self.table, ['time'])
+        self.assertEqual(self.cache.stats()['entries'], 2)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+class TestCommitHorizon(unittest.TestCase):
+
+    # Id je bezpečné až settle_seconds po tom, co bylo poprvé vidět
+    def test_settle(self):
+        horizon = CommitHorizon(settle_seconds=3600, settled_id=10)
+        self.assertEqual(horizon.observe(15), 10)
+        self.assertEqual(horizon.observe(20), 10)
+        self.assertGreater(horizon.wait_time(), 3500)
+        horizon.observations[0] = (horizon.observations[0][0] - 3600, 15)
+        self.assertEqual(horizon.observe(20), 15)
+        self.assertEqual(horizon.observe(None), 15)
+
+    # Bez čekání je bezpečné každé viděné id
+    def test_no_settle(self):
+        horizon = CommitHorizon(settle_seconds=0)
+        self.assertEqual(horizon.observe(7), 7)
+        self.assertEqual(horizon.observe(5), 7)
+        self.assertIsNone(horizon.wait_time())
+
+
+class TestRollupPendingTime(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool)
+        metadata = MetaData()
+        self.source = Table(
+            'Weather_table_test', metadata,
+            Column('id', Integer, primary_key=True), Column('time', DateTime), Column('temp', Numeric(5, 2))
+        )
+        metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(self.source.insert(), [
+                {'time': datetime(2024, 1, 1, 10), 'temp': 1}, {'time': datetime(2024, 1, 1, 11), 'temp': 2}
+            ])
+        self.rollup = RollupEngine(self.engine, 'Weather_table_test', settle_seconds=0)
+
+    # Nezpracovaná měření se zjistí při startu a po každém běhu, požadavky čtou jen paměť
+    def test_pending_time(self):
+        self.assertEqual(self.rollup.oldest_pending_time(), datetime(2024, 1, 1, 10))
+        self.rollup.run_until_current()
+        with patch.object(self.engine, 'connect', side_effect=AssertionError):
+            self.assertIsNone(self.rollup.oldest_pending_time())
+            self.rollup.mark_pending(datetime(2024, 1, 2))
+            self.rollup.mark_pending(datetime(2024, 1, 3))
+            self.assertEqual(self.rollup.oldest_pending_time(), datetime(2024, 1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()